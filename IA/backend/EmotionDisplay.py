@@ -5,7 +5,9 @@ et les enrichir avec des informations supplémentaires utiles pour l'affichage.
 """
 
 import numpy as np
+from datetime import datetime
 from typing import Dict, List, Tuple, Any
+from history_store import EmotionRingBuffer
 
 # Mapping des émotions en français
 EMOTION_LABELS = {
@@ -18,6 +20,9 @@ EMOTION_LABELS = {
     'surprise': 'Surprise'
 }
 
+# Ordre des classes en sortie du modèle
+EMOTION_CLASSES = list(EMOTION_LABELS.keys())
+
 # Descriptions détaillées des émotions
 EMOTION_DESCRIPTIONS = {
     'angry': "La colère est une émotion intense qui se manifeste face à une menace, une frustration ou une injustice.",
@@ -99,63 +104,63 @@ def format_prediction(prediction: np.ndarray, emotion_labels: List[str]) -> Dict
     
     return formatted_result
 
-def get_emotion_history(history: List[Dict[str, Any]], max_entries: int = 10) -> List[Dict[str, Any]]:
+def get_emotion_history(history: EmotionRingBuffer, max_entries: int = 10,
+                        emotion_labels: List[str] = EMOTION_CLASSES) -> List[Dict[str, Any]]:
     """
     Prépare l'historique des émotions détectées pour l'affichage.
     
     Args:
-        history (List[Dict[str, Any]]): Historique des prédictions
+        history (EmotionRingBuffer): Historique compact d'une session
         max_entries (int, optional): Nombre maximum d'entrées à retourner
+        emotion_labels (List[str], optional): Étiquettes dans l'ordre des sorties du modèle
         
     Returns:
-        List[Dict[str, Any]]: Historique formaté
+        List[Dict[str, Any]]: Historique formaté, du plus ancien au plus récent
     """
-    # Limitez l'historique au nombre maximum d'entrées
-    limited_history = history[-max_entries:] if len(history) > max_entries else history
+    if history is None:
+        return []
+    
+    timestamps, labels, probabilities = history.last(max_entries)
     
-    # Ajouter des informations supplémentaires à chaque entrée
+    # Reconstruire chaque entrée à partir des tableaux compacts
     formatted_history = []
-    for entry in limited_history:
-        emotion = entry.get("prediction", "")
+    for timestamp, label, probs in zip(timestamps, labels, probabilities):
+        emotion = emotion_labels[label]
+        moment = datetime.fromtimestamp(float(timestamp))
         formatted_entry = {
-            **entry,
+            "prediction": emotion,
+            "confidence": float(probs[label]),
+            "all_predictions": {name: float(p) for name, p in zip(emotion_labels, probs)},
             "label_fr": EMOTION_LABELS.get(emotion, emotion),
-            "timestamp_formatted": entry.get("timestamp", "").strftime("%H:%M:%S")
+            "timestamp": moment.isoformat(),
+            "timestamp_formatted": moment.strftime("%H:%M:%S")
         }
         formatted_history.append(formatted_entry)
     
     return formatted_history
 
-def get_dominant_emotion(history: List[Dict[str, Any]], window_size: int = 10) -> str:
+def get_dominant_emotion(history: EmotionRingBuffer, window_size: int = 10,
+                         emotion_labels: List[str] = EMOTION_CLASSES) -> str:
     """
     Détermine l'émotion dominante sur une fenêtre d'historique.
     
     Args:
-        history (List[Dict[str, Any]]): Historique des prédictions
+        history (EmotionRingBuffer): Historique compact d'une session
         window_size (int, optional): Taille de la fenêtre d'analyse
+        emotion_labels (List[str], optional): Étiquettes dans l'ordre des sorties du modèle
         
     Returns:
         str: Émotion dominante
     """
-    if not history:
+    if history is None or len(history) == 0:
         return "neutral"
-        
-    # Limitez l'historique à la taille de la fenêtre
-    recent_history = history[-window_size:] if len(history) > window_size else history
     
-    # Comptez les occurrences de chaque émotion
-    emotion_counts = {}
-    for entry in recent_history:
-        emotion = entry.get("prediction", "")
-        if emotion in emotion_counts:
-            emotion_counts[emotion] += 1
-        else:
-            emotion_counts[emotion] = 1
+    # Compter les occurrences de chaque émotion sur la fenêtre
+    _, labels, _ = history.last(window_size)
+    emotion_counts = np.bincount(labels, minlength=len(emotion_labels))
     
     # Trouvez l'émotion la plus fréquente
-    dominant_emotion = max(emotion_counts.items(), key=lambda x: x[1])[0] if emotion_counts else "neutral"
-    
-    return dominant_emotion
+    return emotion_labels[int(np.argmax(emotion_counts))]
 
 def get_emotion_transition(current: str, previous: str) -> Dict[str, Any]:
     """
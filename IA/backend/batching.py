@@ -0,0 +1,122 @@
+"""
+Module de regroupement dynamique (micro-batching) des inférences.
+Les visages envoyés par des requêtes concurrentes sont accumulés dans une file
+puis traités en une seule passe du modèle, dans la limite d'une taille de lot
+maximale et d'un temps d'attente maximal.
+"""
+
+import asyncio
+import time
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
+
+
+class MicroBatcher:
+    """
+    Ordonnanceur d'inférence qui regroupe les visages de plusieurs requêtes.
+
+    Args:
+        predict_fn (Callable): Fonction synchrone (N, 48, 48, 1) -> (N, 7)
+        max_batch_size (int): Nombre maximal de visages par passe du modèle
+        max_wait_ms (float): Temps maximal d'attente pour compléter un lot
+        on_result (Optional[Callable]): Appelée dans le contexte de chaque requête
+            avec la durée (s) de la passe du modèle qui l'a servie
+    """
+
+    def __init__(self, predict_fn: Callable[[np.ndarray], np.ndarray],
+                 max_batch_size: int = 16, max_wait_ms: float = 5.0,
+                 on_result: Optional[Callable[[float], None]] = None):
+        self.predict_fn = predict_fn
+        self.on_result = on_result
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        """Démarre la boucle de traitement des lots sur la boucle asyncio courante."""
+        if self._task is None:
+            self._queue = asyncio.Queue()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        """Arrête la boucle de traitement des lots."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    @property
+    def pending(self) -> int:
+        """Nombre de requêtes en attente d'un lot."""
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def submit(self, faces: np.ndarray) -> np.ndarray:
+        """
+        Soumet un ou plusieurs visages prétraités et attend leurs prédictions.
+
+        Args:
+            faces (np.ndarray): Tableau de forme (N, 48, 48, 1)
+
+        Returns:
+            np.ndarray: Prédictions de forme (N, 7), dans le même ordre
+        """
+        if self._queue is None:
+            raise RuntimeError("Le planificateur d'inférence n'est pas démarré")
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((faces, future))
+        predictions, elapsed = await future
+        if self.on_result is not None:
+            self.on_result(elapsed)
+        return predictions
+
+    async def _collect(self) -> List[Tuple[np.ndarray, asyncio.Future]]:
+        # Attendre le premier élément, puis compléter le lot jusqu'à la limite de temps
+        batch = [await self._queue.get()]
+        size = len(batch[0][0])
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.max_wait
+        while size < self.max_batch_size:
+            try:
+                item = self._queue.get_nowait()
+            except asyncio.QueueEmpty:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+            batch.append(item)
+            size += len(item[0])
+        return batch
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            # Ignorer les requêtes annulées entre-temps (client déconnecté)
+            batch = [(faces, future) for faces, future in batch if not future.done()]
+            if not batch:
+                continue
+            try:
+                inputs = np.concatenate([faces for faces, _ in batch], axis=0)
+                start = time.perf_counter()
+                predictions = await loop.run_in_executor(None, self.predict_fn, inputs)
+                elapsed = time.perf_counter() - start
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            # Renvoyer à chaque requête la tranche de résultats qui lui correspond
+            offset = 0
+            for faces, future in batch:
+                count = len(faces)
+                if not future.done():
+                    future.set_result((predictions[offset:offset + count], elapsed))
+                offset += count
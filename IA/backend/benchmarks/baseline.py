@@ -0,0 +1,156 @@
+"""
+Résultats de référence des benchmarks (fichiers JSON) et détection des régressions.
+
+bench_stages.py et bench_load.py enregistrent leurs mesures avec --output dans
+un fichier JSON qui contient aussi l'environnement de mesure (machine, versions).
+La commande compare confronte deux fichiers : une métrique de latence (suffixe
+_ms) qui augmente, ou un débit (suffixe _rps) qui baisse, de plus du seuil est
+signalé comme une régression, et le code de sortie vaut alors 1.
+
+Usage:
+    python benchmarks/bench_stages.py --output baselines/stages.json
+    ... modification ...
+    python benchmarks/bench_stages.py --output /tmp/stages.json
+    python benchmarks/baseline.py compare baselines/stages.json /tmp/stages.json --threshold 0.1
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+from typing import Any, Dict, List, Sequence, Tuple
+
+# environment() importe cpus.py du dossier du backend, quel que soit le script appelant
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+
+def percentile(sorted_values: Sequence[float], q: float) -> float:
+    """Percentile q (0-100) par interpolation linéaire d'une liste triée."""
+    if not sorted_values:
+        return float("nan")
+    position = (len(sorted_values) - 1) * q / 100
+    low = int(position)
+    high = min(low + 1, len(sorted_values) - 1)
+    return sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (position - low)
+
+
+def summarize(timings_ms: Sequence[float]) -> Dict[str, float]:
+    """Résume une série de latences (ms) : p50, p95, p99, moyenne et nombre de mesures."""
+    values = sorted(timings_ms)
+    return {
+        "p50_ms": round(percentile(values, 50), 3),
+        "p95_ms": round(percentile(values, 95), 3),
+        "p99_ms": round(percentile(values, 99), 3),
+        "mean_ms": round(sum(values) / len(values), 3) if values else float("nan"),
+        "samples": len(values),
+    }
+
+
+def environment() -> Dict[str, Any]:
+    """Décrit la machine et les versions, pour ne comparer que des mesures comparables."""
+    import cv2
+    import numpy as np
+    from cpus import available_cpus
+    return {
+        "host": platform.node(),
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "cpu_count": os.cpu_count(),
+        "available_cpus": available_cpus(),
+        "numpy": np.__version__,
+        "opencv": cv2.__version__,
+        **{name: os.environ[name] for name in ("MODEL_BACKEND", "MODEL_THREADS", "FACE_DETECTOR")
+           if name in os.environ},
+    }
+
+
+def save(path: str, suite: str, results: Dict[str, Dict[str, float]], config: Dict[str, Any]) -> None:
+    """
+    Enregistre les résultats d'un benchmark.
+
+    Args:
+        path (str): Fichier JSON de sortie
+        suite (str): Nom du benchmark (stages, load)
+        results (Dict[str, Dict[str, float]]): Métriques par cas mesuré
+        config (Dict[str, Any]): Paramètres du benchmark
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "w") as f:
+        json.dump({
+            "suite": suite,
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "environment": environment(),
+            "config": config,
+            "results": results,
+        }, f, indent=2, sort_keys=True)
+    print(f"Résultats enregistrés dans {path}")
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any],
+            threshold: float) -> List[Tuple[str, str, float, float, float, bool]]:
+    """
+    Compare deux résultats du même benchmark.
+
+    Args:
+        baseline (Dict[str, Any]): Résultats de référence
+        current (Dict[str, Any]): Nouveaux résultats
+        threshold (float): Écart relatif toléré (0.1 = 10 %)
+
+    Returns:
+        List[Tuple]: (cas, métrique, référence, nouveau, écart relatif, régression) ;
+        l'écart est positif quand la performance se dégrade
+    """
+    rows = []
+    for case, metrics in baseline["results"].items():
+        new_metrics = current["results"].get(case)
+        if new_metrics is None:
+            continue
+        for metric, old in metrics.items():
+            new = new_metrics.get(metric)
+            if new is None or not old or not (metric.endswith("_ms") or metric.endswith("_rps")):
+                continue
+            change = (new - old) / old if metric.endswith("_ms") else (old - new) / old
+            rows.append((case, metric, old, new, change, change > threshold))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    compare_parser = subparsers.add_parser("compare", help="Compare deux fichiers de résultats")
+    compare_parser.add_argument("baseline", help="Résultats de référence (JSON)")
+    compare_parser.add_argument("current", help="Nouveaux résultats (JSON)")
+    compare_parser.add_argument("--threshold", type=float, default=0.1,
+                                help="Dégradation relative tolérée (défaut : 0.1 = 10 %%)")
+    compare_parser.add_argument("--metrics", default="p50_ms,p95_ms,p99_ms,throughput_rps",
+                                help="Métriques comparées (séparées par des virgules)")
+    args = parser.parse_args()
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+    if baseline["suite"] != current["suite"]:
+        raise SystemExit(f"Benchmarks différents: {baseline['suite']} / {current['suite']}")
+    for key in ("cpu_count", "available_cpus", "python"):
+        if baseline["environment"].get(key) != current["environment"].get(key):
+            print(f"Attention : environnement différent ({key}: {baseline['environment'].get(key)} "
+                  f"-> {current['environment'].get(key)})")
+
+    metrics = set(args.metrics.split(","))
+    rows = [row for row in compare(baseline, current, args.threshold) if row[1] in metrics]
+    print(f"{'cas':>32} {'métrique':>15} {'référence':>10} {'nouveau':>10} {'écart':>8}")
+    for case, metric, old, new, change, regression in rows:
+        flag = "  RÉGRESSION" if regression else ""
+        print(f"{case:>32} {metric:>15} {old:>10.2f} {new:>10.2f} {change:>+8.1%}{flag}")
+    regressions = sum(row[5] for row in rows)
+    print(f"{regressions} régression(s) au-delà de {args.threshold:.0%} sur {len(rows)} mesures")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Mesure le débit du planificateur d'inférence par lots en fonction du nombre
+de requêtes concurrentes.
+
+Usage:
+    python benchmarks/bench_batching.py --model best_model.h5
+    python benchmarks/bench_batching.py            # modèle simulé (coût fixe + coût par visage)
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from batching import MicroBatcher
+
+
+def simulated_predict(faces: np.ndarray) -> np.ndarray:
+    # 3 ms de coût fixe par appel + 0.2 ms par visage
+    time.sleep(0.003 + 0.0002 * len(faces))
+    return np.full((len(faces), 7), 1.0 / 7, dtype=np.float32)
+
+
+async def run_level(predict_fn, concurrency: int, requests: int, max_batch_size: int, max_wait_ms: float) -> float:
+    batcher = MicroBatcher(predict_fn, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms)
+    batcher.start()
+    face = np.random.rand(1, 48, 48, 1).astype(np.float32)
+
+    async def client(count: int):
+        for _ in range(count):
+            await batcher.submit(face)
+
+    per_client = max(1, requests // concurrency)
+    start = time.perf_counter()
+    await asyncio.gather(*(client(per_client) for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    await batcher.stop()
+    return per_client * concurrency / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", help="Chemin d'un modèle Keras (.h5); sinon modèle simulé")
+    parser.add_argument("--requests", type=int, default=512)
+    parser.add_argument("--max-batch-size", type=int, default=16)
+    parser.add_argument("--max-wait-ms", type=float, default=5.0)
+    parser.add_argument("--concurrency", default="1,2,4,8,16,32")
+    args = parser.parse_args()
+
+    if args.model:
+        import tensorflow as tf
+        model = tf.keras.models.load_model(args.model)
+        predict_fn = lambda faces: model.predict(faces, verbose=0)
+    else:
+        predict_fn = simulated_predict
+
+    print(f"{'concurrence':>12} {'visages/s':>12}")
+    for level in (int(c) for c in args.concurrency.split(",")):
+        throughput = asyncio.run(run_level(predict_fn, level, args.requests,
+                                           args.max_batch_size, args.max_wait_ms))
+        print(f"{level:>12} {throughput:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
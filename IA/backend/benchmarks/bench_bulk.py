@@ -0,0 +1,56 @@
+"""
+Mesure le débit de bulk_analyze.py (images/s) selon le nombre de processus
+workers, pour comparer le passage à l'échelle au nombre de cœurs.
+
+Chaque configuration analyse le même dossier depuis zéro (sans reprise) dans
+une sortie temporaire; le temps de chargement des modèles est exclu du débit.
+
+Usage:
+    python benchmarks/bench_bulk.py images/ --workers 1,2,4,8 --detector haar
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from bulk_analyze import run
+from cpus import available_cpus
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("images", help="Dossier d'images (et de vidéos)")
+    parser.add_argument("--workers", default=None, help="Nombres de workers testés (défaut : 1, 2, 4... jusqu'au nombre de cœurs)")
+    parser.add_argument("--threads-per-worker", type=int, default=1)
+    parser.add_argument("--backend", default=None)
+    parser.add_argument("--model-path", default=None)
+    parser.add_argument("--detector", default=None)
+    parser.add_argument("--chunk-size", type=int, default=16)
+    args = parser.parse_args()
+
+    cores = available_cpus()
+    if args.workers:
+        counts = [int(w) for w in args.workers.split(",")]
+    else:
+        counts = [w for w in (1, 2, 4, 8, 16, 32, 64) if w < cores] + [cores]
+
+    print(f"{cores} cœurs")
+    print(f"{'workers':>8} {'images':>7} {'img/s':>8} {'img/s/worker':>13} {'accélération':>13} {'chargement (s)':>15}")
+    baseline = None
+    for workers in counts:
+        with tempfile.TemporaryDirectory() as tmp:
+            summary = run([args.images], os.path.join(tmp, "out.csv"), workers=workers,
+                          threads_per_worker=args.threads_per_worker, backend=args.backend,
+                          model_path=args.model_path, detector=args.detector,
+                          chunk_size=args.chunk_size, resume=False, quiet=True)
+        throughput = summary["images_per_second"]
+        baseline = baseline or throughput
+        print(f"{workers:>8} {summary['images']:>7} {throughput:>8.1f} "
+              f"{summary['images_per_second_per_worker']:>13.1f} {throughput / baseline:>12.2f}x "
+              f"{summary['startup_seconds']:>15.1f}")
+
+
+if __name__ == "__main__":
+    main()
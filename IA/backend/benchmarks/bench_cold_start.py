@@ -0,0 +1,98 @@
+"""
+Mesure le démarrage à froid de l'API pour chaque format de modèle : délai
+avant la première réponse de /healthz (vivacité), avant /readyz (modèle chargé
+et préchauffé) et avant la première prédiction réussie.
+
+Chaque mesure lance un nouveau processus uvicorn, comme un pod qui démarre.
+Le dossier courant doit contenir les artefacts (best_model.h5, saved_model/,
+model.tflite), produits par convert_model.py.
+
+Usage:
+    python benchmarks/bench_cold_start.py image.jpg --backends keras,saved_model,tflite --runs 3
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+import uuid
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+
+def request(url: str, data: bytes = None, headers: dict = None) -> int:
+    try:
+        with urllib.request.urlopen(urllib.request.Request(url, data=data, headers=headers or {}), timeout=30) as r:
+            r.read()
+            return r.status
+    except urllib.error.HTTPError as e:
+        return e.code
+    except (urllib.error.URLError, ConnectionError):
+        return 0
+
+
+def multipart(image: bytes) -> tuple:
+    boundary = uuid.uuid4().hex
+    body = (f"--{boundary}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"image.jpg\"\r\n"
+            f"Content-Type: image/jpeg\r\n\r\n").encode() + image + f"\r\n--{boundary}--\r\n".encode()
+    return body, {"Content-Type": f"multipart/form-data; boundary={boundary}"}
+
+
+def cold_start(backend: str, image: bytes, port: int, timeout: float) -> dict:
+    env = {**os.environ, "MODEL_BACKEND": backend, "PYTHONPATH": BACKEND_DIR,
+           "RESULT_CACHE_SIZE": "0", "TF_CPP_MIN_LOG_LEVEL": "3"}
+    base = f"http://127.0.0.1:{port}"
+    body, headers = multipart(image)
+    timings = {}
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, "-m", "uvicorn", "main:app", "--port", str(port),
+                                "--log-level", "warning"], env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - start < timeout:
+            if process.poll() is not None:
+                raise RuntimeError(f"Le serveur {backend} s'est arrêté (code {process.returncode})")
+            if "healthz" not in timings and request(base + "/healthz") == 200:
+                timings["healthz"] = time.perf_counter() - start
+            if "healthz" in timings and request(base + "/readyz") == 200:
+                timings["readyz"] = time.perf_counter() - start
+                break
+            time.sleep(0.05)
+        else:
+            raise RuntimeError(f"Le serveur {backend} n'est pas prêt après {timeout} s")
+        status = request(base + "/predict/", body, headers)
+        timings["first_prediction"] = time.perf_counter() - start
+        if status != 200:
+            raise RuntimeError(f"Première prédiction {backend} en échec (HTTP {status})")
+    finally:
+        process.terminate()
+        process.wait()
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("image", help="Image envoyée pour la première prédiction")
+    parser.add_argument("--backends", default="keras,saved_model,tflite")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--timeout", type=float, default=180.0)
+    args = parser.parse_args()
+
+    with open(args.image, "rb") as f:
+        image = f.read()
+
+    print(f"{'backend':>12} {'healthz (s)':>12} {'readyz (s)':>11} {'1re prédiction (s)':>19}")
+    for backend in args.backends.split(","):
+        runs = [cold_start(backend, image, args.port, args.timeout) for _ in range(args.runs)]
+        medians = {key: statistics.median(run[key] for run in runs) for key in runs[0]}
+        print(f"{backend:>12} {medians['healthz']:>12.2f} {medians['readyz']:>11.2f} "
+              f"{medians['first_prediction']:>19.2f}")
+
+
+if __name__ == "__main__":
+    main()
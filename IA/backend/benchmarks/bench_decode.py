@@ -0,0 +1,94 @@
+"""
+Compare le temps de décodage et la mémoire allouée par requête entre le
+décodage d'origine (PIL + np.array) et le décodage direct depuis le tampon
+(cv2.imdecode), en pleine résolution et en résolution réduite (DCT).
+
+Usage:
+    python benchmarks/bench_decode.py                     # JPEG synthétiques 12 Mpx et 1080p
+    python benchmarks/bench_decode.py photo1.jpg photo2.jpg --max-side 640
+"""
+
+import argparse
+import base64
+import io
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from pipeline import decode_image, decode_image_reduced, decode_base64_image
+
+
+def synthetic_jpeg(width: int, height: int) -> bytes:
+    # Dégradé + bruit : contenu réaliste pour le codeur, contrairement à du bruit pur
+    x = np.linspace(0, 255, width, dtype=np.float32)
+    y = np.linspace(0, 255, height, dtype=np.float32)[:, None]
+    img = np.stack([(x + y) / 2, np.broadcast_to(x, (height, width)), np.broadcast_to(y, (height, width))], axis=-1)
+    img += np.random.default_rng(0).normal(0, 8, img.shape)
+    _, buffer = cv2.imencode(".jpg", np.clip(img, 0, 255).astype(np.uint8), [cv2.IMWRITE_JPEG_QUALITY, 90])
+    return buffer.tobytes()
+
+
+def legacy_decode(contents: bytes) -> np.ndarray:
+    img = np.array(Image.open(io.BytesIO(contents)))
+    if img.shape[-1] == 4:
+        img = cv2.cvtColor(img, cv2.COLOR_RGBA2RGB)
+    return img
+
+
+def legacy_decode_base64(data_url: str) -> np.ndarray:
+    return legacy_decode(base64.b64decode(data_url.split(",")[-1]))
+
+
+def measure(fn, arg, repeats: int):
+    fn(arg)
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn(arg)
+        timings.append((time.perf_counter() - start) * 1000)
+    tracemalloc.start()
+    fn(arg)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return statistics.median(timings), peak / 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("images", nargs="*", help="Fichiers JPEG (défaut : images synthétiques)")
+    parser.add_argument("--max-side", type=int, default=640)
+    parser.add_argument("--repeats", type=int, default=10)
+    args = parser.parse_args()
+
+    if args.images:
+        inputs = {}
+        for path in args.images:
+            with open(path, "rb") as f:
+                inputs[os.path.basename(path)] = f.read()
+    else:
+        inputs = {"4000x3000": synthetic_jpeg(4000, 3000), "1920x1080": synthetic_jpeg(1920, 1080)}
+
+    print(f"{'image':>12} {'chemin':>18} {'p50 (ms)':>10} {'pic alloc (Mo)':>15}")
+    for name, contents in inputs.items():
+        data_url = "data:image/jpeg;base64," + base64.b64encode(contents).decode()
+        paths = {
+            "PIL (origine)": (legacy_decode, contents),
+            "imdecode": (decode_image, contents),
+            f"réduit {args.max_side}": (lambda c: decode_image_reduced(c, args.max_side), contents),
+            "base64 origine": (legacy_decode_base64, data_url),
+            "base64 réduit": (lambda d: decode_base64_image(d, args.max_side), data_url),
+        }
+        for label, (fn, arg) in paths.items():
+            latency, peak = measure(fn, arg, args.repeats)
+            print(f"{name:>12} {label:>18} {latency:>10.1f} {peak:>15.1f}")
+
+
+if __name__ == "__main__":
+    main()
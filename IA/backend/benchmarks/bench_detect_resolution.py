@@ -0,0 +1,64 @@
+"""
+Mesure le gain de latence de la détection sur une copie réduite de l'image
+(DETECT_MAX_SIDE) pour des entrées 720p et 1080p.
+
+Chaque image du dossier est redimensionnée aux résolutions testées, puis la
+détection est chronométrée en pleine résolution et avec chaque plafond.
+
+Usage:
+    python benchmarks/bench_detect_resolution.py images/ --detector mtcnn --max-sides 960,640,480
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+import cv2
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from face_detectors import get_detector
+from pipeline import detect_faces
+from bench_detectors import load_images
+
+RESOLUTIONS = {"720p": (1280, 720), "1080p": (1920, 1080)}
+
+
+def median_latency(detector, img, max_side, repeats: int):
+    faces = detect_faces(detector, img, max_side)
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        detect_faces(detector, img, max_side)
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings), len(faces)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("images", help="Dossier d'images")
+    parser.add_argument("--detector", default="mtcnn")
+    parser.add_argument("--max-sides", default="960,640,480")
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    detector = get_detector(args.detector)
+    images = [img for _, img in load_images(args.images)]
+    caps = [None] + [int(s) for s in args.max_sides.split(",")]
+
+    print(f"{'entrée':>7} {'plafond':>8} {'p50 (ms)':>10} {'gain':>7} {'visages':>8}")
+    for label, size in RESOLUTIONS.items():
+        resized = [cv2.resize(img, size) for img in images]
+        baseline = None
+        for cap in caps:
+            runs = [median_latency(detector, img, cap, args.repeats) for img in resized]
+            latency = statistics.fmean(r[0] for r in runs)
+            faces = sum(r[1] for r in runs)
+            baseline = baseline or latency
+            cap_label = str(cap) if cap else "aucun"
+            print(f"{label:>7} {cap_label:>8} {latency:>10.1f} {baseline / latency:>6.1f}x {faces:>8}")
+
+
+if __name__ == "__main__":
+    main()
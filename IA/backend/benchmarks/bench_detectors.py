@@ -0,0 +1,110 @@
+"""
+Compare la latence et le rappel des détecteurs de visages sur un dossier d'images.
+
+Le rappel est mesuré contre des annotations (--annotations, JSON
+{"fichier.jpg": [[x, y, w, h], ...]}) ou, à défaut, contre les visages trouvés
+par le détecteur de référence (--reference, MTCNN par défaut). Un visage est
+retrouvé si une détection le recouvre avec un IoU >= --iou.
+
+Usage:
+    python benchmarks/bench_detectors.py images/ --detectors mtcnn,opencv_dnn,haar
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from face_detectors import get_detector
+from pipeline import decode_image
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+
+
+def iou(a, b) -> float:
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    ix = max(0, min(ax + aw, bx + bw) - max(ax, bx))
+    iy = max(0, min(ay + ah, by + bh) - max(ay, by))
+    inter = ix * iy
+    union = aw * ah + bw * bh - inter
+    return inter / union if union > 0 else 0.0
+
+
+def recall(truth, detected, threshold: float):
+    found = sum(1 for box in truth if any(iou(box, d) >= threshold for d in detected))
+    return found, len(truth)
+
+
+def load_images(directory: str):
+    for name in sorted(os.listdir(directory)):
+        if name.lower().endswith(IMAGE_EXTENSIONS):
+            with open(os.path.join(directory, name), "rb") as f:
+                yield name, decode_image(f.read())
+
+
+def time_detector(detector, img: np.ndarray, repeats: int):
+    faces = detector.detect_faces(img)
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        detector.detect_faces(img)
+        timings.append((time.perf_counter() - start) * 1000)
+    return faces, statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("images", help="Dossier d'images")
+    parser.add_argument("--detectors", default="mtcnn,opencv_dnn,haar")
+    parser.add_argument("--annotations", help="Fichier JSON des boîtes de référence")
+    parser.add_argument("--reference", default="mtcnn", help="Détecteur de référence sans annotations")
+    parser.add_argument("--iou", type=float, default=0.5)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--output", help="Écrire les résultats en JSON")
+    args = parser.parse_args()
+
+    images = list(load_images(args.images))
+    if args.annotations:
+        with open(args.annotations) as f:
+            truth = json.load(f)
+    else:
+        reference = get_detector(args.reference)
+        truth = {name: [face['box'] for face in reference.detect_faces(img)] for name, img in images}
+
+    results = {}
+    for name in args.detectors.split(","):
+        try:
+            detector = get_detector(name)
+        except Exception as e:
+            print(f"{name}: indisponible ({e})")
+            continue
+        latencies, found, total = [], 0, 0
+        for filename, img in images:
+            faces, latency = time_detector(detector, img, args.repeats)
+            latencies.append(latency)
+            f, t = recall(truth.get(filename, []), [face['box'] for face in faces], args.iou)
+            found, total = found + f, total + t
+        results[name] = {
+            "latency_ms_p50": statistics.median(latencies),
+            "latency_ms_mean": statistics.fmean(latencies),
+            "recall": found / total if total else None,
+            "faces_expected": total,
+        }
+
+    print(f"{'détecteur':>12} {'p50 (ms)':>10} {'moy. (ms)':>10} {'rappel':>8}")
+    for name, r in results.items():
+        rec = f"{r['recall']:.3f}" if r["recall"] is not None else "n/a"
+        print(f"{name:>12} {r['latency_ms_p50']:>10.1f} {r['latency_ms_mean']:>10.1f} {rec:>8}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""
+Compare la latence d'inférence de model.predict (chemin d'origine, entrée
+float64) avec le chemin compilé de CompiledPredictor (entrée float32).
+
+Usage:
+    python benchmarks/bench_inference.py --model best_model.h5
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+
+def measure(fn, inputs, repeats: int) -> float:
+    """Renvoie la latence médiane en millisecondes."""
+    fn(inputs)  # exclure le premier appel (traçage, initialisation)
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn(inputs)
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default="best_model.h5")
+    parser.add_argument("--repeats", type=int, default=100)
+    parser.add_argument("--batch-sizes", default="1,4,16")
+    args = parser.parse_args()
+
+    import tensorflow as tf
+    from inference import CompiledPredictor
+
+    model = tf.keras.models.load_model(args.model)
+    predictor = CompiledPredictor(model)
+    predictor.warmup()
+
+    print(f"{'lot':>5} {'predict (ms)':>14} {'compilé (ms)':>14} {'gain':>7}")
+    for size in (int(b) for b in args.batch_sizes.split(",")):
+        faces64 = np.random.rand(size, 48, 48, 1)  # float64, comme l'ancien « / 255.0 »
+        faces32 = faces64.astype(np.float32)
+        baseline = measure(lambda x: model.predict(x, verbose=0), faces64, args.repeats)
+        compiled = measure(predictor, faces32, args.repeats)
+        print(f"{size:>5} {baseline:>14.2f} {compiled:>14.2f} {baseline / compiled:>6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""
+Test de charge de bout en bout de l'API : /predict/ (multipart) et
+/predict-base64/ (JSON) à concurrence croissante.
+
+Chaque niveau de concurrence lance N clients en boucle fermée (un client envoie
+sa requête suivante dès la réponse reçue), sur une connexion keep-alive, pendant
+--duration secondes après --warmup secondes de chauffe. Le rapport donne les
+latences p50/p95/p99 des réponses 200, le débit soutenu (réponses 200 par
+seconde) et les refus (503, file pleine) ou erreurs. La latence côté serveur
+est lue dans l'en-tête Server-Timing (total).
+
+Le cache de résultats est contourné par défaut : chaque requête ajoute quelques
+octets aléatoires après la fin du JPEG (ignorés par le décodeur), ce qui change
+son empreinte. --reuse-image mesure au contraire le chemin du cache.
+
+Usage:
+    python benchmarks/bench_load.py image.jpg --url http://localhost:8000 --concurrency 1,2,4,8,16
+    python benchmarks/bench_load.py image.jpg --output baselines/load.json
+"""
+
+import argparse
+import base64
+import http.client
+import json
+import os
+import threading
+import time
+import uuid
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from baseline import save, summarize
+
+ENDPOINTS = ("predict", "predict-base64")
+
+
+class Client:
+    """Client HTTP sur une connexion persistante, rouverte après une erreur."""
+
+    def __init__(self, url: str, timeout: float):
+        parts = urlsplit(url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.timeout = timeout
+        self._connection: Optional[http.client.HTTPConnection] = None
+
+    def post(self, path: str, body: bytes, headers: Dict[str, str]) -> Tuple[int, Optional[float]]:
+        """Envoie une requête ; renvoie le code HTTP (0 = erreur réseau) et la durée serveur (ms)."""
+        try:
+            if self._connection is None:
+                self._connection = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            self._connection.request("POST", path, body, headers)
+            response = self._connection.getresponse()
+            response.read()
+            return response.status, server_total(response.getheader("Server-Timing"))
+        except (OSError, http.client.HTTPException):
+            self.close()
+            return 0, None
+
+    def close(self) -> None:
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+
+def server_total(header: Optional[str]) -> Optional[float]:
+    """Extrait la durée totale (ms) d'un en-tête Server-Timing."""
+    for entry in (header or "").split(","):
+        name, _, params = entry.strip().partition(";")
+        if name == "total" and params.startswith("dur="):
+            return float(params[4:])
+    return None
+
+
+def build_request(endpoint: str, image: bytes, unique: bool) -> Tuple[str, bytes, Dict[str, str]]:
+    """Construit le chemin, le corps et les en-têtes d'une requête."""
+    if unique:
+        image = image + os.urandom(8)
+    if endpoint == "predict":
+        boundary = uuid.uuid4().hex
+        body = (f"--{boundary}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"image.jpg\"\r\n"
+                f"Content-Type: image/jpeg\r\n\r\n").encode() + image + f"\r\n--{boundary}--\r\n".encode()
+        return "/predict/", body, {"Content-Type": f"multipart/form-data; boundary={boundary}"}
+    data_url = "data:image/jpeg;base64," + base64.b64encode(image).decode()
+    return "/predict-base64/", json.dumps({"image": data_url}).encode(), {"Content-Type": "application/json"}
+
+
+def run_level(url: str, endpoint: str, image: bytes, concurrency: int, warmup: float,
+              duration: float, unique: bool, timeout: float) -> Dict[str, float]:
+    """Mesure un niveau de concurrence ; renvoie les percentiles, le débit et les erreurs."""
+    latencies: List[float] = []
+    server_latencies: List[float] = []
+    statuses: Counter = Counter()
+    lock = threading.Lock()
+    start = time.perf_counter()
+    measure_from, stop_at = start + warmup, start + warmup + duration
+
+    def worker():
+        client = Client(url, timeout)
+        while True:
+            path, body, headers = build_request(endpoint, image, unique)
+            sent = time.perf_counter()
+            if sent >= stop_at:
+                break
+            status, server_ms = client.post(path, body, headers)
+            if sent < measure_from:
+                continue
+            with lock:
+                statuses[status] += 1
+                if status == 200:
+                    latencies.append((time.perf_counter() - sent) * 1000)
+                    if server_ms is not None:
+                        server_latencies.append(server_ms)
+        client.close()
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # Fenêtre mesurée, réponses des dernières requêtes comprises
+    elapsed = time.perf_counter() - measure_from
+    total = sum(statuses.values())
+    return {
+        **summarize(latencies),
+        "throughput_rps": round(len(latencies) / elapsed, 3),
+        "server_p50_ms": summarize(server_latencies)["p50_ms"] if server_latencies else None,
+        "rejected": statuses.get(503, 0),
+        "errors": total - statuses.get(200, 0) - statuses.get(503, 0),
+        "requests": total,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("image", help="Image JPEG envoyée à chaque requête")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--endpoints", default=",".join(ENDPOINTS))
+    parser.add_argument("--concurrency", default="1,2,4,8,16")
+    parser.add_argument("--duration", type=float, default=20.0, help="Durée mesurée par niveau (s)")
+    parser.add_argument("--warmup", type=float, default=3.0, help="Chauffe par niveau, non mesurée (s)")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--reuse-image", action="store_true", help="Envoyer la même image (cache de résultats)")
+    parser.add_argument("--output", default=None, help="Enregistrer les résultats dans ce fichier JSON")
+    args = parser.parse_args()
+
+    with open(args.image, "rb") as f:
+        image = f.read()
+    endpoints = args.endpoints.split(",")
+    for endpoint in endpoints:
+        if endpoint not in ENDPOINTS:
+            raise SystemExit(f"Endpoint inconnu: {endpoint} (choix: {', '.join(ENDPOINTS)})")
+
+    print(f"{'endpoint':>15} {'conc.':>6} {'p50 (ms)':>9} {'p95 (ms)':>9} {'p99 (ms)':>9} "
+          f"{'req/s':>8} {'serveur p50':>12} {'503':>5} {'erreurs':>8}")
+    results = {}
+    for endpoint in endpoints:
+        for concurrency in (int(c) for c in args.concurrency.split(",")):
+            level = run_level(args.url, endpoint, image, concurrency, args.warmup, args.duration,
+                              not args.reuse_image, args.timeout)
+            results[f"{endpoint}/c{concurrency}"] = level
+            server = f"{level['server_p50_ms']:.1f}" if level["server_p50_ms"] is not None else "-"
+            print(f"{endpoint:>15} {concurrency:>6} {level['p50_ms']:>9.1f} {level['p95_ms']:>9.1f} "
+                  f"{level['p99_ms']:>9.1f} {level['throughput_rps']:>8.2f} {server:>12} "
+                  f"{level['rejected']:>5} {level['errors']:>8}")
+
+    if args.output:
+        save(args.output, "load", results, {
+            "url": args.url, "image": os.path.basename(args.image), "image_bytes": len(image),
+            "duration": args.duration, "warmup": args.warmup, "reuse_image": args.reuse_image,
+        })
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""
+Microbenchmarks des étapes du pipeline de main.py, mesurées séparément avec les
+mêmes fonctions et les mêmes réglages (DECODE_MAX_SIDE, DETECT_MAX_SIDE,
+DETECT_MIN_FACE, JPEG_QUALITY, THUMBNAIL_SIZE) que l'API : décodage multipart et base64,
+signature du filtre d'images, détection, prétraitement, inférence d'un visage,
+annotation et vignettes.
+
+Chaque image (synthétique, ou du dossier --images) est mesurée à plusieurs
+résolutions. Quand aucun visage n'est détecté, les étapes suivantes utilisent
+une boîte centrale pour rester mesurées.
+
+Usage:
+    python benchmarks/bench_stages.py --detector haar --output baselines/stages.json
+    python benchmarks/bench_stages.py --images faces/ --resolutions 640x480,1280x720,1920x1080
+"""
+
+import argparse
+import base64
+import functools
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from EmotionDisplay import EMOTION_CLASSES, format_prediction
+from face_detectors import get_detector
+from frame_gate import frame_signature
+from model_backends import create_backend
+from pipeline import (IMAGE_EXTENSIONS, annotate_image, crop_faces, decode_base64_image, decode_image,
+                      decode_image_reduced, detect_faces, face_thumbnails)
+from baseline import save, summarize
+
+DETECT_MAX_SIDE = int(os.environ.get("DETECT_MAX_SIDE", "640"))
+DETECT_MIN_FACE = int(os.environ.get("DETECT_MIN_FACE", "20"))
+DECODE_MAX_SIDE = int(os.environ.get("DECODE_MAX_SIDE", "0"))
+JPEG_QUALITY = int(os.environ.get("JPEG_QUALITY", "80"))
+THUMBNAIL_SIZE = int(os.environ.get("THUMBNAIL_SIZE", "96"))
+
+
+def synthetic_face(width: int = 640, height: int = 480) -> np.ndarray:
+    """Image RGB avec un visage schématique (ovale, yeux, sourcils, bouche) sur un fond dégradé."""
+    x = np.linspace(40, 200, width, dtype=np.float32)
+    img = np.repeat(np.broadcast_to(x, (height, width))[:, :, None], 3, axis=2).astype(np.uint8).copy()
+    cx, cy, r = width // 2, height // 2, min(width, height) // 4
+    cv2.ellipse(img, (cx, cy), (int(r * 0.8), r), 0, 0, 360, (224, 180, 150), -1)
+    for dx in (-r // 3, r // 3):
+        cv2.circle(img, (cx + dx, cy - r // 4), max(2, r // 10), (40, 30, 30), -1)
+        brow_y = cy - int(r / 2.5)
+        cv2.line(img, (cx + dx - r // 6, brow_y), (cx + dx + r // 6, brow_y), (60, 40, 30), max(1, r // 25))
+    cv2.ellipse(img, (cx, cy + r // 3), (r // 3, r // 8), 0, 0, 180, (120, 40, 40), max(1, r // 20))
+    noise = np.random.default_rng(0).normal(0, 4, img.shape)
+    return np.clip(img + noise, 0, 255).astype(np.uint8)
+
+
+def load_sources(directory):
+    """Renvoie les images RGB à mesurer : un visage synthétique, ou celles du dossier."""
+    if not directory:
+        return {"synthetic": synthetic_face()}
+    sources = {}
+    for name in sorted(os.listdir(directory)):
+        if name.lower().endswith(IMAGE_EXTENSIONS):
+            with open(os.path.join(directory, name), "rb") as f:
+                sources[os.path.splitext(name)[0]] = decode_image(f.read())
+    return sources
+
+
+def measure(fn, repeats: int):
+    """Appelle fn une fois (préchauffage) puis repeats fois ; renvoie (résultat, latences ms)."""
+    result = fn()
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return result, timings
+
+
+def bench_image(img: np.ndarray, detector, backend, repeats: int):
+    """Mesure chaque étape du pipeline sur une image RGB ; renvoie {étape: résumé}."""
+    _, buffer = cv2.imencode(".jpg", cv2.cvtColor(img, cv2.COLOR_RGB2BGR), [cv2.IMWRITE_JPEG_QUALITY, 90])
+    contents = buffer.tobytes()
+    data_url = "data:image/jpeg;base64," + base64.b64encode(contents).decode()
+
+    results = {}
+    (decoded, scale), results["decode"] = measure(lambda: decode_image_reduced(contents, DECODE_MAX_SIDE), repeats)
+    _, results["decode_base64"] = measure(lambda: decode_base64_image(data_url, DECODE_MAX_SIDE), repeats)
+    _, results["gate"] = measure(lambda: frame_signature(decoded), repeats)
+    faces, results["detect"] = measure(functools.partial(detect_faces, detector, decoded, DETECT_MAX_SIDE,
+                                                                   DETECT_MIN_FACE / scale), repeats)
+    if faces:
+        boxes = [faces[0]["box"]]
+    else:
+        h, w = decoded.shape[:2]
+        side = min(h, w) // 2
+        boxes = [[(w - side) // 2, (h - side) // 2, side, side]]
+    faces_input, results["preprocess"] = measure(lambda: crop_faces(decoded, boxes), repeats)
+    predictions, results["inference"] = measure(lambda: backend(faces_input), repeats)
+    prediction = format_prediction(predictions[:1], EMOTION_CLASSES)
+    _, results["annotate"] = measure(
+        lambda: annotate_image(decoded, list(zip(boxes, [prediction])), JPEG_QUALITY), repeats)
+    _, results["thumbnail"] = measure(
+        lambda: face_thumbnails(decoded, boxes, THUMBNAIL_SIZE, JPEG_QUALITY), repeats)
+    return {stage: summarize(timings) for stage, timings in results.items()}, len(faces)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", default=None, help="Dossier d'images de visages (défaut : visage synthétique)")
+    parser.add_argument("--resolutions", default="640x480,1280x720,1920x1080")
+    parser.add_argument("--detector", default=None)
+    parser.add_argument("--backend", default=None)
+    parser.add_argument("--model-path", default=None)
+    parser.add_argument("--repeats", type=int, default=30)
+    parser.add_argument("--output", default=None, help="Enregistrer les résultats dans ce fichier JSON")
+    args = parser.parse_args()
+
+    detector = get_detector(args.detector)
+    backend = create_backend(args.backend, args.model_path)
+    backend.warmup()
+    resolutions = [tuple(int(v) for v in r.split("x")) for r in args.resolutions.split(",")]
+
+    print(f"backend {backend.name}, détecteur {type(detector).__name__}, "
+          f"DECODE_MAX_SIDE={DECODE_MAX_SIDE}, DETECT_MAX_SIDE={DETECT_MAX_SIDE}, DETECT_MIN_FACE={DETECT_MIN_FACE}")
+    print(f"{'cas':>28} {'étape':>14} {'p50 (ms)':>9} {'p95 (ms)':>9} {'p99 (ms)':>9}")
+    results = {}
+    for name, source in load_sources(args.images).items():
+        for width, height in resolutions:
+            img = cv2.resize(source, (width, height), interpolation=cv2.INTER_AREA)
+            stages, face_count = bench_image(img, detector, backend, args.repeats)
+            case = f"{name}@{width}x{height}"
+            for stage, summary in stages.items():
+                results[f"{case}/{stage}"] = summary
+                print(f"{case:>28} {stage:>14} {summary['p50_ms']:>9.2f} {summary['p95_ms']:>9.2f} "
+                      f"{summary['p99_ms']:>9.2f}")
+            if not face_count:
+                print(f"{case:>28} (aucun visage détecté : boîte centrale utilisée)")
+
+    if args.output:
+        save(args.output, "stages", results, {
+            "backend": backend.name, "detector": type(detector).__name__, "repeats": args.repeats,
+            "resolutions": args.resolutions, "images": args.images or "synthetic",
+            "decode_max_side": DECODE_MAX_SIDE, "detect_max_side": DETECT_MAX_SIDE,
+            "detect_min_face": DETECT_MIN_FACE,
+            "jpeg_quality": JPEG_QUALITY, "thumbnail_size": THUMBNAIL_SIZE,
+        })
+
+
+if __name__ == "__main__":
+    main()
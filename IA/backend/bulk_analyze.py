@@ -0,0 +1,401 @@
+"""
+Analyse hors ligne des émotions d'un dossier d'images et de vidéos.
+Le travail est réparti sur un pool de processus; chaque worker charge le modèle
+et le détecteur une seule fois, puis traite des paquets d'images dont tous les
+visages passent en un seul lot d'inférence. Les vidéos sont échantillonnées à
+une fréquence configurable.
+
+Les résultats sont écrits au fil de l'eau (une ligne par visage, ou une ligne
+sans prédiction si aucun visage n'est trouvé) :
+    - en CSV, dans un seul fichier complété à chaque paquet;
+    - en Parquet (pyarrow requis), dans un dossier de fichiers part-*.parquet.
+Relancer la même commande reprend là où elle s'était arrêtée : les sources déjà
+analysées sans erreur sont ignorées, celles en erreur sont retentées (leur ligne
+d'erreur précédente reste dans la sortie).
+
+Usage:
+    python bulk_analyze.py archives/ resultats.csv --workers 4
+    python bulk_analyze.py videos/ resultats/ --format parquet --video-fps 2
+"""
+
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import sys
+import time
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+import cv2
+import numpy as np
+
+from EmotionDisplay import EMOTION_CLASSES, format_prediction
+from cpus import available_cpus
+from pipeline import IMAGE_EXTENSIONS, crop_faces, decode_image_reduced, detect_faces
+
+VIDEO_EXTENSIONS = (".mp4", ".avi", ".mov", ".mkv", ".webm", ".m4v")
+
+COLUMNS = (["source", "frame", "time", "face", "x", "y", "w", "h", "detection_confidence",
+            "prediction", "confidence", "label_fr"]
+           + [f"prob_{emotion}" for emotion in EMOTION_CLASSES] + ["error"])
+
+# État de chaque processus worker, initialisé une seule fois par _init_worker
+_model = None
+_detector = None
+_options: Dict[str, Any] = {}
+
+
+def list_sources(inputs: List[str]) -> Iterator[Tuple[str, str]]:
+    """
+    Parcourt récursivement les entrées et renvoie les images et vidéos trouvées.
+
+    Yields:
+        Tuple[str, str]: Chemin et type ("image" ou "video")
+    """
+    for entry in inputs:
+        if os.path.isdir(entry):
+            paths = (os.path.join(root, name)
+                     for root, _, names in sorted(os.walk(entry)) for name in sorted(names))
+        else:
+            paths = [entry]
+        for path in paths:
+            lower = path.lower()
+            if lower.endswith(IMAGE_EXTENSIONS):
+                yield path, "image"
+            elif lower.endswith(VIDEO_EXTENSIONS):
+                yield path, "video"
+
+
+def _init_worker(backend: Optional[str], model_path: Optional[str], threads: int,
+                 detector_name: Optional[str], options: Dict[str, Any], ready=None) -> None:
+    """
+    Charge et préchauffe le modèle et le détecteur du worker, puis le signale sur
+    la file ready (None si tout est prêt, sinon le message d'erreur).
+    """
+    global _model, _detector, _options
+    # Budget de threads du worker pour tous les runtimes, avant l'import de
+    # TensorFlow (MTCNN, backends Keras/SavedModel) : sans cela, chaque worker
+    # démarre autant de threads intra-op que de cœurs, même avec le backend TFLite
+    for name in ("TF_NUM_INTRAOP_THREADS", "OPENCV_FOR_THREADS_NUM", "OMP_NUM_THREADS", "MKL_NUM_THREADS"):
+        os.environ[name] = str(threads)
+    os.environ["TF_NUM_INTEROP_THREADS"] = "1"
+    cv2.setNumThreads(threads)
+    try:
+        from face_detectors import get_detector
+        from model_backends import create_backend
+        _model = create_backend(backend, model_path, num_threads=threads)
+        _model.warmup()
+        _detector = get_detector(detector_name)
+        detect_faces(_detector, np.zeros((160, 160, 3), dtype=np.uint8))
+        _options = options
+    except Exception as e:
+        if ready is not None:
+            ready.put(f"{type(e).__name__}: {e}")
+        raise
+    if ready is not None:
+        ready.put(None)
+
+
+def _detect(img: np.ndarray, scale: float = 1.0) -> List[Dict[str, Any]]:
+    faces = detect_faces(_detector, img, max_side=_options["max_side"],
+                         min_face_size=_options["min_face"] / scale)
+    if not _options["multi_face"]:
+        return faces[:1]
+    return [face for i, face in enumerate(faces) if i == 0 or face["confidence"] >= _options["min_confidence"]]
+
+
+def _rows(source: str, frame: Optional[int], timestamp: Optional[float],
+          faces: List[Dict[str, Any]], predictions: np.ndarray, scale: float = 1.0) -> List[Dict[str, Any]]:
+    base = {"source": source, "frame": frame, "time": timestamp}
+    if not faces:
+        return [base]
+    rows = []
+    for i, face in enumerate(faces):
+        result = format_prediction(predictions[i:i+1], EMOTION_CLASSES)
+        x, y, w, h = [int(round(v * scale)) for v in face["box"]]
+        row = {**base, "face": i, "x": x, "y": y, "w": w, "h": h,
+               "detection_confidence": float(face["confidence"]),
+               "prediction": result["prediction"], "confidence": result["confidence"],
+               "label_fr": result["label_fr"]}
+        row.update({f"prob_{emotion}": result["all_predictions"][emotion] for emotion in EMOTION_CLASSES})
+        rows.append(row)
+    return rows
+
+
+def _predict(crops: List[np.ndarray]) -> np.ndarray:
+    if not crops:
+        return np.zeros((0, len(EMOTION_CLASSES)), dtype=np.float32)
+    return _model(np.concatenate(crops, axis=0))
+
+
+def _analyze_images(paths: List[str]) -> Tuple[List[str], List[Dict[str, Any]], int]:
+    """Analyse un paquet d'images; tous les visages passent en un seul lot."""
+    items, crops = [], []
+    for path in paths:
+        try:
+            with open(path, "rb") as f:
+                img, scale = decode_image_reduced(f.read(), _options["decode_max_side"])
+            faces = _detect(img, scale)
+            if faces:
+                crops.append(crop_faces(img, [face["box"] for face in faces]))
+            items.append((path, faces, scale, None))
+        except Exception as e:
+            items.append((path, [], 1.0, str(e)))
+    predictions = _predict(crops)
+    rows, offset = [], 0
+    for path, faces, scale, error in items:
+        if error is not None:
+            rows.append({"source": path, "error": error})
+            continue
+        rows.extend(_rows(path, None, None, faces, predictions[offset:offset + len(faces)], scale))
+        offset += len(faces)
+    return paths, rows, len(paths)
+
+
+def _analyze_video(path: str) -> Tuple[List[str], List[Dict[str, Any]], int]:
+    """Analyse une vidéo en échantillonnant video_fps images par seconde."""
+    capture = cv2.VideoCapture(path)
+    if not capture.isOpened():
+        return [path], [{"source": path, "error": "Impossible d'ouvrir la vidéo"}], 0
+    fps = capture.get(cv2.CAP_PROP_FPS) or 25.0
+    step = max(1, int(round(fps / _options["video_fps"]))) if _options["video_fps"] > 0 else 1
+    rows, pending, crops = [], [], []
+    index = sampled = 0
+
+    def flush():
+        predictions = _predict(crops)
+        offset = 0
+        for frame, timestamp, faces in pending:
+            rows.extend(_rows(path, frame, timestamp, faces, predictions[offset:offset + len(faces)]))
+            offset += len(faces)
+        pending.clear()
+        crops.clear()
+
+    try:
+        # grab() avance sans décoder : seules les images échantillonnées sont décodées
+        while capture.grab():
+            if index % step == 0:
+                ok, frame = capture.retrieve()
+                if ok:
+                    img = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+                    faces = _detect(img)
+                    if faces:
+                        crops.append(crop_faces(img, [face["box"] for face in faces]))
+                    pending.append((index, round(index / fps, 3), faces))
+                    sampled += 1
+                    if sum(len(c) for c in crops) >= _options["batch_size"]:
+                        flush()
+            index += 1
+        flush()
+    except Exception as e:
+        # Ligne d'erreur au lieu d'interrompre l'analyse : --resume retentera la vidéo
+        return [path], [{"source": path, "error": str(e)}], sampled
+    finally:
+        capture.release()
+    return [path], rows, sampled
+
+
+def _analyze(task: Tuple[str, List[str]]) -> Tuple[List[str], List[Dict[str, Any]], int]:
+    kind, paths = task
+    if kind == "video":
+        return _analyze_video(paths[0])
+    return _analyze_images(paths)
+
+
+class CSVSink:
+    """Sortie CSV unique, complétée et vidée sur disque à chaque paquet."""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def done_sources(self) -> Set[str]:
+        """Sources ayant au moins une ligne sans erreur (les erreurs sont retentées)."""
+        if not os.path.exists(self.path):
+            return set()
+        with open(self.path, newline="", encoding="utf-8") as f:
+            return {row["source"] for row in csv.DictReader(f) if not row.get("error")}
+
+    def __enter__(self):
+        exists = os.path.exists(self.path) and os.path.getsize(self.path) > 0
+        self._file = open(self.path, "a", newline="", encoding="utf-8")
+        self._writer = csv.DictWriter(self._file, fieldnames=COLUMNS)
+        if not exists:
+            self._writer.writeheader()
+        return self
+
+    def write(self, rows: List[Dict[str, Any]]) -> None:
+        self._writer.writerows(rows)
+        self._file.flush()
+
+    def __exit__(self, *exc):
+        self._file.close()
+
+
+class ParquetSink:
+    """
+    Sortie Parquet : un dossier de fichiers part-*.parquet, chacun complet et
+    lisible même si l'analyse est interrompue.
+    """
+
+    def __init__(self, path: str, flush_rows: int = 1000):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        self._pa, self._pq = pa, pq
+        self.path = path
+        self.flush_rows = flush_rows
+        self.schema = pa.schema(
+            [("source", pa.string()), ("frame", pa.int64()), ("time", pa.float64()), ("face", pa.int64())]
+            + [(name, pa.int64()) for name in ("x", "y", "w", "h")]
+            + [("detection_confidence", pa.float64()), ("prediction", pa.string()),
+               ("confidence", pa.float64()), ("label_fr", pa.string())]
+            + [(f"prob_{emotion}", pa.float64()) for emotion in EMOTION_CLASSES]
+            + [("error", pa.string())])
+
+    def done_sources(self) -> Set[str]:
+        """Sources ayant au moins une ligne sans erreur (les erreurs sont retentées)."""
+        if not os.path.isdir(self.path):
+            return set()
+        done = set()
+        for name in os.listdir(self.path):
+            if name.startswith("part-") and name.endswith(".parquet"):
+                table = self._pq.read_table(os.path.join(self.path, name), columns=["source", "error"])
+                done.update(source for source, error in zip(table.column("source").to_pylist(),
+                                                            table.column("error").to_pylist()) if not error)
+        return done
+
+    def __enter__(self):
+        os.makedirs(self.path, exist_ok=True)
+        self._run = time.strftime("%Y%m%d-%H%M%S")
+        self._part = 0
+        self._buffer: List[Dict[str, Any]] = []
+        return self
+
+    def _flush(self) -> None:
+        if not self._buffer:
+            return
+        table = self._pa.Table.from_pylist(self._buffer, schema=self.schema)
+        name = f"part-{self._run}-{self._part:05d}.parquet"
+        # Écriture dans un fichier temporaire puis renommage : pas de fichier tronqué
+        tmp = os.path.join(self.path, "." + name)
+        self._pq.write_table(table, tmp)
+        os.replace(tmp, os.path.join(self.path, name))
+        self._part += 1
+        self._buffer = []
+
+    def write(self, rows: List[Dict[str, Any]]) -> None:
+        self._buffer.extend(rows)
+        if len(self._buffer) >= self.flush_rows:
+            self._flush()
+
+    def __exit__(self, *exc):
+        self._flush()
+
+
+def run(inputs: List[str], output: str, output_format: str = "csv", workers: int = 0,
+        threads_per_worker: int = 1, backend: Optional[str] = None, model_path: Optional[str] = None,
+        detector: Optional[str] = None, chunk_size: int = 16, video_fps: float = 1.0,
+        max_side: int = 640, min_face: int = 20, multi_face: bool = False,
+        min_confidence: float = 0.9, resume: bool = True, quiet: bool = False,
+        decode_max_side: int = 0) -> Dict[str, Any]:
+    """
+    Analyse les images et vidéos des entrées et écrit les résultats dans la sortie.
+
+    Returns:
+        Dict[str, Any]: Bilan (sources, images, visages, durée, débit, cœurs)
+    """
+    workers = workers if workers > 0 else available_cpus()
+    sink = ParquetSink(output) if output_format == "parquet" else CSVSink(output)
+    done = sink.done_sources() if resume else set()
+
+    images, tasks = [], []
+    for path, kind in list_sources(inputs):
+        if path in done:
+            continue
+        if kind == "video":
+            tasks.append(("video", [path]))
+        else:
+            images.append(path)
+    tasks += [("image", images[i:i + chunk_size]) for i in range(0, len(images), chunk_size)]
+
+    options = {"max_side": max_side, "decode_max_side": decode_max_side, "min_face": min_face, "multi_face": multi_face,
+               "min_confidence": min_confidence, "video_fps": video_fps, "batch_size": max(chunk_size, 32)}
+    summary = {"sources": 0, "skipped": len(done), "images": 0, "faces": 0, "errors": 0,
+               "workers": workers, "threads_per_worker": threads_per_worker, "cpu_count": available_cpus()}
+    if not tasks:
+        return {**summary, "startup_seconds": 0.0, "elapsed_seconds": 0.0,
+                "images_per_second": 0.0, "images_per_second_per_worker": 0.0}
+
+    # spawn : chaque worker initialise son propre runtime TensorFlow
+    context = multiprocessing.get_context("spawn")
+    ready_queue = context.SimpleQueue()
+    start = time.perf_counter()
+    with sink, context.Pool(workers, initializer=_init_worker,
+                            initargs=(backend, model_path, threads_per_worker, detector, options,
+                                      ready_queue)) as pool:
+        # Le chronomètre de débit démarre quand chaque worker a signalé son modèle chargé et préchauffé
+        for _ in range(workers):
+            error = ready_queue.get()
+            if error is not None:
+                raise RuntimeError(f"Initialisation d'un worker impossible : {error}")
+        ready = time.perf_counter()
+        for sources, rows, count in pool.imap_unordered(_analyze, tasks):
+            sink.write(rows)
+            summary["sources"] += len(sources)
+            summary["images"] += count
+            summary["faces"] += sum(1 for row in rows if row.get("prediction"))
+            summary["errors"] += sum(1 for row in rows if row.get("error"))
+            if not quiet:
+                elapsed = time.perf_counter() - ready
+                print(f"\r{summary['sources']} sources, {summary['images']} images, "
+                      f"{summary['images'] / max(elapsed, 1e-9):.1f} img/s", end="", file=sys.stderr)
+    end = time.perf_counter()
+    if not quiet:
+        print(file=sys.stderr)
+    summary["startup_seconds"] = round(ready - start, 3)
+    summary["elapsed_seconds"] = round(end - ready, 3)
+    summary["images_per_second"] = round(summary["images"] / max(end - ready, 1e-9), 2)
+    summary["images_per_second_per_worker"] = round(summary["images_per_second"] / workers, 2)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("inputs", nargs="+", help="Dossiers, images ou vidéos à analyser")
+    parser.add_argument("output", help="Fichier CSV ou dossier Parquet de sortie")
+    parser.add_argument("--format", choices=["csv", "parquet"], default="csv")
+    parser.add_argument("--workers", type=int, default=0, help="Processus workers (0 = nombre de cœurs)")
+    parser.add_argument("--threads-per-worker", type=int, default=1, help="Threads d'inférence par worker")
+    parser.add_argument("--backend", default=None, help="auto, keras, saved_model ou tflite (défaut : MODEL_BACKEND)")
+    parser.add_argument("--model-path", default=None)
+    parser.add_argument("--detector", default=None, help="mtcnn, opencv_dnn ou haar (défaut : FACE_DETECTOR)")
+    parser.add_argument("--chunk-size", type=int, default=16, help="Images par paquet envoyé à un worker")
+    parser.add_argument("--video-fps", type=float, default=1.0, help="Images analysées par seconde de vidéo (0 = toutes)")
+    parser.add_argument("--max-side", type=int, default=640, help="Plus grand côté pour la détection")
+    parser.add_argument("--decode-max-side", type=int, default=0,
+                        help="Décodage JPEG réduit à ce plus grand côté (0 = pleine résolution ; "
+                             "les visages sont découpés dans l'image décodée)")
+    parser.add_argument("--min-face", type=int, default=20)
+    parser.add_argument("--multi-face", action="store_true")
+    parser.add_argument("--min-confidence", type=float, default=0.9)
+    parser.add_argument("--no-resume", action="store_true", help="Ne pas ignorer les sources déjà traitées")
+    parser.add_argument("--report", default=None, help="Écrire le bilan de débit dans ce fichier JSON")
+    args = parser.parse_args()
+
+    summary = run(args.inputs, args.output, args.format, args.workers, args.threads_per_worker,
+                  args.backend, args.model_path, args.detector, args.chunk_size, args.video_fps,
+                  args.max_side, args.min_face, args.multi_face, args.min_confidence,
+                  resume=not args.no_resume, decode_max_side=args.decode_max_side)
+    print(f"{summary['sources']} sources ({summary['skipped']} déjà traitées), {summary['images']} images, "
+          f"{summary['faces']} visages, {summary['errors']} erreurs")
+    print(f"{summary['images_per_second']} img/s avec {summary['workers']} workers "
+          f"x {summary['threads_per_worker']} threads sur {summary['cpu_count']} cœurs "
+          f"({summary['images_per_second_per_worker']} img/s par worker, "
+          f"chargement {summary['startup_seconds']} s)")
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(summary, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
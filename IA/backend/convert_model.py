@@ -1,13 +1,246 @@
 import tensorflow as tf
+import numpy as np
+import cv2
+from PIL import Image
+import argparse
+import json
 import os
 import sys
+import time
+
+from EmotionDisplay import EMOTION_CLASSES
+from face_preprocessing import CROP_SHAPE, FACE_SIZE, MODEL_INPUT_SHAPE, model_input, model_input_tf
 
 """
 Ce script convertit un modèle Keras (.h5) en format SavedModel,
 qui est généralement plus portable entre différentes versions de TensorFlow.
+Les modèles exportés (SavedModel et TFLite) sont des modèles de service : ils
+prennent des visages découpés uint8 RGB et font la conversion en niveaux de gris
+et la normalisation dans le graphe (voir face_preprocessing.py).
 """
 
-def convert_model():
+def load_face_dataset(directory, max_per_class=None, seed=42):
+    """
+    Charge des images de visages FER2013 (un sous-dossier par émotion).
+    
+    Args:
+        directory (str): Dossier contenant un sous-dossier par classe
+        max_per_class (int, optional): Nombre maximal d'images par classe
+        seed (int): Graine du tirage aléatoire des images
+        
+    Returns:
+        tuple: Visages uint8 RGB (N, 48, 48, 3), comme les découpe l'API, étiquettes (N,)
+    """
+    rng = np.random.default_rng(seed)
+    images, labels = [], []
+    for label, emotion in enumerate(EMOTION_CLASSES):
+        class_dir = os.path.join(directory, emotion)
+        if not os.path.isdir(class_dir):
+            continue
+        files = sorted(os.listdir(class_dir))
+        if max_per_class is not None and len(files) > max_per_class:
+            files = list(rng.choice(files, max_per_class, replace=False))
+        for name in files:
+            img = np.asarray(Image.open(os.path.join(class_dir, name)).convert('RGB'))
+            images.append(cv2.resize(img, FACE_SIZE, interpolation=cv2.INTER_LINEAR))
+            labels.append(label)
+    if not images:
+        raise ValueError(f"Aucune image trouvée dans '{directory}'")
+    return np.stack(images), np.array(labels)
+
+def build_serving_module(model):
+    """
+    Enveloppe le modèle Keras dans un module de service à entrée uint8.
+    
+    Args:
+        model (tf.keras.Model): Modèle Keras float (entrée (N, 48, 48, 1) normalisée)
+        
+    Returns:
+        tf.Module: Module avec les fonctions serve (visages uint8 de toute taille)
+        et serve_float (ancienne entrée float32)
+    """
+    module = tf.Module()
+    module.model = model
+    module.serve = tf.function(
+        lambda faces: {"probabilities": model(model_input_tf(faces), training=False)},
+        input_signature=[tf.TensorSpec([None, None, None, CROP_SHAPE[-1]], tf.uint8, name="faces")])
+    module.serve_float = tf.function(
+        lambda inputs: {"probabilities": model(inputs, training=False)},
+        input_signature=[tf.TensorSpec([None, *MODEL_INPUT_SHAPE], tf.float32, name="inputs")])
+    return module
+
+def build_serving_model(model):
+    """
+    Modèle Keras de service à entrée uint8 (N, 48, 48, 3), pour la conversion TFLite.
+    
+    Args:
+        model (tf.keras.Model): Modèle Keras float
+        
+    Returns:
+        tf.keras.Model: Modèle avec le prétraitement en première couche
+    """
+    inputs = tf.keras.Input(shape=CROP_SHAPE, dtype="uint8", name="faces")
+    x = tf.keras.layers.Lambda(model_input_tf, output_shape=MODEL_INPUT_SHAPE, name="preprocess")(inputs)
+    return tf.keras.Model(inputs, model(x), name="emotion_serving")
+
+def check_serving_parity(model, saved_model_path, tflite_path, tolerance=1e-4, samples=16, seed=0):
+    """
+    Vérifie que les modèles de service donnent les mêmes probabilités que le modèle
+    Keras appliqué au prétraitement NumPy de référence.
+    
+    Args:
+        model (tf.keras.Model): Modèle Keras float
+        saved_model_path (str): SavedModel de service
+        tflite_path (str): Modèle TFLite de service
+        tolerance (float): Écart maximal toléré sur les probabilités
+        samples (int): Nombre de visages aléatoires comparés
+        seed (int): Graine du tirage des visages
+        
+    Returns:
+        dict: Écart maximal de chaque modèle exporté
+    """
+    crops = np.random.default_rng(seed).integers(0, 256, (samples, *CROP_SHAPE), dtype=np.uint8)
+    reference = model(model_input(crops), training=False).numpy()
+    
+    signature = tf.saved_model.load(saved_model_path).signatures["serving_default"]
+    saved = signature(faces=tf.constant(crops))["probabilities"].numpy()
+    
+    interpreter = tf.lite.Interpreter(model_path=tflite_path)
+    input_index = interpreter.get_input_details()[0]["index"]
+    interpreter.resize_tensor_input(input_index, [samples, *CROP_SHAPE])
+    interpreter.allocate_tensors()
+    interpreter.set_tensor(input_index, crops)
+    interpreter.invoke()
+    tflite = interpreter.get_tensor(interpreter.get_output_details()[0]["index"])
+    
+    deltas = {"saved_model": float(np.abs(saved - reference).max()),
+              "tflite": float(np.abs(tflite - reference).max())}
+    for name, delta in deltas.items():
+        if delta > tolerance:
+            raise ValueError(f"Prétraitement du modèle {name} différent de la référence (écart {delta:.2e})")
+    return deltas
+
+def convert_int8(model, calibration_images):
+    """
+    Produit un modèle TFLite entièrement quantifié en INT8 (entrée et sortie uint8).
+    
+    Args:
+        model (tf.keras.Model): Modèle Keras float
+        calibration_images (np.ndarray): Jeu de calibration, visages uint8 (N, 48, 48, 3)
+        
+    Returns:
+        bytes: Modèle TFLite quantifié
+    """
+    def representative_dataset():
+        for image in model_input(calibration_images):
+            yield [image[np.newaxis]]
+    
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    converter.representative_dataset = representative_dataset
+    converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+    converter.inference_input_type = tf.uint8
+    converter.inference_output_type = tf.uint8
+    return converter.convert()
+
+def evaluate_tflite(model_path, images, labels, latency_runs=200):
+    """
+    Mesure la précision par classe et la latence d'inférence (lot de 1) d'un modèle TFLite.
+    
+    Args:
+        model_path (str): Chemin du modèle TFLite
+        images (np.ndarray): Visages uint8 RGB (N, 48, 48, 3)
+        labels (np.ndarray): Étiquettes (N,)
+        latency_runs (int): Nombre d'inférences chronométrées
+        
+    Returns:
+        dict: Taille, latence médiane, précision globale et par classe
+    """
+    interpreter = tf.lite.Interpreter(model_path=model_path, num_threads=1)
+    interpreter.allocate_tensors()
+    input_details = interpreter.get_input_details()[0]
+    output_details = interpreter.get_output_details()[0]
+    in_scale, in_zero = input_details['quantization']
+    out_scale, out_zero = output_details['quantization']
+    
+    accepts_crops = input_details['shape'][-1] == CROP_SHAPE[-1]
+    
+    def run(image):
+        image = image[np.newaxis]
+        if not accepts_crops:
+            # Modèle sans prétraitement intégré (modèle INT8) : entrée préparée en NumPy
+            image = model_input(image)
+            if input_details['dtype'] == np.uint8:
+                image = np.clip(np.round(image / in_scale + in_zero), 0, 255).astype(np.uint8)
+        interpreter.set_tensor(input_details['index'], image)
+        interpreter.invoke()
+        output = interpreter.get_tensor(output_details['index'])[0]
+        if output_details['dtype'] == np.uint8:
+            output = (output.astype(np.float32) - out_zero) * out_scale
+        return output
+    
+    predictions = np.array([np.argmax(run(image)) for image in images])
+    per_class = {}
+    for label, emotion in enumerate(EMOTION_CLASSES):
+        mask = labels == label
+        if mask.any():
+            per_class[emotion] = float(np.mean(predictions[mask] == label))
+    
+    timings = []
+    for i in range(latency_runs):
+        start = time.perf_counter()
+        run(images[i % len(images)])
+        timings.append((time.perf_counter() - start) * 1000)
+    
+    return {
+        "size_bytes": os.path.getsize(model_path),
+        "latency_ms_p50": float(np.median(timings)),
+        "accuracy": float(np.mean(predictions == labels)),
+        "per_class_accuracy": per_class,
+    }
+
+def quantize_model(model, calibration_dir, eval_dir, calibration_samples=100,
+                   float_path="model.tflite", int8_path="model_int8.tflite",
+                   report_path="quantization_report.json"):
+    """
+    Quantifie le modèle en INT8 et écrit un rapport de comparaison avec le modèle float.
+    
+    Args:
+        model (tf.keras.Model): Modèle Keras float
+        calibration_dir (str): Dossier d'entraînement FER2013 (jeu de calibration)
+        eval_dir (str): Dossier d'évaluation FER2013
+        calibration_samples (int): Nombre d'images de calibration par classe
+        float_path (str): Modèle TFLite float de référence
+        int8_path (str): Chemin du modèle quantifié
+        report_path (str): Chemin du rapport JSON
+    """
+    print(f"Chargement du jeu de calibration depuis '{calibration_dir}'...")
+    calibration_images, _ = load_face_dataset(calibration_dir, max_per_class=calibration_samples)
+    
+    print("Quantification INT8 du modèle...")
+    with open(int8_path, "wb") as f:
+        f.write(convert_int8(model, calibration_images))
+    print(f"Modèle INT8 sauvegardé dans '{int8_path}'.")
+    
+    print(f"Évaluation des modèles float et INT8 sur '{eval_dir}'...")
+    eval_images, eval_labels = load_face_dataset(eval_dir)
+    report = {
+        "eval_dir": eval_dir,
+        "eval_samples": int(len(eval_labels)),
+        "float": evaluate_tflite(float_path, eval_images, eval_labels),
+        "int8": evaluate_tflite(int8_path, eval_images, eval_labels),
+    }
+    report["size_ratio"] = report["float"]["size_bytes"] / report["int8"]["size_bytes"]
+    report["speedup"] = report["float"]["latency_ms_p50"] / report["int8"]["latency_ms_p50"]
+    report["accuracy_delta"] = report["int8"]["accuracy"] - report["float"]["accuracy"]
+    
+    with open(report_path, "w") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"Rapport écrit dans '{report_path}': taille /{report['size_ratio']:.1f}, "
+          f"accélération x{report['speedup']:.1f}, précision {report['accuracy_delta']:+.4f}")
+
+def convert_model(quantize=None, calibration_dir="dataset/train", eval_dir="dataset/test",
+                  calibration_samples=100):
     # Vérifier si le fichier du modèle existe
     if not os.path.exists("best_model.h5"):
         print("Erreur: Le fichier 'best_model.h5' n'existe pas dans le répertoire courant.")
@@ -84,25 +317,50 @@ def convert_model():
                 print("La conversion a échoué. Veuillez vérifier la compatibilité du modèle.")
                 sys.exit(1)
         
-        # Sauvegarder en format SavedModel
+        # Sauvegarder en format SavedModel, avec le prétraitement dans le graphe
         print("Conversion du modèle en format SavedModel...")
         save_path = "saved_model"
-        tf.saved_model.save(model, save_path)
+        serving = build_serving_module(model)
+        tf.saved_model.save(serving, save_path, signatures={
+            "serving_default": serving.serve,
+            "serving_float": serving.serve_float,
+        })
         print(f"Modèle converti et sauvegardé avec succès dans le dossier '{save_path}'")
         
         # Sauvegarder en format TFLite (optionnel - plus léger pour le déploiement)
         print("Conversion du modèle en format TFLite...")
-        converter = tf.lite.TFLiteConverter.from_saved_model(save_path)
+        # Conversion depuis un modèle Keras : depuis le SavedModel, les variables
+        # restent des ressources (READ_VARIABLE) que l'interpréteur ne sait pas lire
+        converter = tf.lite.TFLiteConverter.from_keras_model(build_serving_model(model))
         tflite_model = converter.convert()
         
         with open("model.tflite", "wb") as f:
             f.write(tflite_model)
         print("Modèle TFLite sauvegardé.")
         
+        deltas = check_serving_parity(model, save_path, "model.tflite")
+        print(f"Prétraitement intégré vérifié (écart max SavedModel {deltas['saved_model']:.1e}, "
+              f"TFLite {deltas['tflite']:.1e}).")
+        
+        # Quantification entière (optionnelle - plus rapide sur CPU, précision légèrement réduite)
+        if quantize == "int8":
+            quantize_model(model, calibration_dir, eval_dir, calibration_samples)
+        
     except Exception as e:
         print(f"Une erreur est survenue lors de la conversion: {e}")
         sys.exit(1)
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Conversion du modèle d'émotions")
+    parser.add_argument("--quantize", choices=["none", "int8"], default="none",
+                        help="Produire aussi un modèle TFLite entièrement quantifié")
+    parser.add_argument("--calibration-dir", default="dataset/train",
+                        help="Dossier FER2013 utilisé pour la calibration INT8")
+    parser.add_argument("--eval-dir", default="dataset/test",
+                        help="Dossier FER2013 utilisé pour le rapport de comparaison")
+    parser.add_argument("--calibration-samples", type=int, default=100,
+                        help="Nombre d'images de calibration par classe")
+    args = parser.parse_args()
+    
     print("Démarrage de la conversion du modèle...")
-    convert_model()
\ No newline at end of file
+    convert_model(args.quantize, args.calibration_dir, args.eval_dir, args.calibration_samples)
\ No newline at end of file
@@ -0,0 +1,53 @@
+"""
+Nombre de cœurs réellement utilisables par le processus.
+os.cpu_count() renvoie les cœurs de l'hôte, y compris dans un conteneur limité
+à quelques CPU : les pools de threads et de processus dimensionnés dessus
+surchargent alors la machine. Le nombre retenu est celui de l'affinité du
+processus (taskset, cpuset), plafonné par le quota CPU du cgroup
+(docker --cpus, limits.cpu de Kubernetes), arrondi à l'inférieur.
+"""
+
+import math
+import os
+from typing import Optional
+
+
+def _read(path: str) -> Optional[str]:
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def cgroup_cpu_quota() -> Optional[float]:
+    """Renvoie le quota CPU du cgroup en nombre de cœurs, ou None s'il n'y en a pas."""
+    # cgroup v2 : "quota période" ou "max période"
+    cpu_max = _read("/sys/fs/cgroup/cpu.max")
+    if cpu_max:
+        quota, _, period = cpu_max.partition(" ")
+        if quota != "max" and period:
+            return int(quota) / int(period)
+        return None
+    # cgroup v1 : quota à -1 quand il n'y a pas de limite
+    quota = _read("/sys/fs/cgroup/cpu/cpu.cfs_quota_us")
+    period = _read("/sys/fs/cgroup/cpu/cpu.cfs_period_us")
+    if quota and period and int(quota) > 0:
+        return int(quota) / int(period)
+    return None
+
+
+def available_cpus() -> int:
+    """Renvoie le nombre de cœurs utilisables (affinité plafonnée par le quota du cgroup), au moins 1."""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        # sched_getaffinity n'existe pas sous macOS et Windows
+        cpus = os.cpu_count() or 1
+    try:
+        quota = cgroup_cpu_quota()
+    except ValueError:
+        quota = None
+    if quota is not None:
+        cpus = min(cpus, math.floor(quota))
+    return max(1, cpus)
@@ -0,0 +1,138 @@
+"""
+Statistiques glissantes des émotions d'une session, mises à jour en O(1) à
+chaque prédiction : comptes sur une fenêtre, probabilités lissées (moyenne
+mobile exponentielle), temps passé dans chaque émotion et matrice des
+transitions. Le résumé est servi sans parcourir l'historique.
+"""
+
+import threading
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from EmotionDisplay import EMOTION_CLASSES, get_emotion_transition
+
+# Types de transition renvoyés par get_emotion_transition
+TRANSITION_TYPES = ["stable", "improvement", "deterioration", "neutralization", "change"]
+
+
+def build_transition_table(emotion_labels: List[str]) -> np.ndarray:
+    """
+    Précalcule le type de transition pour chaque couple (précédente, actuelle).
+
+    Returns:
+        np.ndarray: Indices dans TRANSITION_TYPES, de forme (n, n)
+    """
+    n = len(emotion_labels)
+    table = np.zeros((n, n), dtype=np.int8)
+    for i, previous in enumerate(emotion_labels):
+        for j, current in enumerate(emotion_labels):
+            table[i, j] = TRANSITION_TYPES.index(get_emotion_transition(current, previous)["type"])
+    return table
+
+
+class EmotionStats:
+    """
+    Moteur de statistiques incrémentales d'une session.
+
+    Args:
+        window_size (int): Nombre de prédictions de la fenêtre glissante
+        alpha (float): Coefficient de lissage exponentiel (poids de la nouvelle prédiction)
+        max_gap (float): Écart maximal (s) entre deux prédictions compté dans le temps passé
+        emotion_labels (List[str]): Noms des émotions, dans l'ordre du modèle
+    """
+
+    def __init__(self, window_size: int = 10, alpha: float = 0.3, max_gap: float = 5.0,
+                 emotion_labels: List[str] = EMOTION_CLASSES):
+        n = len(emotion_labels)
+        self.emotion_labels = emotion_labels
+        self.window_size = max(1, window_size)
+        self.alpha = alpha
+        self.max_gap = max_gap
+        self.transition_table = build_transition_table(emotion_labels)
+        self._window = np.zeros(self.window_size, dtype=np.int8)
+        self._next = 0
+        self.window_counts = np.zeros(n, dtype=np.int64)
+        self.smoothed = np.zeros(n, dtype=np.float64)
+        self.dwell = np.zeros(n, dtype=np.float64)
+        self.transitions = np.zeros((n, n), dtype=np.int64)
+        self.transition_types = np.zeros(len(TRANSITION_TYPES), dtype=np.int64)
+        self.total = 0
+        self.current: Optional[int] = None
+        self.previous: Optional[int] = None
+        self.current_since = 0.0
+        self.last_timestamp = 0.0
+        self.lock = threading.Lock()
+
+    def update(self, timestamp: float, probabilities: np.ndarray) -> None:
+        """
+        Intègre une prédiction.
+
+        Args:
+            timestamp (float): Horodatage Unix de la prédiction
+            probabilities (np.ndarray): Probabilités des émotions
+        """
+        label = int(np.argmax(probabilities))
+        with self.lock:
+            # Fenêtre glissante : l'entrée qui sort est remplacée par la nouvelle
+            if self.total >= self.window_size:
+                self.window_counts[self._window[self._next]] -= 1
+            self._window[self._next] = label
+            self.window_counts[label] += 1
+            self._next = (self._next + 1) % self.window_size
+
+            if self.total == 0:
+                self.smoothed[:] = probabilities
+            else:
+                self.smoothed += self.alpha * (probabilities - self.smoothed)
+
+            if self.current is not None:
+                self.dwell[self.current] += min(max(0.0, timestamp - self.last_timestamp), self.max_gap)
+                self.transitions[self.current, label] += 1
+                self.transition_types[self.transition_table[self.current, label]] += 1
+            if label != self.current:
+                self.current_since = timestamp
+            self.previous = self.current
+            self.current = label
+            self.last_timestamp = timestamp
+            self.total += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Renvoie le résumé courant des statistiques.
+
+        Returns:
+            Dict[str, Any]: Comptes de la fenêtre, état lissé, temps passé et transitions
+        """
+        labels = self.emotion_labels
+        with self.lock:
+            if self.total == 0:
+                return {"count": 0}
+            smoothed = int(np.argmax(self.smoothed))
+            last_transition = None
+            if self.previous is not None:
+                last_transition = get_emotion_transition(labels[self.current], labels[self.previous])
+            return {
+                "count": self.total,
+                "window": {
+                    "size": int(min(self.total, self.window_size)),
+                    "counts": {label: int(c) for label, c in zip(labels, self.window_counts)},
+                    "dominant_emotion": labels[int(np.argmax(self.window_counts))],
+                },
+                "smoothed": {
+                    "emotion": labels[smoothed],
+                    "confidence": float(self.smoothed[smoothed]),
+                    "probabilities": {label: float(p) for label, p in zip(labels, self.smoothed)},
+                },
+                "current": {
+                    "emotion": labels[self.current],
+                    "duration": float(self.last_timestamp - self.current_since),
+                },
+                "dwell_seconds": {label: float(d) for label, d in zip(labels, self.dwell)},
+                "transitions": {
+                    "matrix": {previous: {current: int(c) for current, c in zip(labels, row)}
+                               for previous, row in zip(labels, self.transitions)},
+                    "types": {t: int(c) for t, c in zip(TRANSITION_TYPES, self.transition_types)},
+                    "last": last_transition,
+                },
+            }
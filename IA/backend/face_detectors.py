@@ -0,0 +1,172 @@
+"""
+Moteurs de détection de visages interchangeables.
+Tous les détecteurs suivent l'interface de MTCNN : detect_faces(img) renvoie
+une liste de dictionnaires {'box': [x, y, w, h], 'confidence': float} pour une
+image RGB. Le paramètre min_face_size limite la recherche aux visages d'au moins
+cette taille (pyramide de MTCNN, minSize de la cascade de Haar), ce qui évite
+le coût des petites échelles.
+
+    FACE_DETECTOR       mtcnn (défaut) | opencv_dnn | haar
+    FACE_DNN_PROTOTXT   fichier deploy.prototxt du détecteur SSD ResNet-10
+    FACE_DNN_MODEL      poids res10_300x300_ssd_iter_140000.caffemodel
+"""
+
+import os
+import threading
+from typing import Any, Dict, List, Optional
+
+import cv2
+import numpy as np
+
+
+class FaceDetector:
+    """Interface commune des détecteurs de visages."""
+
+    name = "base"
+
+    def detect_faces(self, img: np.ndarray, min_face_size: int = 0) -> List[Dict[str, Any]]:
+        """
+        Args:
+            img (np.ndarray): Image RGB
+            min_face_size (int): Taille minimale des visages recherchés, en pixels de img
+                (0 = réglage par défaut du détecteur)
+        """
+        raise NotImplementedError
+
+
+class MTCNNDetector(FaceDetector):
+    """
+    Détecteur MTCNN : le plus précis, mais le plus coûteux.
+    La taille minimale fixe la plus petite échelle de la pyramide d'images ; elle
+    est lue par MTCNN à chaque détection, d'où une instance partagée entre les
+    threads par palier de taille (MIN_FACE_STEPS). La taille demandée est arrondie
+    au palier inférieur : le nombre d'instances reste borné quelle que soit la
+    taille des images, et detect_faces de pipeline.py écarte les visages plus petits.
+    """
+
+    name = "mtcnn"
+    # Taille minimale par défaut de MTCNN : en dessous, la pyramide agrandirait l'image
+    DEFAULT_MIN_FACE = 20
+    # Paliers de taille minimale, un réseau MTCNN chargé au plus par palier
+    MIN_FACE_STEPS = (20, 32, 48, 64, 96, 128)
+
+    def __init__(self):
+        self._detectors: Dict[int, Any] = {}
+        self._lock = threading.Lock()
+        self._detector_for(self.DEFAULT_MIN_FACE)
+
+    def _detector_for(self, min_face_size: int):
+        with self._lock:
+            if min_face_size not in self._detectors:
+                from mtcnn import MTCNN
+                self._detectors[min_face_size] = MTCNN(min_face_size=min_face_size)
+            return self._detectors[min_face_size]
+
+    def detect_faces(self, img: np.ndarray, min_face_size: int = 0) -> List[Dict[str, Any]]:
+        step = max((size for size in self.MIN_FACE_STEPS if size <= min_face_size), default=self.DEFAULT_MIN_FACE)
+        return self._detector_for(step).detect_faces(img)
+
+
+class OpenCVDNNDetector(FaceDetector):
+    """
+    Détecteur SSD ResNet-10 du module DNN d'OpenCV (entrée 300x300).
+    Un réseau est chargé par thread, cv2.dnn.Net n'étant pas réentrant.
+
+    Args:
+        prototxt (str): Chemin du fichier deploy.prototxt
+        model (str): Chemin des poids Caffe
+        confidence_threshold (float): Confiance minimale des détections
+    """
+
+    name = "opencv_dnn"
+
+    def __init__(self, prototxt: Optional[str] = None, model: Optional[str] = None,
+                 confidence_threshold: float = 0.5):
+        self.prototxt = prototxt or os.environ.get("FACE_DNN_PROTOTXT", "models/deploy.prototxt")
+        self.model = model or os.environ.get("FACE_DNN_MODEL", "models/res10_300x300_ssd_iter_140000.caffemodel")
+        self.confidence_threshold = confidence_threshold
+        self._local = threading.local()
+        # Charger une première fois pour signaler au démarrage un fichier manquant
+        self._net()
+
+    def _net(self):
+        if not hasattr(self._local, "net"):
+            self._local.net = cv2.dnn.readNetFromCaffe(self.prototxt, self.model)
+        return self._local.net
+
+    def detect_faces(self, img: np.ndarray, min_face_size: int = 0) -> List[Dict[str, Any]]:
+        # Entrée 300x300 fixe : la taille minimale est appliquée par detect_faces (pipeline.py)
+        h, w = img.shape[:2]
+        # Le modèle attend du BGR : swapRB convertit l'image RGB
+        blob = cv2.dnn.blobFromImage(img, 1.0, (300, 300), (104.0, 177.0, 123.0), swapRB=True)
+        net = self._net()
+        net.setInput(blob)
+        detections = net.forward()[0, 0]
+        faces = []
+        for detection in detections[detections[:, 2] >= self.confidence_threshold]:
+            x1, y1, x2, y2 = (detection[3:7] * np.array([w, h, w, h])).astype(int)
+            x1, y1 = max(0, x1), max(0, y1)
+            if x2 > x1 and y2 > y1:
+                faces.append({'box': [int(x1), int(y1), int(x2 - x1), int(y2 - y1)],
+                              'confidence': float(detection[2])})
+        return faces
+
+
+class HaarDetector(FaceDetector):
+    """
+    Cascade de Haar fournie avec opencv-python : très rapide, moins robuste
+    aux visages de profil. La confiance est dérivée du poids du dernier étage.
+    """
+
+    name = "haar"
+
+    def __init__(self, cascade: Optional[str] = None, min_neighbors: int = 5):
+        self.cascade = cascade or os.path.join(cv2.data.haarcascades, "haarcascade_frontalface_default.xml")
+        self.min_neighbors = min_neighbors
+        self._local = threading.local()
+        if self._classifier().empty():
+            raise ValueError(f"Impossible de charger la cascade '{self.cascade}'")
+
+    def _classifier(self):
+        if not hasattr(self._local, "classifier"):
+            self._local.classifier = cv2.CascadeClassifier(self.cascade)
+        return self._local.classifier
+
+    def detect_faces(self, img: np.ndarray, min_face_size: int = 0) -> List[Dict[str, Any]]:
+        gray = cv2.cvtColor(img, cv2.COLOR_RGB2GRAY) if img.ndim == 3 else img
+        min_size = (int(min_face_size), int(min_face_size))
+        boxes, _, weights = self._classifier().detectMultiScale3(
+            gray, scaleFactor=1.1, minNeighbors=self.min_neighbors, minSize=min_size, outputRejectLevels=True)
+        return [
+            {'box': [int(v) for v in box], 'confidence': float(1.0 / (1.0 + np.exp(-weight)))}
+            for box, weight in zip(boxes, np.ravel(weights))
+        ]
+
+
+DETECTORS = {
+    "mtcnn": MTCNNDetector,
+    "opencv_dnn": OpenCVDNNDetector,
+    "haar": HaarDetector,
+}
+
+_instances: Dict[str, FaceDetector] = {}
+_instances_lock = threading.Lock()
+
+
+def get_detector(name: Optional[str] = None) -> FaceDetector:
+    """
+    Renvoie le détecteur demandé, instancié une seule fois par processus.
+
+    Args:
+        name (Optional[str]): Nom du détecteur (défaut : FACE_DETECTOR ou "mtcnn")
+
+    Returns:
+        FaceDetector: Détecteur prêt à l'emploi
+    """
+    name = (name or os.environ.get("FACE_DETECTOR", "mtcnn")).lower()
+    if name not in DETECTORS:
+        raise ValueError(f"Détecteur inconnu: {name} (choix: {', '.join(DETECTORS)})")
+    with _instances_lock:
+        if name not in _instances:
+            _instances[name] = DETECTORS[name]()
+        return _instances[name]
@@ -0,0 +1,63 @@
+"""
+Prétraitement des visages, commun à l'entraînement, à la conversion du modèle et à l'API.
+
+Le modèle d'émotions attend des visages 48x48 en niveaux de gris, en float32
+entre 0 et 1 (N, 48, 48, 1). L'API ne fait plus que découper et redimensionner
+les visages en uint8 RGB (N, 48, 48, 3) ; la conversion en niveaux de gris et la
+normalisation sont faites :
+    - dans le graphe des modèles exportés par convert_model.py (model_input_tf),
+    - sinon par model_input, implémentation NumPy de référence des mêmes calculs.
+
+Les niveaux de gris utilisent les coefficients ITU-R BT.601, ceux de
+cv2.COLOR_RGB2GRAY et de PIL (mode "L", utilisé par les générateurs Keras à
+l'entraînement). Le redimensionnement est bilinéaire (centres de pixels décalés
+d'un demi-pixel), comme cv2.INTER_LINEAR.
+"""
+
+import numpy as np
+
+FACE_SIZE = (48, 48)
+# Entrée du modèle Keras : niveaux de gris normalisés
+MODEL_INPUT_SHAPE = (48, 48, 1)
+# Entrée des modèles de service : visages découpés, uint8 RGB
+CROP_SHAPE = (48, 48, 3)
+GRAY_WEIGHTS = (0.299, 0.587, 0.114)
+PIXEL_SCALE = 1.0 / 255.0
+
+# Conversion en niveaux de gris et normalisation combinées en un seul produit
+_INPUT_WEIGHTS = np.array(GRAY_WEIGHTS, dtype=np.float32) * np.float32(PIXEL_SCALE)
+
+
+def model_input(crops: np.ndarray) -> np.ndarray:
+    """
+    Convertit des visages découpés en entrée du modèle (référence NumPy de model_input_tf).
+
+    Args:
+        crops (np.ndarray): Visages uint8 de forme (N, 48, 48, 3) en RGB, ou (N, 48, 48, 1)
+
+    Returns:
+        np.ndarray: Tableau float32 de forme (N, 48, 48, 1) normalisé entre 0 et 1
+    """
+    if crops.shape[-1] == 1:
+        return np.multiply(crops, np.float32(PIXEL_SCALE), dtype=np.float32)
+    return np.dot(crops, _INPUT_WEIGHTS)[..., np.newaxis]
+
+
+def model_input_tf(crops):
+    """
+    Version TensorFlow de model_input, intégrée au graphe des modèles de service.
+    Les visages d'une autre taille que 48x48 sont redimensionnés dans le graphe.
+
+    Args:
+        crops (tf.Tensor): Visages uint8 (N, H, W, 3) en RGB, ou (N, H, W, 1)
+
+    Returns:
+        tf.Tensor: Tenseur float32 (N, 48, 48, 1) normalisé entre 0 et 1
+    """
+    import tensorflow as tf
+    x = tf.cast(crops, tf.float32)
+    if tuple(x.shape[1:3]) != FACE_SIZE:
+        x = tf.image.resize(x, FACE_SIZE, method="bilinear")
+    if x.shape[-1] == 1:
+        return x * PIXEL_SCALE
+    return tf.tensordot(x, tf.constant(_INPUT_WEIGHTS), axes=1)[..., tf.newaxis]
@@ -0,0 +1,141 @@
+"""
+Filtrage des images quasi identiques d'un flux vidéo.
+Quand l'utilisateur reste immobile devant la caméra, les images successives
+diffèrent à peine : une signature très réduite de l'image (vignette 16x16 en
+niveaux de gris) est comparée à celle de la dernière image réellement analysée,
+et si l'écart moyen reste sous le seuil, le résultat précédent est renvoyé sans
+détection ni inférence.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+import cv2
+import numpy as np
+
+# Côté de la vignette utilisée comme signature
+SIGNATURE_SIZE = 16
+
+
+def frame_signature(img: np.ndarray) -> np.ndarray:
+    """
+    Calcule la signature d'une image RGB : vignette en niveaux de gris.
+
+    Args:
+        img (np.ndarray): Image RGB
+
+    Returns:
+        np.ndarray: Vignette float32 de SIGNATURE_SIZE x SIGNATURE_SIZE
+    """
+    small = cv2.resize(img, (SIGNATURE_SIZE, SIGNATURE_SIZE), interpolation=cv2.INTER_AREA)
+    if small.ndim == 3:
+        small = cv2.cvtColor(small, cv2.COLOR_RGB2GRAY)
+    return small.astype(np.float32)
+
+
+class FrameGate:
+    """
+    Cache du dernier résultat d'un flux, réutilisé tant que l'image ne change pas.
+
+    Args:
+        threshold (float): Écart moyen maximal (niveaux de gris, 0-255) pour réutiliser le résultat
+        max_skips (int): Nombre maximal d'images consécutives servies depuis le cache
+    """
+
+    def __init__(self, threshold: float = 2.0, max_skips: int = 15):
+        self.threshold = threshold
+        self.max_skips = max_skips
+        self.signature: Optional[np.ndarray] = None
+        self.key: Optional[Hashable] = None
+        self.result: Optional[Dict[str, Any]] = None
+        self.probabilities: Optional[np.ndarray] = None
+        self.skips = 0
+        self.last_seen = time.monotonic()
+        self.lock = threading.Lock()
+
+    def lookup(self, signature: np.ndarray, key: Hashable) -> Optional[Tuple[Dict[str, Any], Optional[np.ndarray]]]:
+        """
+        Renvoie le résultat en cache si l'image est assez proche de l'image de référence.
+
+        Args:
+            signature (np.ndarray): Signature de l'image courante
+            key (Hashable): Paramètres de la requête (le cache n'est valable que pour les mêmes)
+
+        Returns:
+            Optional[Tuple]: Résultat et probabilités du visage principal, ou None
+        """
+        with self.lock:
+            self.last_seen = time.monotonic()
+            if (self.signature is None or key != self.key or self.skips >= self.max_skips
+                    or float(np.mean(np.abs(signature - self.signature))) > self.threshold):
+                return None
+            self.skips += 1
+            return self.result, self.probabilities
+
+    def store(self, signature: np.ndarray, key: Hashable, result: Dict[str, Any],
+              probabilities: Optional[np.ndarray]) -> None:
+        """Enregistre le résultat d'une image analysée comme nouvelle référence."""
+        with self.lock:
+            self.signature = signature
+            self.key = key
+            self.result = result
+            self.probabilities = probabilities
+            self.skips = 0
+
+
+class FrameGateRegistry:
+    """
+    Filtres actifs par flux, avec éviction LRU, expiration et comptage des images évitées.
+
+    Args:
+        max_streams (int): Nombre maximal de flux conservés
+        ttl_seconds (float): Durée d'inactivité après laquelle un flux est oublié
+        **gate_options: Paramètres transmis à chaque FrameGate
+    """
+
+    def __init__(self, max_streams: int = 1000, ttl_seconds: float = 60.0, **gate_options):
+        self.max_streams = max_streams
+        self.ttl_seconds = ttl_seconds
+        self.gate_options = gate_options
+        self._gates: "OrderedDict[str, FrameGate]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.frames = 0
+        self.skipped = 0
+
+    def get(self, stream_id: str) -> FrameGate:
+        """Renvoie le filtre du flux, en le créant au besoin."""
+        now = time.monotonic()
+        with self._lock:
+            gate = self._gates.pop(stream_id, None)
+            if gate is None or now - gate.last_seen > self.ttl_seconds:
+                gate = FrameGate(**self.gate_options)
+            self._gates[stream_id] = gate
+            while len(self._gates) > self.max_streams:
+                self._gates.popitem(last=False)
+            return gate
+
+    def discard(self, stream_id: str) -> None:
+        """Oublie le filtre d'un flux terminé."""
+        with self._lock:
+            self._gates.pop(stream_id, None)
+
+    def record(self, skipped: bool) -> None:
+        """Compte une image filtrée, évitée ou non."""
+        with self._lock:
+            self.frames += 1
+            self.skipped += int(skipped)
+
+    def stats(self) -> Dict[str, Any]:
+        """Renvoie le nombre d'images vues et évitées, et le taux d'évitement."""
+        with self._lock:
+            return {
+                "streams": len(self._gates),
+                "frames": self.frames,
+                "skipped": self.skipped,
+                "skip_rate": self.skipped / self.frames if self.frames else 0.0,
+            }
+
+    def __len__(self) -> int:
+        return len(self._gates)
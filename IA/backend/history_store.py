@@ -0,0 +1,119 @@
+"""
+Historique compact des émotions détectées, par session.
+Chaque session dispose d'un tampon circulaire de capacité fixe, stocké dans
+des tableaux NumPy préalloués (horodatage, indice d'émotion, 7 probabilités
+float32) : l'ajout est en O(1), sans copie ni image stockée. Un moteur de
+statistiques glissantes (emotion_stats.EmotionStats) peut être rattaché à
+chaque tampon et est alors mis à jour à chaque ajout.
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Optional, Tuple
+
+import numpy as np
+
+
+class EmotionRingBuffer:
+    """
+    Tampon circulaire des prédictions d'une session.
+
+    Args:
+        capacity (int): Nombre maximal d'entrées conservées
+        num_classes (int): Nombre d'émotions par prédiction
+        stats (Any): Statistiques incrémentales mises à jour à chaque ajout (optionnel)
+    """
+
+    def __init__(self, capacity: int = 100, num_classes: int = 7, stats: Any = None):
+        self.capacity = max(1, capacity)
+        self.timestamps = np.zeros(self.capacity, dtype=np.float64)
+        self.labels = np.zeros(self.capacity, dtype=np.int8)
+        self.probabilities = np.zeros((self.capacity, num_classes), dtype=np.float32)
+        self._next = 0
+        self._count = 0
+        self.stats = stats
+        self.lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self._count
+
+    def append(self, timestamp: float, probabilities: np.ndarray) -> Optional[int]:
+        """
+        Ajoute une prédiction, en écrasant la plus ancienne si le tampon est plein.
+
+        Args:
+            timestamp (float): Horodatage Unix de la prédiction
+            probabilities (np.ndarray): Probabilités des émotions
+
+        Returns:
+            Optional[int]: Indice d'émotion de l'entrée écrasée, ou None
+        """
+        with self.lock:
+            i = self._next
+            evicted = int(self.labels[i]) if self._count == self.capacity else None
+            self.timestamps[i] = timestamp
+            self.probabilities[i] = probabilities
+            self.labels[i] = int(np.argmax(probabilities))
+            self._next = (i + 1) % self.capacity
+            self._count = min(self._count + 1, self.capacity)
+            if self.stats is not None:
+                self.stats.update(timestamp, probabilities)
+            return evicted
+
+    def last(self, n: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Renvoie les n dernières entrées, de la plus ancienne à la plus récente.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray, np.ndarray]: Horodatages, indices d'émotion, probabilités
+        """
+        with self.lock:
+            n = max(0, min(n, self._count))
+            indices = (self._next - n + np.arange(n)) % self.capacity
+            return self.timestamps[indices], self.labels[indices], self.probabilities[indices]
+
+
+class HistoryStore:
+    """
+    Historiques de toutes les sessions, avec éviction LRU des sessions inactives.
+
+    Args:
+        capacity (int): Capacité du tampon de chaque session
+        max_sessions (int): Nombre maximal de sessions conservées
+        num_classes (int): Nombre d'émotions par prédiction
+        stats_factory (Optional[Callable]): Crée les statistiques de chaque nouvelle session
+    """
+
+    def __init__(self, capacity: int = 100, max_sessions: int = 1000, num_classes: int = 7,
+                 stats_factory: Optional[Callable[[], Any]] = None):
+        self.capacity = capacity
+        self.max_sessions = max_sessions
+        self.num_classes = num_classes
+        self.stats_factory = stats_factory
+        self._sessions: "OrderedDict[str, EmotionRingBuffer]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session_id: str) -> EmotionRingBuffer:
+        """Renvoie le tampon de la session, en le créant au besoin."""
+        with self._lock:
+            buffer = self._sessions.pop(session_id, None)
+            if buffer is None:
+                stats = self.stats_factory() if self.stats_factory else None
+                buffer = EmotionRingBuffer(self.capacity, self.num_classes, stats)
+            self._sessions[session_id] = buffer
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+            return buffer
+
+    def peek(self, session_id: str) -> Optional[EmotionRingBuffer]:
+        """Renvoie le tampon de la session sans le créer, ou None."""
+        with self._lock:
+            return self._sessions.get(session_id)
+
+    def discard(self, session_id: str) -> None:
+        """Supprime l'historique d'une session."""
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def __len__(self) -> int:
+        return len(self._sessions)
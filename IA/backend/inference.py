@@ -0,0 +1,80 @@
+"""
+Chemin d'inférence rapide basé sur des fonctions TensorFlow compilées.
+Contrairement à model.predict, qui construit une boucle de prédiction Keras
+complète à chaque appel, le modèle est tracé une seule fois par taille de lot
+(signatures d'entrée fixes) puis appelé directement.
+"""
+
+from typing import Callable, Dict, Optional, Sequence
+
+import numpy as np
+
+from face_preprocessing import CROP_SHAPE, MODEL_INPUT_SHAPE
+
+DEFAULT_BATCH_SIZES = (1, 2, 4, 8, 16, 32)
+INPUT_SHAPE = MODEL_INPUT_SHAPE
+
+
+class CompiledPredictor:
+    """
+    Prédicteur qui réutilise des fonctions concrètes pour quelques tailles de lot.
+    Un lot de taille intermédiaire est complété par des zéros jusqu'à la taille
+    tracée immédiatement supérieure; un lot plus grand est découpé.
+
+    Args:
+        model (tf.keras.Model): Modèle Keras chargé
+        batch_sizes (Sequence[int]): Tailles de lot pour lesquelles tracer le modèle
+        preprocess (Optional[Callable]): Prétraitement intégré au graphe ; l'entrée
+            est alors un lot de visages découpés uint8 (N, 48, 48, 3)
+    """
+
+    def __init__(self, model, batch_sizes: Sequence[int] = DEFAULT_BATCH_SIZES,
+                 preprocess: Optional[Callable] = None):
+        # Import différé : les backends sans TensorFlow n'ont besoin que des constantes
+        import tensorflow as tf
+        self._tf = tf
+        self.batch_sizes = sorted(set(int(b) for b in batch_sizes if int(b) > 0)) or [1]
+        if preprocess is None:
+            self.input_shape, self.input_dtype = INPUT_SHAPE, np.float32
+            forward = tf.function(lambda x: model(x, training=False))
+        else:
+            self.input_shape, self.input_dtype = CROP_SHAPE, np.uint8
+            forward = tf.function(lambda x: model(preprocess(x), training=False))
+        self._functions: Dict[int, object] = {
+            size: forward.get_concrete_function(tf.TensorSpec((size,) + self.input_shape, self.input_dtype))
+            for size in self.batch_sizes
+        }
+
+    def _bucket(self, count: int) -> int:
+        for size in self.batch_sizes:
+            if size >= count:
+                return size
+        return self.batch_sizes[-1]
+
+    def __call__(self, faces: np.ndarray) -> np.ndarray:
+        """
+        Prédit les émotions d'un lot de visages prétraités.
+
+        Args:
+            faces (np.ndarray): Tableau de forme (N, 48, 48, 1), idéalement en float32,
+                ou visages découpés uint8 (N, 48, 48, 3) avec un prétraitement intégré
+
+        Returns:
+            np.ndarray: Probabilités de forme (N, 7)
+        """
+        faces = np.asarray(faces, dtype=self.input_dtype)
+        outputs = []
+        for start in range(0, len(faces), self.batch_sizes[-1]):
+            chunk = faces[start:start + self.batch_sizes[-1]]
+            size = self._bucket(len(chunk))
+            if len(chunk) < size:
+                padding = np.zeros((size - len(chunk),) + self.input_shape, dtype=self.input_dtype)
+                chunk = np.concatenate([chunk, padding], axis=0)
+            prediction = self._functions[size](self._tf.constant(chunk))
+            outputs.append(prediction.numpy()[:min(size, len(faces) - start)])
+        return np.concatenate(outputs, axis=0)
+
+    def warmup(self) -> None:
+        """Exécute chaque fonction tracée une fois pour que la première requête ne paie pas l'initialisation."""
+        for size in self.batch_sizes:
+            self._functions[size](self._tf.zeros((size,) + self.input_shape, self.input_dtype))
@@ -1,16 +1,36 @@
 # main.py
-from fastapi import FastAPI, File, UploadFile, HTTPException
+from fastapi import FastAPI, File, UploadFile, HTTPException, Request, Query, Header, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-import tensorflow as tf
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.background import BackgroundTask
 import numpy as np
-import cv2
-from mtcnn import MTCNN
-import base64
-import io
-from PIL import Image
 import uvicorn
+import os
+import functools
+import asyncio
+import contextlib
+import json
+import time
+import uuid
 from datetime import datetime
+from typing import List, Optional
 from EmotionDisplay import format_prediction, get_emotion_history, get_dominant_emotion
+from batching import MicroBatcher
+from cpus import available_cpus
+from face_detectors import get_detector
+from inference import DEFAULT_BATCH_SIZES
+from model_backends import create_backend
+from pipeline import (decode_image_reduced, decode_base64_image, detect_faces, crop_faces,
+                      annotate_image, face_thumbnails, iter_upload_images)
+from workers import WorkerPool, WorkerPoolFull
+from tracking import TrackerRegistry
+from history_store import HistoryStore
+from emotion_stats import EmotionStats
+from frame_gate import FrameGateRegistry, frame_signature
+from result_cache import cache_key, create_result_cache
+from metrics import (CONTENT_TYPE as METRICS_CONTENT_TYPE, FACES_PER_IMAGE, RESULTS, Gauge, MetricsMiddleware,
+                     add_request_stage, render as render_metrics, stage_timer, timed, timed_predictor)
+from profiling import ProfilingMiddleware, profile_call
 
 app = FastAPI()
 
@@ -21,27 +41,205 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing", "X-Profile-Id"],
 )
+# Durée et code de retour de chaque requête, exportés par /metrics ; détail par
+# étape renvoyé dans l'en-tête Server-Timing
+app.add_middleware(MetricsMiddleware)
+# Profilage à la demande (PROFILE_ENABLED=1, voir profiling.py)
+app.add_middleware(ProfilingMiddleware)
 
 # Chargement du modèle au démarrage du serveur
 model = None
 detector = None
 emotion_labels = ['angry', 'disgust', 'fear', 'happy', 'neutral', 'sad', 'surprise']
-emotion_history = []  # Pour stocker l'historique des émotions détectées
+# Historique compact des émotions détectées, un tampon circulaire par session
+DEFAULT_SESSION = "default"
+emotion_history = HistoryStore(
+    capacity=int(os.environ.get("HISTORY_CAPACITY", "100")),
+    max_sessions=int(os.environ.get("HISTORY_MAX_SESSIONS", "1000")),
+    num_classes=len(emotion_labels),
+    # Statistiques glissantes servies par /history/stats
+    stats_factory=functools.partial(
+        EmotionStats,
+        window_size=int(os.environ.get("HISTORY_STATS_WINDOW", "10")),
+        alpha=float(os.environ.get("HISTORY_EMA_ALPHA", "0.3")),
+        emotion_labels=emotion_labels,
+    ),
+)
+
+# Regroupement des inférences de requêtes concurrentes en un seul lot
+BATCH_MAX_SIZE = int(os.environ.get("BATCH_MAX_SIZE", "16"))
+BATCH_MAX_WAIT_MS = float(os.environ.get("BATCH_MAX_WAIT_MS", "5"))
+# Tailles de lot pour lesquelles le modèle est tracé au démarrage
+INFERENCE_BATCH_SIZES = [int(b) for b in os.environ.get(
+    "INFERENCE_BATCH_SIZES", ",".join(str(b) for b in DEFAULT_BATCH_SIZES)).split(",")]
+batcher = None
+# Lots plus grands et attente plus longue pour /predict-batch, sans pénaliser le temps réel
+BULK_BATCH_MAX_SIZE = int(os.environ.get("BULK_BATCH_MAX_SIZE", str(max(INFERENCE_BATCH_SIZES))))
+BULK_BATCH_MAX_WAIT_MS = float(os.environ.get("BULK_BATCH_MAX_WAIT_MS", "20"))
+bulk_batcher = None
+
+# Pool de workers pour le décodage, la détection et l'annotation (hors boucle asyncio)
+WORKER_THREADS = int(os.environ.get("WORKER_THREADS", str(available_cpus())))
+WORKER_QUEUE_SIZE = int(os.environ.get("WORKER_QUEUE_SIZE", "32"))
+RETRY_AFTER_SECONDS = int(os.environ.get("RETRY_AFTER_SECONDS", "1"))
+worker_pool = WorkerPool(WORKER_THREADS, WORKER_QUEUE_SIZE, RETRY_AFTER_SECONDS, wrap_call=profile_call)
+# Pool séparé pour /predict-batch : ses images ne passent jamais devant les requêtes
+# temps réel dans la file de worker_pool. Chaque requête de lot occupe une place
+# d'admission (BULK_WORKER_THREADS + BULK_QUEUE_SIZE lots à la fois) et au plus
+# BULK_CONCURRENCY images en cours, ce qui borne aussi la file de ce pool.
+BULK_WORKER_THREADS = int(os.environ.get("BULK_WORKER_THREADS", str(max(1, WORKER_THREADS // 2))))
+BULK_QUEUE_SIZE = int(os.environ.get("BULK_QUEUE_SIZE", "2"))
+bulk_pool = WorkerPool(BULK_WORKER_THREADS, BULK_QUEUE_SIZE, RETRY_AFTER_SECONDS, wrap_call=profile_call,
+                       name="bulk")
+# Nombre d'images d'une requête /predict-batch traitées simultanément
+BULK_CONCURRENCY = int(os.environ.get("BULK_CONCURRENCY", str(max(2 * BULK_WORKER_THREADS, BULK_BATCH_MAX_SIZE))))
+
+# Seuil de confiance de détection des visages secondaires en mode multi-visages
+MULTI_FACE_MIN_CONFIDENCE = float(os.environ.get("MULTI_FACE_MIN_CONFIDENCE", "0.9"))
+
+# Détection sur une copie réduite (0 = pleine résolution) et taille minimale des visages
+DETECT_MAX_SIDE = int(os.environ.get("DETECT_MAX_SIDE", "640"))
+DETECT_MIN_FACE = int(os.environ.get("DETECT_MIN_FACE", "20"))
+# Décodage JPEG réduit (mise à l'échelle DCT) en gardant au moins ce plus grand côté.
+# Désactivé par défaut (0) : les visages sont alors découpés dans l'image en pleine
+# résolution. Activé, il accélère le décodage des grandes photos mais découpage,
+# annotation et vignettes se font sur l'image réduite (entrée du classifieur moins fine).
+DECODE_MAX_SIDE = int(os.environ.get("DECODE_MAX_SIDE", "0"))
+
+# Contenu de la réponse : boîtes et probabilités seulement (boxes), image complète
+# annotée (annotated) ou vignettes des visages (thumbnail)
+RESPONSE_MODES = ("boxes", "annotated", "thumbnail")
+RESPONSE_MODE = os.environ.get("RESPONSE_MODE", "boxes")
+if RESPONSE_MODE not in RESPONSE_MODES:
+    raise ValueError(f"RESPONSE_MODE invalide: {RESPONSE_MODE} (choix: {', '.join(RESPONSE_MODES)})")
+JPEG_QUALITY = int(os.environ.get("JPEG_QUALITY", "80"))
+THUMBNAIL_SIZE = int(os.environ.get("THUMBNAIL_SIZE", "96"))
+
+# Suivi du visage par flux : détection complète toutes les N images ou si le suivi décroche
+trackers = TrackerRegistry(
+    max_streams=int(os.environ.get("TRACK_MAX_STREAMS", "1000")),
+    ttl_seconds=float(os.environ.get("TRACK_TTL_SECONDS", "60")),
+    keyframe_interval=int(os.environ.get("TRACK_KEYFRAME_INTERVAL", "10")),
+    min_score=float(os.environ.get("TRACK_MIN_SCORE", "0.6")),
+)
+
+# Réutilisation du résultat précédent d'un flux quand l'image n'a presque pas changé
+# (écart moyen en niveaux de gris sur une vignette 16x16; 0 = désactivé)
+FRAME_GATE_THRESHOLD = float(os.environ.get("FRAME_GATE_THRESHOLD", "2.0"))
+frame_gates = FrameGateRegistry(
+    max_streams=int(os.environ.get("TRACK_MAX_STREAMS", "1000")),
+    ttl_seconds=float(os.environ.get("TRACK_TTL_SECONDS", "60")),
+    threshold=FRAME_GATE_THRESHOLD,
+    max_skips=int(os.environ.get("FRAME_GATE_MAX_SKIPS", "15")),
+)
+
+# Cache des résultats adressé par le contenu des images (RESULT_CACHE_*, voir result_cache.py)
+result_cache = create_result_cache()
+
+# État du chargement : le serveur répond dès son démarrage (/healthz) mais n'est
+# prêt (/readyz) qu'une fois le modèle et le détecteur chargés et préchauffés
+readiness = {"ready": False, "error": None, "backend": None, "load_seconds": None}
+load_task = None
+
+def load_models():
+    """Charge et préchauffe le modèle et le détecteur (hors de la boucle asyncio)."""
+    start = time.perf_counter()
+    # Backend choisi par MODEL_BACKEND (auto : l'artefact le plus rapide disponible)
+    backend = create_backend(batch_sizes=INFERENCE_BATCH_SIZES)
+    # Préchauffage pour que la première requête ne paie pas l'initialisation
+    backend.warmup()
+    # Détecteur par défaut (FACE_DETECTOR, MTCNN par défaut), préchauffé sur une image vide
+    face_detector = get_detector()
+    detect_faces(face_detector, np.zeros((160, 160, 3), dtype=np.uint8))
+    return backend, face_detector, time.perf_counter() - start
+
+async def load_models_task():
+    global model, detector, batcher, bulk_batcher
+    try:
+        backend, face_detector, seconds = await asyncio.get_running_loop().run_in_executor(None, load_models)
+    except Exception as e:
+        readiness["error"] = str(e)
+        print(f"Erreur lors du chargement du modèle: {e}")
+        return
+    # Démarrage des planificateurs d'inférence par lots
+    # (durée de la passe du modèle reportée dans le Server-Timing de chaque requête du lot)
+    predict_fn = timed_predictor(backend)
+    on_result = functools.partial(add_request_stage, "inference")
+    batcher = MicroBatcher(predict_fn, max_batch_size=BATCH_MAX_SIZE, max_wait_ms=BATCH_MAX_WAIT_MS,
+                           on_result=on_result)
+    batcher.start()
+    bulk_batcher = MicroBatcher(predict_fn, max_batch_size=BULK_BATCH_MAX_SIZE, max_wait_ms=BULK_BATCH_MAX_WAIT_MS,
+                                on_result=on_result)
+    bulk_batcher.start()
+    model, detector = backend, face_detector
+    readiness.update(ready=True, backend=backend.name, load_seconds=round(seconds, 3))
+    print(f"Modèle ({backend.name}) et détecteur chargés avec succès en {seconds:.1f} s.")
 
 @app.on_event("startup")
 async def startup_event():
-    global model, detector
-    # Chargement du modèle
-    model = tf.keras.models.load_model("best_model.h5")
-    # Initialisation du détecteur de visages MTCNN
-    detector = MTCNN()
-    print("Modèle et détecteur chargés avec succès.")
+    global load_task
+    # Le chargement se fait en tâche de fond : le serveur accepte les connexions
+    # immédiatement et répond 503 tant que le modèle n'est pas prêt
+    load_task = asyncio.create_task(load_models_task())
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    if load_task is not None and not load_task.done():
+        load_task.cancel()
+    if batcher is not None:
+        await batcher.stop()
+    if bulk_batcher is not None:
+        await bulk_batcher.stop()
+    worker_pool.shutdown()
+    bulk_pool.shutdown()
+
+# Jauges lues à chaque export de /metrics
+Gauge("emotion_model_ready", "1 quand le modèle et le détecteur sont prêts",
+      lambda: 1 if readiness["ready"] else 0)
+Gauge("emotion_requests_in_flight", "Requêtes admises dans le pool de workers",
+      lambda: worker_pool.in_flight)
+Gauge("emotion_bulk_requests_in_flight", "Requêtes /predict-batch admises dans le pool des lots",
+      lambda: bulk_pool.in_flight)
+Gauge("emotion_batch_queue_depth", "Requêtes en attente d'un lot d'inférence",
+      lambda: sum(b.pending for b in (batcher, bulk_batcher) if b is not None))
+
+def require_ready():
+    """Refuse la requête tant que le modèle et le détecteur ne sont pas prêts."""
+    if readiness["error"] is not None:
+        raise HTTPException(status_code=500, detail=f"Le modèle n'a pas pu être chargé: {readiness['error']}")
+    if model is None or detector is None:
+        raise HTTPException(status_code=503, detail="Le modèle est en cours de chargement",
+                            headers={"Retry-After": str(RETRY_AFTER_SECONDS)})
+
+@app.exception_handler(WorkerPoolFull)
+async def worker_pool_full_handler(request: Request, exc: WorkerPoolFull):
+    # Refus rapide quand la file est pleine, pour garder une latence bornée
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Serveur surchargé, veuillez réessayer plus tard"},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
 
 @app.get("/")
 def read_root():
     return {"message": "API de reconnaissance d'émotions faciales", "version": "1.0"}
 
+@app.get("/healthz")
+def healthz():
+    """Sonde de vivacité : le processus répond"""
+    return {"status": "ok"}
+
+@app.get("/readyz")
+def readyz():
+    """Sonde de disponibilité : le modèle et le détecteur sont chargés et préchauffés"""
+    if readiness["ready"]:
+        return {"status": "ready", "backend": readiness["backend"], "load_seconds": readiness["load_seconds"]}
+    if readiness["error"] is not None:
+        return JSONResponse(status_code=503, content={"status": "error", "detail": readiness["error"]})
+    return JSONResponse(status_code=503, content={"status": "loading"})
+
 @app.get("/emotions")
 def get_emotions():
     """Renvoie la liste des émotions que le modèle peut détecter"""
@@ -51,170 +249,453 @@ def get_emotions():
     }
 
 @app.get("/history")
-def get_history(limit: int = 10):
-    """Renvoie l'historique des émotions détectées"""
-    global emotion_history
+def get_history(limit: int = 10, session_id: Optional[str] = None,
+                x_session_id: Optional[str] = Header(None)):
+    """Renvoie l'historique des émotions détectées pour une session"""
+    history = emotion_history.peek(session_id or x_session_id or DEFAULT_SESSION)
+    if history is not None and history.stats is not None and len(history):
+        # Émotion dominante tenue à jour par les statistiques glissantes
+        dominant_emotion = history.stats.snapshot()["window"]["dominant_emotion"]
+    else:
+        dominant_emotion = get_dominant_emotion(history, emotion_labels=emotion_labels)
     return {
-        "history": get_emotion_history(emotion_history, limit),
-        "dominant_emotion": get_dominant_emotion(emotion_history)
+        "history": get_emotion_history(history, limit, emotion_labels),
+        "dominant_emotion": dominant_emotion
     }
 
-@app.post("/predict/")
-async def predict_emotion(file: UploadFile = File(...)):
-    global model, detector, emotion_history
-    
-    if model is None or detector is None:
-        raise HTTPException(status_code=500, detail="Le modèle n'est pas chargé")
-    
-    # Lire et décoder l'image
-    contents = await file.read()
-    try:
-        img = np.array(Image.open(io.BytesIO(contents)))
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=f"Impossible de lire l'image: {str(e)}")
-    
-    # Convertir en RGB si l'image est en RGBA
-    if img.shape[-1] == 4:
-        img = cv2.cvtColor(img, cv2.COLOR_RGBA2RGB)
-    
-    # Détecter les visages
+@app.get("/history/stats")
+def get_history_stats(session_id: Optional[str] = None,
+                      x_session_id: Optional[str] = Header(None)):
+    """Renvoie les statistiques glissantes d'une session, sans parcourir l'historique"""
+    session = session_id or x_session_id or DEFAULT_SESSION
+    history = emotion_history.peek(session)
+    stats = history.stats.snapshot() if history is not None else {"count": 0}
+    return {"session_id": session, **stats}
+
+@app.get("/metrics")
+def get_metrics():
+    """Métriques du service au format texte Prometheus"""
+    return PlainTextResponse(render_metrics(), media_type=METRICS_CONTENT_TYPE)
+
+@app.get("/stats")
+def get_stats():
+    """Renvoie les compteurs de service (images de flux évitées par le filtre)"""
+    return {
+        "frame_gate": frame_gates.stats(),
+        "result_cache": result_cache.stats() if result_cache is not None else None,
+    }
+
+async def analyze_image(img: np.ndarray, multi_face: bool = False,
+                        min_confidence: float = MULTI_FACE_MIN_CONFIDENCE,
+                        detector_name: Optional[str] = None,
+                        stream_id: Optional[str] = None,
+                        response_mode: str = RESPONSE_MODE,
+                        jpeg_quality: int = JPEG_QUALITY,
+                        scale: float = 1.0,
+                        session_id: Optional[str] = None,
+                        bulk: bool = False) -> dict:
+    """
+    Détecte les visages d'une image RGB et prédit leur émotion.
+    Par défaut seul le visage principal est analysé; en mode multi-visages, tous
+    les visages au-dessus du seuil de confiance sont classés en une seule passe.
+    Avec un identifiant de flux, le visage est suivi d'une image à l'autre et la
+    détection complète n'est relancée qu'aux images clés.
+    Les boîtes renvoyées sont multipliées par scale pour revenir aux coordonnées
+    de l'image d'origine quand elle a été décodée à résolution réduite.
+    L'image annotée ou les vignettes ne sont encodées que si response_mode le demande.
+    Le visage principal est ajouté à l'historique de la session (par défaut celle
+    du flux, sinon la session partagée).
+    Pour un flux, une image presque identique à la dernière image analysée reçoit
+    le résultat précédent (marqué cached) sans détection ni inférence.
+    En mode bulk, les étapes CPU passent par le pool des lots et l'inférence par
+    le planificateur des grands lots.
+    """
+    session_id = session_id or stream_id or DEFAULT_SESSION
+    pool = bulk_pool if bulk else worker_pool
+    
+    # Filtrer les images inchangées du flux avant tout calcul coûteux
+    gate = None
+    if stream_id and FRAME_GATE_THRESHOLD > 0:
+        gate = frame_gates.get(stream_id)
+        gate_key = (multi_face, min_confidence, detector_name, response_mode, jpeg_quality, scale)
+        with stage_timer("gate"):
+            signature = frame_signature(img)
+            cached = gate.lookup(signature, gate_key)
+        frame_gates.record(cached is not None)
+        if cached is not None:
+            RESULTS.inc("frame_cached")
+            result, probabilities = cached
+            now = datetime.now()
+            if probabilities is not None:
+                emotion_history.get(session_id).append(now.timestamp(), probabilities)
+            return {**result, "cached": True, "timestamp": now.isoformat()}
+    
+    # Choisir le moteur de détection (celui du déploiement, sauf demande explicite)
+    face_detector = detector
+    if detector_name:
+        try:
+            face_detector = await pool.run(get_detector, detector_name)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Impossible de charger le détecteur: {str(e)}")
+    
+    # Détecter (ou suivre) les visages hors de la boucle asyncio
+    detect_fn = functools.partial(detect_faces, face_detector,
+                                  max_side=DETECT_MAX_SIDE, min_face_size=DETECT_MIN_FACE / scale)
+    tracked = False
     try:
-        faces = detector.detect_faces(img)
+        if stream_id and not multi_face:
+            faces, tracked = await pool.run(timed("detect", trackers.get(stream_id).locate), img, detect_fn)
+        else:
+            faces = await pool.run(timed("detect", detect_fn), img)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erreur lors de la détection des visages: {str(e)}")
     
     if not faces:
-        return {"prediction": "Aucun visage détecté", "confidence": 0.0}
-    
-    # Prendre le premier visage détecté (celui avec la plus grande confiance)
-    face = sorted(faces, key=lambda x: x['confidence'], reverse=True)[0]
-    x, y, w, h = face['box']
-    
-    # Extraire et prétraiter le visage
-    face_img = img[y:y+h, x:x+w]
-    
-    # Redimensionner à 48x48 pixels
-    face_img = cv2.resize(face_img, (48, 48))
-    
-    # Convertir en niveaux de gris
-    face_img_gray = cv2.cvtColor(face_img, cv2.COLOR_RGB2GRAY)
-    
-    # Normaliser les valeurs de pixels entre 0 et 1
-    face_img_gray = face_img_gray / 255.0
-    
-    # Préparer pour l'entrée du modèle
-    face_img_gray = np.expand_dims(face_img_gray, axis=-1)  # Ajouter la dimension des canaux
-    face_img_gray = np.expand_dims(face_img_gray, axis=0)   # Ajouter la dimension du batch
-    
-    # Faire la prédiction
-    prediction = model.predict(face_img_gray)
-    
-    # Formater la prédiction avec le module EmotionDisplay
-    result = format_prediction(prediction, emotion_labels)
-    
-    # Créer un rectangle autour du visage
-    box_x, box_y, box_w, box_h = face['box']
-    face_with_box = img.copy()
-    cv2.rectangle(face_with_box, (box_x, box_y), (box_x + box_w, box_y + box_h), (0, 255, 0), 2)
-    
-    # Ajouter l'émotion en texte au-dessus du rectangle
-    font = cv2.FONT_HERSHEY_SIMPLEX
-    emotion_text = f"{result['label_fr']}: {(result['confidence']*100):.1f}%"
-    cv2.putText(face_with_box, emotion_text, (box_x, box_y - 10), font, 0.9, (255, 255, 255), 2)
-    
-    # Convertir l'image résultante en base64 pour l'affichage côté client
-    _, buffer = cv2.imencode('.jpg', face_with_box)
-    face_base64 = base64.b64encode(buffer).decode('utf-8')
-    
-    # Ajouter l'image et l'horodatage au résultat
-    result["face_image"] = f"data:image/jpeg;base64,{face_base64}"
-    result["timestamp"] = datetime.now().isoformat()
+        RESULTS.inc("no_face")
+        FACES_PER_IMAGE.observe(0)
+        result = {"prediction": "Aucun visage détecté", "confidence": 0.0}
+        if gate is not None:
+            gate.store(signature, gate_key, result, None)
+            result = {**result, "cached": False}
+        return result
+    
+    # Garder le visage principal et, en mode multi-visages, les visages suffisamment sûrs
+    if multi_face:
+        faces = [face for i, face in enumerate(faces) if i == 0 or face['confidence'] >= min_confidence]
+    else:
+        faces = faces[:1]
+    boxes = [face['box'] for face in faces]
+    RESULTS.inc("face")
+    FACES_PER_IMAGE.observe(len(faces))
+    
+    # Découper les visages en un seul lot uint8 (niveaux de gris et normalisation
+    # sont faits par le modèle, voir face_preprocessing.py)
+    faces_input = await pool.run(timed("preprocess", crop_faces), img, boxes)
+    
+    # Faire la prédiction (regroupée avec les requêtes concurrentes); l'étape batch
+    # compte l'attente du lot en plus de l'inférence
+    with stage_timer("batch"):
+        predictions = await (bulk_batcher if bulk else batcher).submit(faces_input)
+    
+    # Formater les prédictions avec le module EmotionDisplay
+    results = [format_prediction(predictions[i:i+1], emotion_labels) for i in range(len(faces))]
+    result = results[0]
+    result["box"] = [int(round(v * scale)) for v in boxes[0]]
+    if stream_id:
+        result["tracked"] = tracked
+    if multi_face:
+        result["faces"] = [
+            {
+                "box": [int(round(v * scale)) for v in face['box']],
+                "detection_confidence": float(face['confidence']),
+                "prediction": face_result["prediction"],
+                "confidence": face_result["confidence"],
+                "all_predictions": face_result["all_predictions"],
+                "label_fr": face_result["label_fr"],
+            }
+            for face, face_result in zip(faces, results)
+        ]
+    
+    # Encoder une image pour le client seulement sur demande
+    if response_mode == "annotated":
+        result["face_image"] = await pool.run(timed("annotate", annotate_image), img, list(zip(boxes, results)), jpeg_quality)
+    elif response_mode == "thumbnail":
+        thumbnails = await pool.run(timed("thumbnail", face_thumbnails), img, boxes, THUMBNAIL_SIZE, jpeg_quality)
+        result["face_image"] = thumbnails[0]
+        for face_entry, thumbnail in zip(result.get("faces", []), thumbnails):
+            face_entry["thumbnail"] = thumbnail
+    now = datetime.now()
+    result["timestamp"] = now.isoformat()
+    
+    # Ajouter le visage principal à l'historique compact de la session
+    emotion_history.get(session_id).append(now.timestamp(), predictions[0])
+    
+    if gate is not None:
+        gate.store(signature, gate_key, result, predictions[0])
+        result = {**result, "cached": False}
+    return result
+
+async def lookup_cached_result(key: Optional[str], session_id: Optional[str]) -> Optional[dict]:
+    """
+    Renvoie le résultat en cache d'une image déjà analysée, marqué cached, et
+    l'ajoute à l'historique de la session comme une nouvelle prédiction.
+    """
+    if key is None:
+        return None
+    result = await result_cache.get(key)
+    if result is None:
+        return None
+    RESULTS.inc("result_cached")
+    now = datetime.now()
+    if "all_predictions" in result:
+        probabilities = np.array([result["all_predictions"][label] for label in emotion_labels], dtype=np.float32)
+        emotion_history.get(session_id or DEFAULT_SESSION).append(now.timestamp(), probabilities)
+    return {**result, "cached": True, "timestamp": now.isoformat()}
+
+@app.post("/predict/")
+async def predict_emotion(
+    file: UploadFile = File(...),
+    multi_face: bool = Query(False, description="Analyser tous les visages détectés"),
+    min_confidence: float = Query(MULTI_FACE_MIN_CONFIDENCE, ge=0.0, le=1.0),
+    detector_name: Optional[str] = Query(None, alias="detector", description="mtcnn, opencv_dnn ou haar"),
+    x_stream_id: Optional[str] = Header(None, description="Identifiant du flux vidéo pour le suivi"),
+    x_session_id: Optional[str] = Header(None, description="Session dont l'historique reçoit la prédiction"),
+    response_mode: str = Query(RESPONSE_MODE, alias="response", pattern="^(boxes|annotated|thumbnail)$",
+                               description="boxes, annotated ou thumbnail"),
+    jpeg_quality: int = Query(JPEG_QUALITY, ge=10, le=100),
+):
+    require_ready()
     
-    # Ajouter à l'historique
-    emotion_history.append(result)
-    if len(emotion_history) > 100:  # Limiter la taille de l'historique
-        emotion_history = emotion_history[-100:]
+    contents = await file.read()
     
+    # Une image déjà analysée avec les mêmes options est servie depuis le cache
+    # (les flux vidéo, dont le résultat dépend du suivi, n'y passent pas)
+    key = None
+    if result_cache is not None and not x_stream_id:
+        key = cache_key(contents, (multi_face, min_confidence, detector_name, response_mode, jpeg_quality))
+        cached = await lookup_cached_result(key, x_session_id)
+        if cached is not None:
+            return cached
+    
+    with worker_pool.admission():
+        # Décoder l'image
+        try:
+            img, scale = await worker_pool.run(timed("decode", decode_image_reduced), contents, DECODE_MAX_SIDE)
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=f"Impossible de lire l'image: {str(e)}")
+        
+        result = await analyze_image(img, multi_face, min_confidence, detector_name,
+                                     stream_id=x_stream_id, response_mode=response_mode,
+                                     jpeg_quality=jpeg_quality, scale=scale, session_id=x_session_id)
+    if key is not None:
+        await result_cache.set(key, result)
     return result
 
 @app.post("/predict-base64/")
-async def predict_emotion_base64(data: dict):
-    global model, detector, emotion_history
-    
-    if model is None or detector is None:
-        raise HTTPException(status_code=500, detail="Le modèle n'est pas chargé")
-    
-    try:
-        # Extraire les données base64 de l'image
-        base64_data = data.get("image", "").split(",")[-1]
-        img_bytes = base64.b64decode(base64_data)
-        img = np.array(Image.open(io.BytesIO(img_bytes)))
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=f"Impossible de décoder l'image: {str(e)}")
-    
-    # Convertir en RGB si l'image est en RGBA
-    if len(img.shape) == 3 and img.shape[-1] == 4:
-        img = cv2.cvtColor(img, cv2.COLOR_RGBA2RGB)
-    
-    # Détecter les visages
-    try:
-        faces = detector.detect_faces(img)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Erreur lors de la détection des visages: {str(e)}")
-    
-    if not faces:
-        return {"prediction": "Aucun visage détecté", "confidence": 0.0}
-    
-    # Prendre le premier visage détecté (celui avec la plus grande confiance)
-    face = sorted(faces, key=lambda x: x['confidence'], reverse=True)[0]
-    x, y, w, h = face['box']
-    
-    # Extraire et prétraiter le visage
-    face_img = img[y:y+h, x:x+w]
-    
-    # Redimensionner à 48x48 pixels
-    face_img = cv2.resize(face_img, (48, 48))
-    
-    # Convertir en niveaux de gris
-    face_img_gray = cv2.cvtColor(face_img, cv2.COLOR_RGB2GRAY)
-    
-    # Normaliser les valeurs de pixels entre 0 et 1
-    face_img_gray = face_img_gray / 255.0
-    
-    # Préparer pour l'entrée du modèle
-    face_img_gray = np.expand_dims(face_img_gray, axis=-1)  # Ajouter la dimension des canaux
-    face_img_gray = np.expand_dims(face_img_gray, axis=0)   # Ajouter la dimension du batch
-    
-    # Faire la prédiction
-    prediction = model.predict(face_img_gray)
-    
-    # Formater la prédiction avec le module EmotionDisplay
-    result = format_prediction(prediction, emotion_labels)
-    
-    # Créer un rectangle autour du visage
-    box_x, box_y, box_w, box_h = face['box']
-    face_with_box = img.copy()
-    cv2.rectangle(face_with_box, (box_x, box_y), (box_x + box_w, box_y + box_h), (0, 255, 0), 2)
-    
-    # Ajouter l'émotion en texte au-dessus du rectangle
-    font = cv2.FONT_HERSHEY_SIMPLEX
-    emotion_text = f"{result['label_fr']}: {(result['confidence']*100):.1f}%"
-    cv2.putText(face_with_box, emotion_text, (box_x, box_y - 10), font, 0.9, (255, 255, 255), 2)
-    
-    # Convertir l'image résultante en base64 pour l'affichage côté client
-    _, buffer = cv2.imencode('.jpg', face_with_box)
-    face_base64 = base64.b64encode(buffer).decode('utf-8')
-    
-    # Ajouter l'image et l'horodatage au résultat
-    result["face_image"] = f"data:image/jpeg;base64,{face_base64}"
-    result["timestamp"] = datetime.now().isoformat()
-    
-    # Ajouter à l'historique
-    emotion_history.append(result)
-    if len(emotion_history) > 100:  # Limiter la taille de l'historique
-        emotion_history = emotion_history[-100:]
-    
+async def predict_emotion_base64(
+    data: dict,
+    multi_face: bool = Query(False, description="Analyser tous les visages détectés"),
+    min_confidence: float = Query(MULTI_FACE_MIN_CONFIDENCE, ge=0.0, le=1.0),
+    detector_name: Optional[str] = Query(None, alias="detector", description="mtcnn, opencv_dnn ou haar"),
+    x_stream_id: Optional[str] = Header(None, description="Identifiant du flux vidéo pour le suivi"),
+    x_session_id: Optional[str] = Header(None, description="Session dont l'historique reçoit la prédiction"),
+    response_mode: str = Query(RESPONSE_MODE, alias="response", pattern="^(boxes|annotated|thumbnail)$",
+                               description="boxes, annotated ou thumbnail"),
+    jpeg_quality: int = Query(JPEG_QUALITY, ge=10, le=100),
+):
+    require_ready()
+    
+    stream_id = data.get("stream_id") or x_stream_id
+    session_id = data.get("session_id") or x_session_id
+    image_data = data.get("image", "")
+    
+    key = None
+    if result_cache is not None and not stream_id and isinstance(image_data, str):
+        key = cache_key(image_data.encode(), (multi_face, min_confidence, detector_name, response_mode, jpeg_quality))
+        cached = await lookup_cached_result(key, session_id)
+        if cached is not None:
+            return cached
+    
+    with worker_pool.admission():
+        try:
+            # Extraire et décoder les données base64 de l'image
+            img, scale = await worker_pool.run(timed("decode", decode_base64_image), image_data, DECODE_MAX_SIDE)
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=f"Impossible de décoder l'image: {str(e)}")
+        
+        result = await analyze_image(img, multi_face, min_confidence, detector_name,
+                                     stream_id=stream_id, response_mode=response_mode,
+                                     jpeg_quality=jpeg_quality, scale=scale, session_id=session_id)
+    if key is not None:
+        await result_cache.set(key, result)
     return result
 
+@app.post("/predict-batch")
+async def predict_batch(
+    files: List[UploadFile] = File(..., description="Images, ou archives zip/tar d'images"),
+    multi_face: bool = Query(False, description="Analyser tous les visages détectés"),
+    min_confidence: float = Query(MULTI_FACE_MIN_CONFIDENCE, ge=0.0, le=1.0),
+    detector_name: Optional[str] = Query(None, alias="detector", description="mtcnn, opencv_dnn ou haar"),
+    x_session_id: Optional[str] = Header(None, description="Session dont l'historique reçoit les prédictions"),
+    response_mode: str = Query(RESPONSE_MODE, alias="response", pattern="^(boxes|annotated|thumbnail)$",
+                               description="boxes, annotated ou thumbnail"),
+    jpeg_quality: int = Query(JPEG_QUALITY, ge=10, le=100),
+):
+    """
+    Analyse un lot d'images et renvoie les résultats en JSON délimité par lignes
+    (NDJSON), une ligne par image dans l'ordre où elles se terminent, puis une
+    ligne de synthèse. Les images sont décodées et analysées en parallèle (au plus
+    BULK_CONCURRENCY à la fois) et les visages de toutes les images sont regroupés
+    en grands lots d'inférence. La mémoire reste bornée quelle que soit la taille
+    du lot : les archives sont lues au fil de l'eau. Le travail CPU passe par le
+    pool des lots (bulk_pool), jamais par la file des requêtes temps réel.
+    """
+    require_ready()
+    
+    # Tout le lot occupe une seule place d'admission du pool des lots, réservée avant de répondre
+    admission = contextlib.ExitStack()
+    admission.enter_context(bulk_pool.admission())
+    session_id = x_session_id or "batch"
+    options = (multi_face, min_confidence, detector_name, response_mode, jpeg_quality)
+    
+    async def analyze_one(index: int, filename: str, contents: bytes) -> dict:
+        entry = {"index": index, "filename": filename}
+        key = cache_key(contents, options) if result_cache is not None else None
+        result = await lookup_cached_result(key, session_id)
+        if result is None:
+            try:
+                img, scale = await bulk_pool.run(timed("decode", decode_image_reduced), contents, DECODE_MAX_SIDE)
+            except Exception as e:
+                return {**entry, "error": f"Impossible de lire l'image: {str(e)}"}
+            try:
+                result = await analyze_image(img, multi_face, min_confidence, detector_name,
+                                             response_mode=response_mode, jpeg_quality=jpeg_quality,
+                                             scale=scale, session_id=session_id, bulk=True)
+            except HTTPException as e:
+                return {**entry, "error": e.detail}
+            except Exception as e:
+                # Échec du lot d'inférence ou du découpage : erreur de cette image, le flux continue
+                return {**entry, "error": f"Erreur lors de l'analyse: {str(e)}"}
+            if key is not None:
+                await result_cache.set(key, result)
+        return {**entry, **result}
+    
+    async def results():
+        start = time.perf_counter()
+        pending = set()
+        count = errors = 0
+        
+        def finished(done):
+            nonlocal count, errors
+            for task in done:
+                entry = task.result()
+                count += 1
+                errors += "error" in entry
+                yield json.dumps(entry, default=float) + "\n"
+        
+        try:
+            index = 0
+            for upload in files:
+                images = iter_upload_images(upload.filename, upload.file)
+                while True:
+                    # Lire l'image suivante hors de la boucle asyncio (archive sur disque)
+                    try:
+                        item = await bulk_pool.run(next, images, None)
+                    except Exception as e:
+                        count, errors = count + 1, errors + 1
+                        yield json.dumps({"index": index, "filename": upload.filename,
+                                          "error": f"Archive illisible: {str(e)}"}) + "\n"
+                        index += 1
+                        break
+                    if item is None:
+                        break
+                    # Borner le nombre d'images en mémoire
+                    while len(pending) >= BULK_CONCURRENCY:
+                        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                        for line in finished(done):
+                            yield line
+                    pending.add(asyncio.create_task(analyze_one(index, *item)))
+                    index += 1
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for line in finished(done):
+                    yield line
+            yield json.dumps({"done": True, "count": count, "errors": errors,
+                              "elapsed": round(time.perf_counter() - start, 3)}) + "\n"
+        finally:
+            for task in pending:
+                task.cancel()
+            admission.close()
+    
+    # La place est aussi libérée si le client part avant le début de la réponse
+    return StreamingResponse(results(), media_type="application/x-ndjson",
+                             background=BackgroundTask(admission.close))
+
+@app.websocket("/ws/stream")
+async def stream_emotions(websocket: WebSocket, detector_name: Optional[str] = Query(None, alias="detector"),
+                          session_id: Optional[str] = None):
+    """
+    Flux temps réel : le client envoie des images JPEG brutes (messages binaires)
+    et reçoit un résultat JSON compact par image traitée.
+    Seule la dernière image reçue est conservée : si le client envoie plus vite
+    que le serveur ne traite, les images en attente sont abandonnées.
+    """
+    await websocket.accept()
+    # Identifiant unique par connexion : aucun état (suivi, filtre, historique)
+    # ne peut être hérité d'une connexion précédente
+    stream_id = f"ws-{uuid.uuid4().hex}"
+    latest = {"frame": None, "seq": 0, "dropped": 0}
+    frame_ready = asyncio.Event()
+    
+    async def receive_frames():
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                return
+            if message.get("bytes"):
+                if latest["frame"] is not None:
+                    latest["dropped"] += 1  # image précédente jamais traitée
+                latest["seq"] += 1
+                latest["frame"] = message["bytes"]
+                frame_ready.set()
+    
+    async def process_frames():
+        while True:
+            await frame_ready.wait()
+            frame_ready.clear()
+            frame, seq = latest["frame"], latest["seq"]
+            latest["frame"] = None
+            if frame is None:
+                continue
+            try:
+                require_ready()
+                with worker_pool.admission():
+                    img, scale = await worker_pool.run(timed("decode", decode_image_reduced), frame, DECODE_MAX_SIDE)
+                    result = await analyze_image(img, detector_name=detector_name,
+                                                 stream_id=stream_id, response_mode="boxes", scale=scale,
+                                                 session_id=session_id)
+            except WorkerPoolFull:
+                await websocket.send_json({"seq": seq, "error": "busy"})
+                continue
+            except HTTPException as e:
+                await websocket.send_json({"seq": seq, "error": e.detail})
+                continue
+            except Exception as e:
+                await websocket.send_json({"seq": seq, "error": f"Impossible de lire l'image: {str(e)}"})
+                continue
+            
+            if "box" not in result:
+                message = {"seq": seq, "emotion": None}
+            else:
+                message = {
+                    "seq": seq,
+                    "emotion": result["prediction"],
+                    "confidence": round(result["confidence"], 4),
+                    "box": result["box"],
+                    "probabilities": [round(result["all_predictions"][label], 4) for label in emotion_labels],
+                    "tracked": result.get("tracked", False),
+                    "cached": result.get("cached", False),
+                }
+            message["dropped"] = latest["dropped"]
+            await websocket.send_json(message)
+    
+    receiver = asyncio.create_task(receive_frames())
+    processor = asyncio.create_task(process_frames())
+    try:
+        await asyncio.wait([receiver, processor], return_when=asyncio.FIRST_COMPLETED)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        receiver.cancel()
+        processor.cancel()
+        await asyncio.gather(receiver, processor, return_exceptions=True)
+        # Libérer l'état du flux ; l'historique n'est gardé que pour une session nommée
+        trackers.discard(stream_id)
+        frame_gates.discard(stream_id)
+        if not session_id:
+            emotion_history.discard(stream_id)
+
 if __name__ == "__main__":
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
@@ -0,0 +1,254 @@
+"""
+Métriques de service au format texte Prometheus, exposées par /metrics.
+Compteurs, jauges et histogrammes minimalistes : une observation coûte un
+verrou et une recherche dichotomique dans les bornes, sans dépendance externe.
+Avec plusieurs workers (serve.py), chaque processus expose ses propres valeurs.
+
+Les durées des étapes sont aussi cumulées pour la requête en cours (variable de
+contexte) et renvoyées dans l'en-tête Server-Timing de la réponse.
+"""
+
+import bisect
+import contextvars
+import functools
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# Le jeu de caractères (utf-8) est ajouté par la réponse texte de Starlette
+CONTENT_TYPE = "text/plain; version=0.0.4"
+
+# Bornes des histogrammes de latence (secondes)
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_registry: List["Metric"] = []
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{str(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Metric:
+    """Base des métriques : nom, aide, étiquettes et enregistrement global."""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        return "\n".join(lines + self.samples())
+
+
+class Counter(Metric):
+    """Compteur monotone, par combinaison d'étiquettes."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labelvalues: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0.0) + amount
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            return [f"{self.name}{_format_labels(self.labelnames, key)} {value}"
+                    for key, value in self._values.items()]
+
+
+class Gauge(Metric):
+    """Jauge lue au moment de l'export, via une fonction."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, fn: Callable[[], float]):
+        super().__init__(name, documentation)
+        self.fn = fn
+
+    def samples(self) -> List[str]:
+        return [f"{self.name} {float(self.fn())}"]
+
+
+class Histogram(Metric):
+    """Histogramme cumulatif à bornes fixes, par combinaison d'étiquettes."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Par étiquettes : [comptes par intervalle (+Inf compris), somme]
+        self._values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, *labelvalues: str) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labelvalues)
+            if entry is None:
+                entry = self._values[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+
+    def time(self, *labelvalues: str) -> "_Timer":
+        """Chronomètre un bloc : with histogram.time("etape"): ..."""
+        return _Timer(self, labelvalues)
+
+    def samples(self) -> List[str]:
+        lines = []
+        with self._lock:
+            items = [(key, list(counts), total) for key, (counts, total) in self._values.items()]
+        for key, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{bound!r}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+class _Timer:
+    def __init__(self, histogram: Histogram, labelvalues: Tuple[str, ...]):
+        self.histogram = histogram
+        self.labelvalues = labelvalues
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, *self.labelvalues)
+
+
+def render() -> str:
+    """Renvoie toutes les métriques enregistrées au format texte Prometheus."""
+    return "\n".join(metric.render() for metric in _registry) + "\n"
+
+
+# Métriques du pipeline de reconnaissance d'émotions
+STAGE_SECONDS = Histogram("emotion_stage_seconds",
+                          "Durée de chaque étape du pipeline (decode, detect, preprocess, batch, inference, annotate, thumbnail)",
+                          ["stage"])
+BATCH_SIZE = Histogram("emotion_inference_batch_size", "Nombre de visages par passe du modèle",
+                       buckets=(1, 2, 4, 8, 16, 32, 64, 128))
+FACES_PER_IMAGE = Histogram("emotion_faces_per_image", "Nombre de visages retenus par image analysée",
+                            buckets=(0, 1, 2, 3, 5, 10, 20))
+RESULTS = Counter("emotion_results_total",
+                  "Résultats d'analyse par issue (face, no_face, frame_cached, result_cached)", ["outcome"])
+REQUEST_SECONDS = Histogram("http_request_duration_seconds", "Durée des requêtes HTTP", ["method", "path"])
+REQUESTS = Counter("http_requests_total", "Requêtes HTTP par route et code de retour", ["method", "path", "status"])
+
+
+# Durées des étapes de la requête HTTP en cours, posées par MetricsMiddleware.
+# Le dictionnaire est partagé avec les threads du pool (contexte copié par WorkerPool.run).
+_request_stages: contextvars.ContextVar[Optional[Dict[str, float]]] = contextvars.ContextVar(
+    "request_stages", default=None)
+_request_stages_lock = threading.Lock()
+
+
+def add_request_stage(stage: str, seconds: float) -> None:
+    """Ajoute une durée à l'étape de la requête en cours (sans l'histogramme)."""
+    stages = _request_stages.get()
+    if stages is not None:
+        with _request_stages_lock:
+            stages[stage] = stages.get(stage, 0.0) + seconds
+
+
+def record_stage(stage: str, seconds: float) -> None:
+    """Enregistre la durée d'une étape dans STAGE_SECONDS et dans la requête en cours."""
+    STAGE_SECONDS.observe(seconds, stage)
+    add_request_stage(stage, seconds)
+
+
+class stage_timer:
+    """Chronomètre une étape du pipeline : with stage_timer("detect"): ..."""
+
+    def __init__(self, stage: str):
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        record_stage(self.stage, time.perf_counter() - self.start)
+
+
+def server_timing(stages: Dict[str, float], total: float) -> str:
+    """Formate les durées (secondes) en valeur d'en-tête Server-Timing (millisecondes)."""
+    parts = [f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in stages.items()]
+    return ", ".join(parts + [f"total;dur={total * 1000:.1f}"])
+
+
+def timed(stage: str, fn: Callable) -> Callable:
+    """Enveloppe une étape synchrone pour en mesurer la durée (histogramme et Server-Timing)."""
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        with stage_timer(stage):
+            return fn(*args, **kwargs)
+    return wrapper
+
+
+def timed_predictor(predict_fn: Callable) -> Callable:
+    """Enveloppe la fonction d'inférence : durée (étape inference) et taille des lots."""
+    def wrapper(inputs):
+        BATCH_SIZE.observe(len(inputs))
+        with STAGE_SECONDS.time("inference"):
+            return predict_fn(inputs)
+    return wrapper
+
+
+class MetricsMiddleware:
+    """
+    Middleware ASGI qui mesure la durée et le code de retour de chaque requête
+    HTTP, par route (gabarit de chemin, pour borner le nombre de séries), et
+    ajoute l'en-tête Server-Timing quand des étapes du pipeline ont été mesurées.
+    Pour une réponse en flux, la durée s'arrête à la fin de l'envoi du corps et
+    l'en-tête ne contient que les étapes terminées avant le début de la réponse.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        status = [500]
+        stages: Dict[str, float] = {}
+        token = _request_stages.set(stages)
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+                if stages:
+                    timing = server_timing(stages, time.perf_counter() - start)
+                    message = {**message, "headers": list(message.get("headers", []))
+                               + [(b"server-timing", timing.encode("latin-1"))]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            _request_stages.reset(token)
+            route = scope.get("route")
+            path = getattr(route, "path", "other")
+            REQUEST_SECONDS.observe(time.perf_counter() - start, scope["method"], path)
+            REQUESTS.inc(scope["method"], path, str(status[0]))
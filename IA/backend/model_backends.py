@@ -0,0 +1,271 @@
+"""
+Couche de backends d'inférence interchangeables.
+Le backend est choisi au démarrage par variable d'environnement :
+
+    MODEL_BACKEND   auto (défaut) | keras | saved_model | tflite
+    MODEL_PATH      chemin de l'artefact (défaut selon le backend)
+    MODEL_THREADS   nombre de threads d'inférence (0 = choix de TensorFlow)
+
+En mode auto, l'artefact disponible le plus rapide à charger est choisi :
+model.tflite (sans TensorFlow si ai-edge-litert ou tflite_runtime est installé), puis le
+SavedModel produit par convert_model.py, puis best_model.h5.
+
+Tous les backends exposent la même interface : un appel sur un lot de visages
+découpés (N, 48, 48, 3) en uint8 RGB qui renvoie les probabilités (N, 7).
+La conversion en niveaux de gris et la normalisation (face_preprocessing.py) sont
+faites dans le graphe pour le modèle Keras et pour les modèles de service
+exportés par convert_model.py ; les anciens artefacts à entrée float32
+(N, 48, 48, 1) reçoivent l'entrée préparée par la référence NumPy.
+"""
+
+import glob
+import os
+import threading
+from typing import Optional, Sequence
+
+import numpy as np
+
+from cpus import available_cpus
+from face_preprocessing import CROP_SHAPE, model_input, model_input_tf
+from inference import DEFAULT_BATCH_SIZES, INPUT_SHAPE
+
+DEFAULT_PATHS = {
+    "keras": "best_model.h5",
+    "saved_model": "saved_model",
+    "tflite": "model.tflite",
+}
+
+# Ordre de préférence du mode auto, du démarrage le plus rapide au plus lent
+AUTO_ORDER = ("tflite", "saved_model", "keras")
+
+
+def _configure_tf_threads(num_threads: int) -> None:
+    """Limite les threads intra/inter-op de TensorFlow (avant toute exécution)."""
+    import tensorflow as tf
+    if num_threads > 0:
+        try:
+            tf.config.threading.set_intra_op_parallelism_threads(num_threads)
+            tf.config.threading.set_inter_op_parallelism_threads(1)
+        except RuntimeError:
+            # Le runtime est déjà initialisé : la configuration ne peut plus changer
+            pass
+
+
+class ModelBackend:
+    """Interface commune des backends d'inférence."""
+
+    name = "base"
+    # L'artefact accepte-t-il directement les visages découpés uint8 ?
+    accepts_crops = False
+
+    def __call__(self, faces: np.ndarray) -> np.ndarray:
+        raise NotImplementedError
+
+    def _model_input(self, faces: np.ndarray) -> np.ndarray:
+        """Prépare l'entrée float32 des artefacts sans prétraitement intégré."""
+        if self.accepts_crops or faces.dtype != np.uint8:
+            return faces
+        return model_input(faces)
+
+    def warmup(self) -> None:
+        """Exécute une inférence à vide pour amortir l'initialisation."""
+        self(np.zeros((1,) + CROP_SHAPE, dtype=np.uint8))
+
+
+class KerasBackend(ModelBackend):
+    """Modèle Keras (.h5) servi par le chemin compilé de CompiledPredictor."""
+
+    name = "keras"
+    accepts_crops = True
+
+    def __init__(self, path: str, num_threads: int = 0,
+                 batch_sizes: Sequence[int] = DEFAULT_BATCH_SIZES):
+        _configure_tf_threads(num_threads)
+        import tensorflow as tf
+        from inference import CompiledPredictor
+        self.model = tf.keras.models.load_model(path)
+        # Prétraitement tracé avec le modèle dans chaque fonction compilée
+        self.predictor = CompiledPredictor(self.model, batch_sizes, preprocess=model_input_tf)
+
+    def __call__(self, faces: np.ndarray) -> np.ndarray:
+        return self.predictor(faces)
+
+    def warmup(self) -> None:
+        self.predictor.warmup()
+
+
+class SavedModelBackend(ModelBackend):
+    """Modèle au format SavedModel (produit par convert_model.py), via sa signature de service."""
+
+    name = "saved_model"
+
+    def __init__(self, path: str, num_threads: int = 0):
+        _configure_tf_threads(num_threads)
+        import tensorflow as tf
+        self._tf = tf
+        self.model = tf.saved_model.load(path)
+        self.signature = self.model.signatures["serving_default"]
+        self.input_name, input_spec = next(iter(self.signature.structured_input_signature[1].items()))
+        # Signature de service de convert_model.py (uint8) ou ancien export (float32)
+        self.accepts_crops = input_spec.dtype == tf.uint8
+        self.input_dtype = np.uint8 if self.accepts_crops else np.float32
+
+    def __call__(self, faces: np.ndarray) -> np.ndarray:
+        inputs = self._tf.constant(np.asarray(self._model_input(faces), dtype=self.input_dtype))
+        outputs = self.signature(**{self.input_name: inputs})
+        return next(iter(outputs.values())).numpy()
+
+
+class TFLiteBackend(ModelBackend):
+    """
+    Modèle TFLite exécuté par l'interpréteur, avec le délégué XNNPACK multi-thread
+    (appliqué par défaut aux modèles float sur CPU).
+    Un seul interpréteur est chargé : chaque interpréteur applique son propre
+    délégué XNNPACK avec sa copie des poids réorganisés, un interpréteur par taille
+    de lot multiplierait donc la mémoire résidente. Les lots sont complétés jusqu'à
+    la taille préparée suivante (batch_sizes) et l'interpréteur n'est redimensionné
+    que lorsque cette taille change; les tenseurs d'entrée/sortie sont réutilisés
+    entre les appels de même taille.
+    Le modèle de service de convert_model.py (model.tflite) prend directement les
+    visages découpés uint8 ; les modèles à entrée float32 et les modèles entièrement
+    quantifiés (model_int8.tflite) restent acceptés : l'entrée est alors préparée
+    (et quantifiée) et la sortie déquantifiée à la volée.
+    """
+
+    name = "tflite"
+
+    def __init__(self, path: str, num_threads: int = 0,
+                 batch_sizes: Sequence[int] = DEFAULT_BATCH_SIZES):
+        # Interpréteur autonome si disponible (démarrage sans importer TensorFlow)
+        try:
+            from ai_edge_litert.interpreter import Interpreter
+        except ImportError:
+            try:
+                from tflite_runtime.interpreter import Interpreter
+            except ImportError:
+                import tensorflow as tf
+                Interpreter = tf.lite.Interpreter
+        threads = num_threads if num_threads > 0 else available_cpus()
+        self.batch_sizes = sorted(set(int(b) for b in batch_sizes if int(b) > 0)) or [1]
+        self._interpreter = Interpreter(model_path=path, num_threads=threads)
+        input_details = self._interpreter.get_input_details()[0]
+        output_details = self._interpreter.get_output_details()[0]
+        # Modèle de service (visages RGB uint8) ou modèle à entrée niveaux de gris
+        self.accepts_crops = input_details["shape"][-1] == CROP_SHAPE[-1]
+        self.input_shape = CROP_SHAPE if self.accepts_crops else INPUT_SHAPE
+        self.input_index = input_details["index"]
+        self.output_index = output_details["index"]
+        # Paramètres de quantification des modèles INT8 (entrée et sortie uint8)
+        self.input_quantized = input_details["dtype"] == np.uint8 and not self.accepts_crops
+        self.input_scale, self.input_zero_point = input_details["quantization"]
+        self.output_quantized = output_details["dtype"] == np.uint8
+        self.output_scale, self.output_zero_point = output_details["quantization"]
+        # Un interpréteur n'est pas réentrant
+        self._lock = threading.Lock()
+        self._size = 0
+        self._resize(self.batch_sizes[0])
+
+    def _resize(self, size: int) -> None:
+        if size != self._size:
+            self._interpreter.resize_tensor_input(self.input_index, [size, *self.input_shape])
+            self._interpreter.allocate_tensors()
+            self._size = size
+
+    def _bucket(self, count: int) -> int:
+        for size in self.batch_sizes:
+            if size >= count:
+                return size
+        return self.batch_sizes[-1]
+
+    def _invoke(self, chunk: np.ndarray) -> np.ndarray:
+        self._resize(self._bucket(len(chunk)))
+        interpreter = self._interpreter
+        # Écrire directement dans le tampon d'entrée préalloué
+        input_view = interpreter.tensor(self.input_index)()
+        if self.input_quantized:
+            chunk = np.clip(np.round(chunk / self.input_scale + self.input_zero_point), 0, 255)
+        input_view[:len(chunk)] = chunk
+        input_view[len(chunk):] = 0
+        del input_view
+        interpreter.invoke()
+        output = interpreter.tensor(self.output_index)()[:len(chunk)]
+        if self.output_quantized:
+            return (output.astype(np.float32) - self.output_zero_point) * self.output_scale
+        return output.copy()
+
+    def __call__(self, faces: np.ndarray) -> np.ndarray:
+        faces = self._model_input(np.asarray(faces))
+        largest = self.batch_sizes[-1]
+        with self._lock:
+            outputs = [self._invoke(faces[start:start + largest])
+                       for start in range(0, len(faces), largest)]
+        return np.concatenate(outputs, axis=0)
+
+    def warmup(self) -> None:
+        for size in self.batch_sizes:
+            self(np.zeros((size,) + CROP_SHAPE, dtype=np.uint8))
+
+
+def artifact_available(name: str, path: str) -> bool:
+    """Indique si l'artefact du backend est présent et complet."""
+    if name == "saved_model":
+        # Un SavedModel sans fichier de poids (variables.data-*) n'est pas chargeable
+        return (os.path.isfile(os.path.join(path, "saved_model.pb"))
+                and bool(glob.glob(os.path.join(path, "variables", "variables.data-*"))))
+    return os.path.isfile(path)
+
+
+def select_backend() -> str:
+    """
+    Choisit le backend du mode auto : le premier de AUTO_ORDER dont l'artefact
+    par défaut est disponible (ou dont MODEL_PATH a la bonne forme).
+
+    Returns:
+        str: Nom du backend
+    """
+    path = os.environ.get("MODEL_PATH")
+    for name in AUTO_ORDER:
+        candidate = path or DEFAULT_PATHS[name]
+        if path and name == "tflite" and not path.endswith(".tflite"):
+            continue
+        if path and name == "keras" and not path.endswith((".h5", ".keras")):
+            continue
+        if artifact_available(name, candidate):
+            return name
+    searched = [path] if path else list(DEFAULT_PATHS.values())
+    raise FileNotFoundError(f"Aucun modèle disponible (cherché: {', '.join(searched)})")
+
+
+BACKENDS = {
+    "keras": KerasBackend,
+    "saved_model": SavedModelBackend,
+    "tflite": TFLiteBackend,
+}
+
+
+def create_backend(name: Optional[str] = None, path: Optional[str] = None,
+                   num_threads: Optional[int] = None,
+                   batch_sizes: Sequence[int] = DEFAULT_BATCH_SIZES) -> ModelBackend:
+    """
+    Instancie le backend d'inférence demandé.
+
+    Args:
+        name (Optional[str]): Nom du backend (défaut : MODEL_BACKEND ou "auto")
+        path (Optional[str]): Chemin de l'artefact (défaut : MODEL_PATH ou chemin du backend)
+        num_threads (Optional[int]): Nombre de threads (défaut : MODEL_THREADS)
+        batch_sizes (Sequence[int]): Tailles de lot préparées à l'avance
+
+    Returns:
+        ModelBackend: Backend chargé
+    """
+    name = (name or os.environ.get("MODEL_BACKEND", "auto")).lower()
+    if name == "auto":
+        name = select_backend()
+    if name not in BACKENDS:
+        raise ValueError(f"Backend inconnu: {name} (choix: auto, {', '.join(BACKENDS)})")
+    path = path or os.environ.get("MODEL_PATH") or DEFAULT_PATHS[name]
+    if num_threads is None:
+        num_threads = int(os.environ.get("MODEL_THREADS", "0"))
+    if name == "saved_model":
+        return SavedModelBackend(path, num_threads)
+    return BACKENDS[name](path, num_threads, batch_sizes)
@@ -0,0 +1,265 @@
+"""
+Étapes synchrones du pipeline de reconnaissance d'émotions.
+Chaque fonction est indépendante de FastAPI afin de pouvoir être exécutée
+dans un pool de workers, hors de la boucle asyncio.
+"""
+
+import base64
+import binascii
+import io
+import os
+import tarfile
+import zipfile
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Tuple
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from face_preprocessing import CROP_SHAPE, FACE_SIZE
+
+# Extensions des images extraites des archives envoyées en lot
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".webp", ".gif", ".tif", ".tiff")
+
+
+# Facteurs de réduction DCT disponibles au décodage JPEG (du plus fort au plus faible)
+JPEG_REDUCTIONS = (
+    (8, cv2.IMREAD_REDUCED_COLOR_8),
+    (4, cv2.IMREAD_REDUCED_COLOR_4),
+    (2, cv2.IMREAD_REDUCED_COLOR_2),
+)
+
+
+def _imdecode(contents, flags: int) -> Optional[np.ndarray]:
+    # np.frombuffer crée une vue sur le tampon reçu, sans copie
+    buffer = np.frombuffer(contents, dtype=np.uint8)
+    # Ignorer l'orientation EXIF, comme le décodage PIL d'origine
+    img = cv2.imdecode(buffer, flags | cv2.IMREAD_IGNORE_ORIENTATION)
+    if img is None:
+        return None
+    # BGR -> RGB sur place, sans nouvelle allocation
+    return cv2.cvtColor(img, cv2.COLOR_BGR2RGB, dst=img)
+
+
+def decode_image(contents) -> np.ndarray:
+    """
+    Décode une image encodée (JPEG, PNG...) en tableau RGB.
+    Le décodage lit directement le tampon reçu (bytes, bytearray ou memoryview);
+    PIL n'est utilisé qu'en secours pour les formats non gérés par OpenCV.
+
+    Args:
+        contents (bytes): Contenu brut du fichier image
+
+    Returns:
+        np.ndarray: Image RGB de forme (H, W, 3)
+    """
+    img = _imdecode(contents, cv2.IMREAD_COLOR)
+    if img is None:
+        img = np.asarray(Image.open(io.BytesIO(contents)).convert("RGB"))
+    return img
+
+
+def decode_image_reduced(contents, max_side: Optional[int]) -> Tuple[np.ndarray, float]:
+    """
+    Décode une image à résolution réduite quand seule une détection plafonnée est nécessaire.
+    Pour un JPEG, la réduction est faite pendant le décodage (mise à l'échelle DCT
+    par 2, 4 ou 8), en gardant un plus grand côté d'au moins max_side pixels.
+
+    Args:
+        contents (bytes): Contenu brut du fichier image
+        max_side (Optional[int]): Plus grand côté utile pour la détection (None ou 0 = pleine résolution)
+
+    Returns:
+        Tuple[np.ndarray, float]: Image RGB, et facteur pour revenir aux coordonnées d'origine
+    """
+    if max_side and bytes(contents[:2]) == b"\xff\xd8":
+        # Lecture de l'en-tête seulement : PIL ne décode pas les pixels ici
+        width, height = Image.open(io.BytesIO(contents)).size
+        for factor, flag in JPEG_REDUCTIONS:
+            if max(width, height) // factor >= max_side:
+                img = _imdecode(contents, flag)
+                if img is not None:
+                    return img, max(width, height) / max(img.shape[:2])
+                break
+    return decode_image(contents), 1.0
+
+
+def decode_base64_image(data_url: str, max_side: Optional[int] = None) -> Tuple[np.ndarray, float]:
+    """
+    Décode une image transmise en base64 (avec ou sans préfixe data URL).
+
+    Args:
+        data_url (str): Chaîne base64, éventuellement préfixée par "data:image/...;base64,"
+        max_side (Optional[int]): Voir decode_image_reduced
+
+    Returns:
+        Tuple[np.ndarray, float]: Image RGB, et facteur pour revenir aux coordonnées d'origine
+    """
+    # Décoder directement la partie après la virgule, sans découper toute la chaîne
+    contents = binascii.a2b_base64(data_url[data_url.find(",") + 1:])
+    return decode_image_reduced(contents, max_side)
+
+
+def detect_faces(detector, img: np.ndarray, max_side: Optional[int] = None,
+                 min_face_size: int = 0) -> List[Dict[str, Any]]:
+    """
+    Détecte les visages d'une image, triés par confiance décroissante.
+    La détection peut être faite sur une copie réduite de l'image : les boîtes
+    sont alors ramenées aux coordonnées de l'image d'origine, dans laquelle les
+    visages sont ensuite découpés.
+
+    Args:
+        detector (FaceDetector): Détecteur de visages (voir face_detectors.py)
+        img (np.ndarray): Image RGB
+        max_side (Optional[int]): Plus grand côté de l'image de détection (None = pleine résolution)
+        min_face_size (int): Taille minimale (en pixels d'origine) des visages recherchés et conservés
+
+    Returns:
+        List[Dict[str, Any]]: Visages détectés ({'box', 'confidence', ...})
+    """
+    scale = 1.0
+    detection_img = img
+    if max_side and max(img.shape[:2]) > max_side:
+        scale = max_side / max(img.shape[:2])
+        size = (max(1, round(img.shape[1] * scale)), max(1, round(img.shape[0] * scale)))
+        detection_img = cv2.resize(img, size, interpolation=cv2.INTER_AREA)
+
+    # Taille minimale transmise au détecteur (en pixels de l'image de détection) pour
+    # qu'il ne cherche pas les visages plus petits ; le filtre ci-dessous reste exact
+    faces = []
+    for face in detector.detect_faces(detection_img, min_face_size=int(min_face_size * scale)):
+        if scale != 1.0:
+            face = {**face, 'box': [int(round(v / scale)) for v in face['box']]}
+        # Écarter les visages trop petits et les boîtes sans pixel dans l'image
+        # (un découpage vide ferait échouer cv2.resize dans crop_faces)
+        _, _, w, h = clip_box(face['box'], img.shape)
+        if min(face['box'][2], face['box'][3]) >= min_face_size and w > 0 and h > 0:
+            faces.append(face)
+    return sorted(faces, key=lambda face: face['confidence'], reverse=True)
+
+
+def detect_main_face(detector, img: np.ndarray, max_side: Optional[int] = None,
+                     min_face_size: int = 0) -> Optional[Dict[str, Any]]:
+    """Renvoie le visage de plus grande confiance, ou None si aucun visage n'est détecté."""
+    faces = detect_faces(detector, img, max_side, min_face_size)
+    return faces[0] if faces else None
+
+
+def clip_box(box: List[int], shape: Tuple[int, ...]) -> Tuple[int, int, int, int]:
+    """
+    Ramène une boîte (x, y, w, h) dans les limites de l'image, en coupant les deux
+    coins : la largeur ou la hauteur peut devenir nulle (boîte hors de l'image).
+    """
+    x, y, w, h = box
+    x0, y0 = max(x, 0), max(y, 0)
+    x1, y1 = min(x + w, shape[1]), min(y + h, shape[0])
+    return x0, y0, max(x1 - x0, 0), max(y1 - y0, 0)
+
+
+def crop_faces(img: np.ndarray, boxes: List[List[int]]) -> np.ndarray:
+    """
+    Découpe plusieurs visages en un seul lot pour l'entrée des modèles de service.
+    La conversion en niveaux de gris et la normalisation sont faites par le
+    backend d'inférence (voir face_preprocessing.py).
+
+    Args:
+        img (np.ndarray): Image RGB
+        boxes (List[List[int]]): Boîtes (x, y, w, h) des visages
+
+    Returns:
+        np.ndarray: Tableau uint8 de forme (N, 48, 48, 3) en RGB
+    """
+    batch = np.empty((len(boxes),) + CROP_SHAPE, dtype=np.uint8)
+    for i, box in enumerate(boxes):
+        x, y, w, h = clip_box(box, img.shape)
+        # Redimensionner directement dans le tampon du lot
+        cv2.resize(img[y:y+h, x:x+w], FACE_SIZE, dst=batch[i], interpolation=cv2.INTER_LINEAR)
+    return batch
+
+
+def encode_jpeg_data_url(img_bgr: np.ndarray, quality: int = 90) -> str:
+    """Encode une image BGR (ordre attendu par OpenCV) en JPEG, sous forme de data URL base64."""
+    _, buffer = cv2.imencode('.jpg', img_bgr, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    return f"data:image/jpeg;base64,{base64.b64encode(buffer).decode('utf-8')}"
+
+
+def annotate_image(img: np.ndarray, annotations: List[Tuple[List[int], Dict[str, Any]]],
+                   quality: int = 90) -> str:
+    """
+    Dessine les boîtes et les émotions sur une copie de l'image et l'encode en JPEG base64.
+
+    Args:
+        img (np.ndarray): Image RGB
+        annotations (List[Tuple[List[int], Dict[str, Any]]]): Boîtes (x, y, w, h) et
+            prédictions formatées par EmotionDisplay
+        quality (int): Qualité JPEG (1 à 100)
+
+    Returns:
+        str: Image annotée sous forme de data URL
+    """
+    # La conversion en BGR sert aussi de copie de travail pour le dessin
+    face_with_box = cv2.cvtColor(img, cv2.COLOR_RGB2BGR)
+    font = cv2.FONT_HERSHEY_SIMPLEX
+    for (box_x, box_y, box_w, box_h), result in annotations:
+        cv2.rectangle(face_with_box, (box_x, box_y), (box_x + box_w, box_y + box_h), (0, 255, 0), 2)
+
+        # Ajouter l'émotion en texte au-dessus du rectangle
+        emotion_text = f"{result['label_fr']}: {(result['confidence']*100):.1f}%"
+        cv2.putText(face_with_box, emotion_text, (box_x, box_y - 10), font, 0.9, (255, 255, 255), 2)
+
+    return encode_jpeg_data_url(face_with_box, quality)
+
+
+def face_thumbnails(img: np.ndarray, boxes: List[List[int]], size: int = 96,
+                    quality: int = 90) -> List[str]:
+    """
+    Découpe chaque visage et l'encode en petite vignette JPEG base64.
+
+    Args:
+        img (np.ndarray): Image RGB
+        boxes (List[List[int]]): Boîtes (x, y, w, h) des visages
+        size (int): Plus grand côté des vignettes, en pixels
+        quality (int): Qualité JPEG (1 à 100)
+
+    Returns:
+        List[str]: Vignettes sous forme de data URL, dans l'ordre des boîtes
+    """
+    thumbnails = []
+    for box in boxes:
+        x, y, w, h = clip_box(box, img.shape)
+        face_img = img[y:y+h, x:x+w]
+        scale = size / max(w, h)
+        if scale < 1:
+            face_img = cv2.resize(face_img, (max(1, round(w * scale)), max(1, round(h * scale))),
+                                  interpolation=cv2.INTER_AREA)
+        thumbnails.append(encode_jpeg_data_url(cv2.cvtColor(face_img, cv2.COLOR_RGB2BGR), quality))
+    return thumbnails
+
+
+def iter_upload_images(filename: str, fileobj: BinaryIO) -> Iterator[Tuple[str, bytes]]:
+    """
+    Parcourt les images d'un fichier envoyé : une archive zip ou tar (éventuellement
+    compressée) est lue membre par membre, sans être extraite en entier; tout
+    autre fichier est considéré comme une image unique.
+
+    Args:
+        filename (str): Nom du fichier envoyé
+        fileobj (BinaryIO): Contenu du fichier, positionnable
+
+    Yields:
+        Tuple[str, bytes]: Nom et contenu de chaque image
+    """
+    name = (filename or "").lower()
+    if name.endswith(".zip"):
+        with zipfile.ZipFile(fileobj) as archive:
+            for info in archive.infolist():
+                if not info.is_dir() and info.filename.lower().endswith(IMAGE_EXTENSIONS):
+                    yield info.filename, archive.read(info)
+    elif name.endswith((".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tar.xz")):
+        # Lecture en flux : les membres sont parcourus dans l'ordre de l'archive
+        with tarfile.open(fileobj=fileobj, mode="r|*") as archive:
+            for member in archive:
+                if member.isfile() and member.name.lower().endswith(IMAGE_EXTENSIONS):
+                    yield member.name, archive.extractfile(member).read()
+    else:
+        yield os.path.basename(filename or ""), fileobj.read()
@@ -0,0 +1,172 @@
+"""
+Mode profilage à la demande, désactivé par défaut.
+Une requête est profilée quand elle le demande (paramètre ?profile=1 ou en-tête
+X-Profile: 1 ; la valeur "tf" ajoute une trace du profileur TensorFlow) ou quand
+elle est tirée au sort parmi les requêtes de prédiction. Les étapes exécutées
+dans le pool de workers (décodage, détection, prétraitement, annotation) passent
+sous cProfile ; à la fin de la requête, leurs profils sont fusionnés et écrits
+dans PROFILE_DIR, et l'identifiant est renvoyé dans l'en-tête X-Profile-Id :
+
+    PROFILE_ENABLED      1 pour autoriser le profilage (défaut : 0)
+    PROFILE_TOKEN        jeton exigé dans l'en-tête X-Profile-Token (vide = aucun)
+    PROFILE_SAMPLE_RATE  part des requêtes /predict* profilées d'office (défaut : 0)
+    PROFILE_DIR          dossier des profils (défaut : profiles)
+
+Fichiers produits : <id>.prof (pstats, pour snakeviz ou python -m pstats),
+<id>.txt (fonctions les plus coûteuses) et tf/<id>/ (trace TensorBoard).
+La trace TensorFlow couvre tout le processus pendant la requête, y compris les
+lots d'inférence partagés avec d'autres requêtes ; une seule trace à la fois.
+"""
+
+import asyncio
+import cProfile
+import hmac
+import os
+import pstats
+import random
+import threading
+import uuid
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Optional
+from urllib.parse import parse_qs
+
+# Nombre de fonctions listées dans le résumé texte
+TOP_FUNCTIONS = 40
+
+# cProfile ne supporte qu'un profileur actif à la fois sur les versions récentes de Python
+_cprofile_lock = threading.Lock()
+_tf_trace_lock = threading.Lock()
+
+
+class ProfileSession:
+    """
+    Profil d'une requête : cumule les profils cProfile des tâches du pool.
+
+    Args:
+        profile_id (str): Identifiant (nom des fichiers produits)
+        tf_trace (bool): Trace du profileur TensorFlow demandée
+    """
+
+    def __init__(self, profile_id: str, tf_trace: bool = False):
+        self.id = profile_id
+        self.tf_trace = tf_trace
+        self.stats: Optional[pstats.Stats] = None
+        self._lock = threading.Lock()
+
+    def add(self, profiler: cProfile.Profile) -> None:
+        with self._lock:
+            if self.stats is None:
+                self.stats = pstats.Stats(profiler)
+            else:
+                self.stats.add(profiler)
+
+    def write(self, directory: str) -> None:
+        """Écrit le profil fusionné (.prof) et son résumé (.txt)."""
+        if self.stats is None:
+            return
+        os.makedirs(directory, exist_ok=True)
+        base = os.path.join(directory, self.id)
+        self.stats.dump_stats(base + ".prof")
+        with open(base + ".txt", "w") as f:
+            self.stats.stream = f
+            self.stats.sort_stats("cumulative").print_stats(TOP_FUNCTIONS)
+
+
+_active_session: ContextVar[Optional[ProfileSession]] = ContextVar("profile_session", default=None)
+
+
+def profile_call(call: Callable[[], Any]) -> Callable[[], Any]:
+    """
+    Enveloppe une tâche du pool de workers : si la requête en cours est profilée,
+    la tâche s'exécute sous cProfile. Appelée dans le contexte de la requête.
+    """
+    session = _active_session.get()
+    if session is None:
+        return call
+
+    def wrapper():
+        profiler = cProfile.Profile()
+        with _cprofile_lock:
+            profiler.enable()
+            try:
+                return call()
+            finally:
+                profiler.disable()
+                session.add(profiler)
+    return wrapper
+
+
+def start_tf_trace(logdir: str) -> bool:
+    """Démarre une trace TensorFlow, sauf si une autre est en cours. Renvoie True si démarrée."""
+    if not _tf_trace_lock.acquire(blocking=False):
+        return False
+    try:
+        import tensorflow as tf
+        tf.profiler.experimental.start(logdir)
+        return True
+    except Exception as e:
+        _tf_trace_lock.release()
+        print(f"Trace TensorFlow impossible: {e}")
+        return False
+
+
+def stop_tf_trace() -> None:
+    try:
+        import tensorflow as tf
+        tf.profiler.experimental.stop()
+    finally:
+        _tf_trace_lock.release()
+
+
+class ProfilingMiddleware:
+    """
+    Middleware ASGI qui active le profilage des requêtes qui le demandent.
+    Sans PROFILE_ENABLED, les requêtes passent sans aucun traitement.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.enabled = os.environ.get("PROFILE_ENABLED", "0") == "1"
+        self.token = os.environ.get("PROFILE_TOKEN", "")
+        self.sample_rate = float(os.environ.get("PROFILE_SAMPLE_RATE", "0"))
+        self.directory = os.environ.get("PROFILE_DIR", "profiles")
+
+    def requested_mode(self, scope) -> Optional[str]:
+        """Renvoie "py", "tf" ou None selon la requête et la configuration."""
+        headers: Dict[str, str] = {key.decode("latin-1"): value.decode("latin-1")
+                                   for key, value in scope.get("headers", [])}
+        query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+        value = (query.get("profile", [""])[0] or headers.get("x-profile", "")).lower()
+        if value in ("1", "true", "py", "tf"):
+            if self.token and not hmac.compare_digest(headers.get("x-profile-token", ""), self.token):
+                return None
+            return "tf" if value == "tf" else "py"
+        if self.sample_rate > 0 and scope["path"].startswith("/predict") and random.random() < self.sample_rate:
+            return "py"
+        return None
+
+    async def __call__(self, scope, receive, send):
+        mode = self.requested_mode(scope) if self.enabled and scope["type"] == "http" else None
+        if mode is None:
+            await self.app(scope, receive, send)
+            return
+
+        session = ProfileSession(uuid.uuid4().hex[:12], tf_trace=mode == "tf")
+        token = _active_session.set(session)
+        tf_started = False
+        if session.tf_trace:
+            tf_started = await asyncio.to_thread(start_tf_trace, os.path.join(self.directory, "tf", session.id))
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                message = {**message, "headers": list(message.get("headers", []))
+                           + [(b"x-profile-id", session.id.encode())]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            _active_session.reset(token)
+            if tf_started:
+                await asyncio.to_thread(stop_tf_trace)
+            await asyncio.to_thread(session.write, self.directory)
@@ -0,0 +1,194 @@
+"""
+Cache des résultats d'analyse, adressé par le contenu de l'image.
+La clé est une empreinte BLAKE2b des octets reçus et des options de la requête :
+une même image (retweet, avatar repris, image analysée par plusieurs services)
+n'est analysée qu'une fois. Le cache local est un LRU borné en nombre d'entrées
+et en mémoire, avec expiration. Il peut être doublé d'un cache Redis partagé
+entre les workers de l'API :
+
+    RESULT_CACHE_SIZE      nombre maximal d'entrées locales (0 = cache désactivé)
+    RESULT_CACHE_MAX_MB    mémoire maximale du cache local (Mo)
+    RESULT_CACHE_TTL       durée de validité d'un résultat (secondes)
+    RESULT_CACHE_BACKEND   local (défaut) | redis
+    REDIS_HOST, REDIS_PORT, REDIS_PASSWORD   connexion au cache partagé
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+
+def cache_key(contents: bytes, options: Hashable) -> str:
+    """
+    Calcule la clé de cache d'une image et des options qui influent sur le résultat.
+
+    Args:
+        contents (bytes): Octets de l'image (ou de sa représentation base64)
+        options (Hashable): Options de la requête
+
+    Returns:
+        str: Empreinte hexadécimale
+    """
+    digest = hashlib.blake2b(contents, digest_size=16)
+    digest.update(repr(options).encode())
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """
+    Cache LRU local des résultats, sérialisés en JSON pour en mesurer la taille.
+
+    Args:
+        max_entries (int): Nombre maximal d'entrées
+        max_bytes (int): Taille maximale totale des résultats sérialisés
+        ttl_seconds (float): Durée de validité d'une entrée
+    """
+
+    name = "local"
+
+    def __init__(self, max_entries: int = 1024, max_bytes: int = 64 * 1024 * 1024,
+                 ttl_seconds: float = 3600.0):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, Tuple[float, bytes]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _pop(self, key: str) -> None:
+        _, data = self._entries.pop(key)
+        self._bytes -= len(data)
+
+    def get_local(self, key: str) -> Optional[bytes]:
+        """Renvoie le résultat sérialisé s'il est présent et valide, sans compter l'accès."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                self._pop(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set_local(self, key: str, data: bytes) -> None:
+        """Enregistre un résultat sérialisé, en évinçant les entrées les plus anciennes."""
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._pop(key)
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, data)
+            self._bytes += len(data)
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._pop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _count(self, hit: bool) -> None:
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Renvoie le résultat en cache, ou None."""
+        data = self.get_local(key)
+        self._count(data is not None)
+        return json.loads(data) if data is not None else None
+
+    async def set(self, key: str, result: Dict[str, Any]) -> None:
+        """Met un résultat en cache."""
+        self.set_local(key, json.dumps(result, default=float).encode())
+
+    def stats(self) -> Dict[str, Any]:
+        """Renvoie les compteurs et l'occupation du cache."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "backend": self.name,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+            }
+
+
+class RedisResultCache(ResultCache):
+    """
+    Cache local doublé d'un cache Redis partagé entre les workers.
+    Une erreur Redis n'interrompt jamais une requête : elle compte comme un échec
+    de lecture et le résultat reste dans le cache local.
+    """
+
+    name = "redis"
+
+    def __init__(self, host: str = "localhost", port: int = 6379, password: Optional[str] = None,
+                 prefix: str = "emotion-result:", **kwargs):
+        super().__init__(**kwargs)
+        import redis.asyncio as redis
+        self._client = redis.Redis(host=host, port=port, password=password or None)
+        self.prefix = prefix
+        self.shared_hits = 0
+        self.errors = 0
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        data = self.get_local(key)
+        if data is None:
+            try:
+                data = await self._client.get(self.prefix + key)
+            except Exception:
+                self.errors += 1
+            if data is not None:
+                self.shared_hits += 1
+                self.set_local(key, data)
+        self._count(data is not None)
+        return json.loads(data) if data is not None else None
+
+    async def set(self, key: str, result: Dict[str, Any]) -> None:
+        data = json.dumps(result, default=float).encode()
+        self.set_local(key, data)
+        try:
+            await self._client.set(self.prefix + key, data, ex=max(1, int(self.ttl_seconds)))
+        except Exception:
+            self.errors += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {**super().stats(), "shared_hits": self.shared_hits, "errors": self.errors}
+
+
+def create_result_cache() -> Optional[ResultCache]:
+    """
+    Instancie le cache de résultats configuré par variables d'environnement.
+
+    Returns:
+        Optional[ResultCache]: Cache prêt à l'emploi, ou None s'il est désactivé
+    """
+    max_entries = int(os.environ.get("RESULT_CACHE_SIZE", "1024"))
+    if max_entries <= 0:
+        return None
+    options = {
+        "max_entries": max_entries,
+        "max_bytes": int(float(os.environ.get("RESULT_CACHE_MAX_MB", "64")) * 1024 * 1024),
+        "ttl_seconds": float(os.environ.get("RESULT_CACHE_TTL", "3600")),
+    }
+    backend = os.environ.get("RESULT_CACHE_BACKEND", "local").lower()
+    if backend == "redis":
+        return RedisResultCache(
+            host=os.environ.get("REDIS_HOST", "localhost"),
+            port=int(os.environ.get("REDIS_PORT", "6379")),
+            password=os.environ.get("REDIS_PASSWORD"),
+            **options,
+        )
+    if backend != "local":
+        raise ValueError(f"Cache de résultats inconnu: {backend} (choix: local, redis)")
+    return ResultCache(**options)
@@ -0,0 +1,99 @@
+"""
+Lancement de l'API en production sur plusieurs processus.
+Chaque worker uvicorn est un processus démarré par spawn (pas de fork d'un
+runtime TensorFlow déjà initialisé) qui charge son propre modèle et son propre
+détecteur à l'événement startup. Les cœurs sont partagés entre les workers :
+chaque processus reçoit un budget explicite de threads, transmis par variables
+d'environnement avant le démarrage, pour que TensorFlow, OpenCV et le pool de
+workers ne réclament pas chacun toute la machine.
+
+    SERVE_WORKERS            nombre de processus (défaut : nombre de cœurs)
+    SERVE_THREADS_PER_WORKER budget de threads par processus (défaut : cœurs / workers)
+
+Le nombre de cœurs est celui réellement disponible (affinité et quota CPU du
+conteneur, voir cpus.py), pas celui de l'hôte.
+
+Les états par flux (suivi, filtre d'images, historique) restent propres à chaque
+processus : une connexion keep-alive ou WebSocket reste servie par le même worker.
+
+Usage:
+    python serve.py --workers 4 --port 8000
+"""
+
+import argparse
+import os
+
+import uvicorn
+
+from cpus import available_cpus
+from model_backends import DEFAULT_PATHS, artifact_available, select_backend
+
+
+def thread_budget(workers: int, threads_per_worker: int = 0) -> int:
+    """Renvoie le nombre de threads de chaque worker pour partager les cœurs sans surcharge."""
+    if threads_per_worker > 0:
+        return threads_per_worker
+    return max(1, available_cpus() // max(1, workers))
+
+
+def apply_thread_budget(threads: int) -> None:
+    """
+    Fixe le budget de threads hérité par les workers. Les valeurs déjà définies
+    dans l'environnement sont conservées.
+    """
+    budget = {
+        # Backends du modèle (intra-op) et pool de décodage/détection de main.py
+        "MODEL_THREADS": threads,
+        "WORKER_THREADS": threads,
+        # Runtime TensorFlow (y compris MTCNN) : un seul thread inter-op
+        "TF_NUM_INTRAOP_THREADS": threads,
+        "TF_NUM_INTEROP_THREADS": 1,
+        # Bibliothèques natives : OpenCV, OpenMP, MKL
+        "OPENCV_FOR_THREADS_NUM": threads,
+        "OMP_NUM_THREADS": threads,
+        "MKL_NUM_THREADS": threads,
+    }
+    for name, value in budget.items():
+        os.environ.setdefault(name, str(value))
+
+
+def check_model_artifact() -> None:
+    """Vérifie l'artefact du modèle avant de démarrer les workers (sans importer TensorFlow)."""
+    backend = os.environ.get("MODEL_BACKEND", "auto").lower()
+    try:
+        if backend == "auto":
+            backend = select_backend()
+    except FileNotFoundError as e:
+        raise SystemExit(str(e))
+    if backend not in DEFAULT_PATHS:
+        raise SystemExit(f"Backend inconnu: {backend} (choix: auto, {', '.join(DEFAULT_PATHS)})")
+    path = os.environ.get("MODEL_PATH") or DEFAULT_PATHS[backend]
+    if not artifact_available(backend, path):
+        raise SystemExit(f"Modèle introuvable ou incomplet: {path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default=os.environ.get("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.environ.get("PORT", "8000")))
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("SERVE_WORKERS", "0")),
+                        help="Nombre de processus (0 = nombre de cœurs)")
+    parser.add_argument("--threads-per-worker", type=int,
+                        default=int(os.environ.get("SERVE_THREADS_PER_WORKER", "0")),
+                        help="Threads par processus (0 = cœurs / workers)")
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+
+    cpus = available_cpus()
+    workers = args.workers if args.workers > 0 else cpus
+    threads = thread_budget(workers, args.threads_per_worker)
+    check_model_artifact()
+    apply_thread_budget(threads)
+    print(f"Démarrage de {workers} workers x {threads} threads sur {cpus} cœurs disponibles "
+          f"({os.cpu_count()} sur l'hôte)")
+
+    uvicorn.run("main:app", host=args.host, port=args.port, workers=workers, log_level=args.log_level)
+
+
+if __name__ == "__main__":
+    main()
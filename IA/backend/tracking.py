@@ -0,0 +1,140 @@
+"""
+Suivi de visage par flux vidéo pour éviter une détection complète à chaque image.
+Pour chaque flux (identifié par le client), la dernière boîte détectée est suivie
+par corrélation de gabarit (cv2.matchTemplate) sur une image réduite, dans une
+fenêtre autour de la position précédente. La détection complète n'est relancée
+que toutes les N images ou quand le score de suivi chute.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from pipeline import clip_box
+
+# Largeur du gabarit utilisé pour la corrélation (en pixels, après réduction)
+TEMPLATE_WIDTH = 48
+
+
+class StreamTracker:
+    """
+    État de suivi d'un flux vidéo.
+
+    Args:
+        keyframe_interval (int): Nombre maximal d'images suivies entre deux détections
+        min_score (float): Score de corrélation minimal pour accepter le suivi
+        search_margin (float): Marge de la fenêtre de recherche, en fraction de la boîte
+    """
+
+    def __init__(self, keyframe_interval: int = 10, min_score: float = 0.6, search_margin: float = 0.5):
+        self.keyframe_interval = keyframe_interval
+        self.min_score = min_score
+        self.search_margin = search_margin
+        self.face: Optional[Dict[str, Any]] = None
+        self.template: Optional[np.ndarray] = None
+        self.scale = 1.0
+        self.frames_since_detection = 0
+        self.last_seen = time.monotonic()
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def _gray(img: np.ndarray) -> np.ndarray:
+        return cv2.cvtColor(img, cv2.COLOR_RGB2GRAY) if img.ndim == 3 else img
+
+    def _reset(self, img: np.ndarray, face: Dict[str, Any]) -> None:
+        x, y, w, h = clip_box(face['box'], img.shape)
+        patch = self._gray(img[y:y+h, x:x+w])
+        if patch.size == 0:
+            self.face, self.template = None, None
+            return
+        self.face = {**face, 'box': [x, y, patch.shape[1], patch.shape[0]]}
+        self.scale = min(1.0, TEMPLATE_WIDTH / patch.shape[1])
+        self.template = cv2.resize(patch, None, fx=self.scale, fy=self.scale, interpolation=cv2.INTER_AREA)
+        self.frames_since_detection = 0
+
+    def _match(self, img: np.ndarray) -> Optional[Tuple[List[int], float]]:
+        x, y, w, h = self.face['box']
+        mx, my = int(w * self.search_margin), int(h * self.search_margin)
+        x0, y0 = max(0, x - mx), max(0, y - my)
+        x1, y1 = min(img.shape[1], x + w + mx), min(img.shape[0], y + h + my)
+        if x1 <= x0 or y1 <= y0:
+            # Boîte hors de l'image (résolution du flux changée) : retour à la détection
+            return None
+        window = self._gray(img[y0:y1, x0:x1])
+        window = cv2.resize(window, None, fx=self.scale, fy=self.scale, interpolation=cv2.INTER_AREA)
+        if window.shape[0] < self.template.shape[0] or window.shape[1] < self.template.shape[1]:
+            return None
+        scores = cv2.matchTemplate(window, self.template, cv2.TM_CCOEFF_NORMED)
+        _, score, _, (tx, ty) = cv2.minMaxLoc(scores)
+        return [x0 + int(tx / self.scale), y0 + int(ty / self.scale), w, h], float(score)
+
+    def locate(self, img: np.ndarray,
+               detect_fn: Callable[[np.ndarray], List[Dict[str, Any]]]) -> Tuple[List[Dict[str, Any]], bool]:
+        """
+        Renvoie les visages de l'image, par suivi si possible, sinon par détection.
+
+        Args:
+            img (np.ndarray): Image RGB
+            detect_fn (Callable): Détection complète (image -> visages triés par confiance)
+
+        Returns:
+            Tuple[List[Dict[str, Any]], bool]: Visages, et True si la boîte vient du suivi
+        """
+        with self.lock:
+            self.last_seen = time.monotonic()
+            if self.face is not None and self.frames_since_detection < self.keyframe_interval:
+                match = self._match(img)
+                if match is not None and match[1] >= self.min_score:
+                    box, score = match
+                    self.face = {**self.face, 'box': box}
+                    self.frames_since_detection += 1
+                    return [{**self.face, 'tracking_score': score}], True
+
+            faces = detect_fn(img)
+            if faces:
+                self._reset(img, faces[0])
+            else:
+                self.face, self.template = None, None
+            return faces, False
+
+
+class TrackerRegistry:
+    """
+    Ensemble des trackers actifs, avec éviction LRU et expiration des flux inactifs.
+
+    Args:
+        max_streams (int): Nombre maximal de flux suivis simultanément
+        ttl_seconds (float): Durée d'inactivité après laquelle un flux est oublié
+        **tracker_options: Paramètres transmis à chaque StreamTracker
+    """
+
+    def __init__(self, max_streams: int = 1000, ttl_seconds: float = 60.0, **tracker_options):
+        self.max_streams = max_streams
+        self.ttl_seconds = ttl_seconds
+        self.tracker_options = tracker_options
+        self._trackers: "OrderedDict[str, StreamTracker]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, stream_id: str) -> StreamTracker:
+        """Renvoie le tracker du flux, en le créant au besoin."""
+        now = time.monotonic()
+        with self._lock:
+            tracker = self._trackers.pop(stream_id, None)
+            if tracker is None or now - tracker.last_seen > self.ttl_seconds:
+                tracker = StreamTracker(**self.tracker_options)
+            self._trackers[stream_id] = tracker
+            while len(self._trackers) > self.max_streams:
+                self._trackers.popitem(last=False)
+            return tracker
+
+    def discard(self, stream_id: str) -> None:
+        """Oublie le tracker d'un flux terminé."""
+        with self._lock:
+            self._trackers.pop(stream_id, None)
+
+    def __len__(self) -> int:
+        return len(self._trackers)
@@ -0,0 +1,76 @@
+"""
+Pool de workers pour les étapes coûteuses en CPU (décodage, détection,
+annotation), avec une admission bornée des requêtes.
+Quand la file est pleine, la requête est refusée immédiatement plutôt que
+d'allonger la latence de toutes les autres.
+"""
+
+import asyncio
+import contextlib
+import contextvars
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+
+class WorkerPoolFull(Exception):
+    """Levée quand le nombre de requêtes en cours dépasse la capacité du pool."""
+
+    def __init__(self, retry_after: int):
+        super().__init__("Serveur surchargé")
+        self.retry_after = retry_after
+
+
+class WorkerPool:
+    """
+    Pool de threads avec une file d'attente bornée.
+
+    Args:
+        max_workers (int): Nombre de threads de traitement
+        max_queue (int): Nombre de requêtes pouvant attendre un thread libre
+        retry_after (int): Délai conseillé (en secondes) aux clients refusés
+        wrap_call (Optional[Callable]): Appliquée à chaque tâche avant son exécution,
+            dans le contexte de la requête (profilage)
+        name (str): Préfixe du nom des threads
+    """
+
+    def __init__(self, max_workers: int, max_queue: int, retry_after: int = 1,
+                 wrap_call: Optional[Callable[[Callable[[], Any]], Callable[[], Any]]] = None,
+                 name: str = "inference"):
+        self.max_workers = max(1, max_workers)
+        self.wrap_call = wrap_call
+        self.capacity = self.max_workers + max(0, max_queue)
+        self.retry_after = retry_after
+        self.in_flight = 0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                            thread_name_prefix=name)
+
+    @contextlib.contextmanager
+    def admission(self):
+        """Réserve une place pour une requête, ou lève WorkerPoolFull."""
+        with self._lock:
+            if self.in_flight >= self.capacity:
+                raise WorkerPoolFull(self.retry_after)
+            self.in_flight += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+    async def run(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """
+        Exécute une fonction synchrone dans le pool sans bloquer la boucle asyncio.
+        La tâche s'exécute dans une copie du contexte de la requête (variables de
+        contexte : durées des étapes, profilage).
+        """
+        loop = asyncio.get_running_loop()
+        call = functools.partial(fn, *args, **kwargs)
+        if self.wrap_call is not None:
+            call = self.wrap_call(call)
+        return await loop.run_in_executor(self._executor, contextvars.copy_context().run, call)
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False)
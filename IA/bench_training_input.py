@@ -0,0 +1,111 @@
+"""
+Compare le temps d'une epoch d'entraînement entre les générateurs
+ImageDataGenerator (create_data_generators) et le pipeline tf.data
+(create_datasets) de predection_emotions.py, sur le même dossier d'images.
+
+Deux mesures par pipeline :
+    - lecture seule : parcours des lots d'entraînement (chargement et augmentation)
+    - entraînement : model.fit du modèle ResNet, une durée par epoch
+La première epoch tf.data remplit le cache ; les suivantes relisent les visages
+décodés en mémoire, c'est donc à partir de la deuxième que le gain est mesuré.
+
+Usage:
+    python bench_training_input.py --train-dir dataset/train --epochs 3
+    python bench_training_input.py --read-only --epochs 3 --output input_pipeline.json
+"""
+
+import argparse
+import json
+import time
+
+import tensorflow as tf
+
+from predection_emotions import (BATCH_SIZE, IMG_SIZE, class_weights, create_balanced_resnet,
+                                 create_data_generators, create_datasets, get_focal_loss, num_classes,
+                                 train_dir, test_dir)
+
+
+class EpochTimer(tf.keras.callbacks.Callback):
+    """Enregistre la durée de chaque epoch."""
+
+    def on_train_begin(self, logs=None):
+        self.durations = []
+
+    def on_epoch_begin(self, epoch, logs=None):
+        self.start = time.perf_counter()
+
+    def on_epoch_end(self, epoch, logs=None):
+        self.durations.append(time.perf_counter() - self.start)
+
+
+def read_epochs(batches, epochs):
+    """Parcourt epochs fois les lots (fonction qui renvoie un itérable d'une epoch) ; renvoie les durées."""
+    durations = []
+    for _ in range(epochs):
+        start = time.perf_counter()
+        for _ in batches():
+            pass
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+def throughput(durations, images):
+    """Débit moyen (images/s) des epochs après la première, ou de la seule epoch mesurée."""
+    durations = durations[1:] or durations
+    return images * len(durations) / sum(durations)
+
+
+def fit_epochs(train_data, epochs):
+    """Entraîne un nouveau modèle sur epochs epochs ; renvoie les durées."""
+    model = create_balanced_resnet((IMG_SIZE[0], IMG_SIZE[1], 1), num_classes)
+    model.compile(optimizer=tf.keras.optimizers.Adam(learning_rate=0.0005),
+                  loss=get_focal_loss(alpha=0.25, gamma=1.5), metrics=['accuracy'])
+    timer = EpochTimer()
+    model.fit(train_data, epochs=epochs, class_weight=class_weights, callbacks=[timer], verbose=0)
+    return timer.durations
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--train-dir", default=train_dir)
+    parser.add_argument("--test-dir", default=test_dir)
+    parser.add_argument("--epochs", type=int, default=3)
+    parser.add_argument("--read-only", action="store_true", help="Mesurer seulement la lecture des lots")
+    parser.add_argument("--output", default=None, help="Enregistrer les durées dans ce fichier JSON")
+    args = parser.parse_args()
+
+    train_generator, _, _ = create_data_generators(args.train_dir, args.test_dir)
+    train_dataset, _, _, _ = create_datasets(args.train_dir, args.test_dir)
+    # Le générateur garde le dernier lot incomplet, le pipeline tf.data l'écarte
+    images = {
+        "generators": train_generator.samples,
+        "tf.data": train_generator.samples // BATCH_SIZE * BATCH_SIZE,
+    }
+
+    results = {
+        "generators": {"read": read_epochs(lambda: (train_generator[i] for i in range(len(train_generator))),
+                                           args.epochs)},
+        "tf.data": {"read": read_epochs(lambda: train_dataset, args.epochs)},
+    }
+    if not args.read_only:
+        results["generators"]["fit"] = fit_epochs(train_generator, args.epochs)
+        results["tf.data"]["fit"] = fit_epochs(train_dataset, args.epochs)
+
+    print(f"{'pipeline':>11} {'mesure':>7} {'epoch':>6} {'durée (s)':>10} {'images/s':>9}")
+    for pipeline, measures in results.items():
+        for measure, durations in measures.items():
+            for epoch, seconds in enumerate(durations, 1):
+                print(f"{pipeline:>11} {measure:>7} {epoch:>6} {seconds:>10.2f} {images[pipeline] / seconds:>9.0f}")
+    for measure in results["tf.data"]:
+        # Débit moyen des epochs après la première (cache tf.data rempli)
+        before, after = (throughput(results[pipeline][measure], images[pipeline])
+                         for pipeline in ("generators", "tf.data"))
+        print(f"Accélération {measure} (epochs 2+) : x{after / before:.1f}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"images_per_epoch": images, "batch_size": BATCH_SIZE, "durations": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
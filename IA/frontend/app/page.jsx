@@ -11,6 +11,8 @@ export default function Home() {
   const canvasRef = useRef(null);
   const [stream, setStream] = useState(null);
   const captureIntervalRef = useRef(null);
+  // Identifiant du flux, pour que le serveur suive le visage entre deux images
+  const streamIdRef = useRef(`stream-${Date.now()}-${Math.random().toString(36).slice(2)}`);
 
   // Traduction des émotions en français
   const emotionLabels = {
@@ -137,7 +139,7 @@ export default function Home() {
         headers: {
           'Content-Type': 'application/json',
         },
-        body: JSON.stringify({ image: imageSrc }),
+        body: JSON.stringify({ image: imageSrc, stream_id: streamIdRef.current }),
       });
       
       if (!response.ok) {
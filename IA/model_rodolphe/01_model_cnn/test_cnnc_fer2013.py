@@ -24,7 +24,6 @@ from keras.preprocessing import image
 from keras.models import Sequential
 from keras.layers import Conv2D, MaxPool2D, Flatten,Dense,Dropout,BatchNormalization
 from tensorflow.keras.callbacks import ModelCheckpoint, EarlyStopping, ReduceLROnPlateau, TensorBoard
-from tensorflow.keras.preprocessing.image import ImageDataGenerator
 
 # --- Téléchargement et décompression du dataset ---
 #!rm -rf /content/FER2013
@@ -67,42 +66,57 @@ for i, category in enumerate(categories):
 plt.tight_layout()
 plt.show()
 
-train_datagen = ImageDataGenerator(
-    width_shift_range=0.1,           #  shifts the image horizontally by 10% of the total width
-    height_shift_range=0.1,          # shifts the image vertically by 10% of the total height
-    horizontal_flip=True,            # A left-facing car image might be flipped to a right-facing one
-    rescale=1./255,                  #  improving training stability , Faster Convergence
-    validation_split=0.2
-)
-
-
-test_datagen = ImageDataGenerator(rescale=1./255)
-
-train_generator = train_datagen.flow_from_directory(
-    directory=data_dir_train,
-    target_size=(48, 48),
-    batch_size=64,
-    color_mode="grayscale",
-    class_mode="categorical",
-    subset="training"
-)
-
-validation_generator = train_datagen.flow_from_directory(
-    directory=data_dir_train,  # Use train_dir for validation
-    target_size=(48, 48),
-    batch_size=64,
-    color_mode="grayscale",
-    class_mode="categorical",
-    subset="validation"
-)
-
-test_generator = test_datagen.flow_from_directory(
-    directory=data_dir_test,
-    target_size=(48, 48),
-    batch_size=64,
-    color_mode="grayscale",
-    class_mode="categorical"
-)
+# Pipeline tf.data : décodage en parallèle, visages 48x48 décodés mis en cache,
+# augmentation (décalage 10 %, miroir horizontal) faite dans le graphe par lot.
+# Même découpage entraînement/validation que flow_from_directory(validation_split=0.2) :
+# les 20 % premiers fichiers (ordre alphabétique) de chaque classe servent à la validation.
+validation_split = 0.2
+class_names = sorted(categories)
+
+def list_image_files(directory, subset=None):
+    paths, labels = [], []
+    for label, name in enumerate(class_names):
+        files = sorted(f for f in os.listdir(os.path.join(directory, name))
+                       if f.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp')))
+        split = int(validation_split * len(files))
+        if subset == "training":
+            files = files[split:]
+        elif subset == "validation":
+            files = files[:split]
+        paths += [os.path.join(directory, name, f) for f in files]
+        labels += [label] * len(files)
+    return paths, labels
+
+def load_image(path, label):
+    contents = tf.io.read_file(path)
+    # IDCT précise pour les JPEG : mêmes pixels que PIL (ImageDataGenerator)
+    image = tf.cond(tf.io.is_jpeg(contents),
+                    lambda: tf.io.decode_jpeg(contents, channels=1, dct_method='INTEGER_ACCURATE'),
+                    lambda: tf.io.decode_image(contents, channels=1, expand_animations=False))
+    image = tf.image.resize(tf.cast(image, tf.float32), img_size) / 255.0
+    return image, tf.one_hot(label, len(class_names))
+
+augmentation = tf.keras.Sequential([
+    tf.keras.layers.RandomTranslation(0.1, 0.1, fill_mode='nearest'),
+    tf.keras.layers.RandomFlip('horizontal'),
+])
+
+def make_dataset(directory, subset=None, training=False):
+    paths, labels = list_image_files(directory, subset)
+    # Types explicites : une liste vide serait sinon convertie en float32
+    dataset = tf.data.Dataset.from_tensor_slices((tf.constant(paths, tf.string), tf.constant(labels, tf.int32)))
+    dataset = dataset.map(load_image, num_parallel_calls=tf.data.AUTOTUNE).cache()
+    if training:
+        dataset = dataset.shuffle(len(paths), reshuffle_each_iteration=True)
+    dataset = dataset.batch(batch_size)
+    if training:
+        dataset = dataset.map(lambda x, y: (augmentation(x, training=True), y),
+                              num_parallel_calls=tf.data.AUTOTUNE)
+    return dataset.prefetch(tf.data.AUTOTUNE)
+
+train_dataset = make_dataset(data_dir_train, "training", training=True)
+validation_dataset = make_dataset(data_dir_train, "validation")  # Validation sans augmentation
+test_dataset = make_dataset(data_dir_test)
 
 model = tf.keras.Sequential([
         # input layer
@@ -176,12 +190,12 @@ callbacks = [
 
 strategy = tf.distribute.MirroredStrategy()  # si vous avez plusieurs GPU
 
-history = model.fit(x = train_generator,epochs = 70 ,
-                    validation_data = validation_generator,
+history = model.fit(x = train_dataset,epochs = 70 ,
+                    validation_data = validation_dataset,
                     callbacks=callbacks)
 # You can go for 100 epochs
 
-loss, acc = model.evaluate(test_generator)
+loss, acc = model.evaluate(test_dataset)
 print(f"Final Test Accuracy: {acc * 100:.2f}%")
 
 plt.figure(figsize=(12, 5))
@@ -1,4 +1,5 @@
 import os
+import sys
 import numpy as np
 import tensorflow as tf
 from tensorflow.keras.preprocessing.image import ImageDataGenerator
@@ -13,6 +14,10 @@ from sklearn.metrics import confusion_matrix, classification_report
 import seaborn as sns
 import pandas as pd
 
+# Prétraitement partagé avec l'API et convert_model.py (taille, niveaux de gris, normalisation)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+from face_preprocessing import FACE_SIZE, PIXEL_SCALE, model_input_tf
+
 # Contrôler la verbosité de TensorFlow
 os.environ['TF_CPP_MIN_LOG_LEVEL'] = '2'  # Réduire les messages TF
 
@@ -21,10 +26,23 @@ train_dir = 'dataset/train'
 test_dir = 'dataset/test'
 
 # Paramètres de base
-IMG_SIZE = (48, 48)
+IMG_SIZE = FACE_SIZE
 BATCH_SIZE = 64
 EPOCHS = 50
 num_classes = 7
+VALIDATION_SPLIT = 0.2
+
+# Augmentation des données d'entraînement (mêmes réglages pour les générateurs et tf.data)
+AUGMENTATION = {
+    'rotation_range': 15,
+    'width_shift_range': 0.15,
+    'height_shift_range': 0.15,
+    'horizontal_flip': True,
+    'zoom_range': 0.1,
+    'brightness_range': (0.9, 1.1),
+}
+# Extensions reconnues par flow_from_directory
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.ppm', '.tif', '.tiff')
 
 # Définir manuellement les poids des classes (équilibrés)
 # Ces valeurs sont basées sur la distribution typique des classes dans FER2013
@@ -124,24 +142,24 @@ def create_balanced_resnet(input_shape, num_classes):
     return model
 
 # Créer les générateurs d'images avec augmentation équilibrée
-def create_data_generators():
+def create_data_generators(train_dir=train_dir, test_dir=test_dir):
     """
-    Créer les générateurs de données avec augmentation équilibrée
+    Créer les générateurs de données avec augmentation équilibrée.
+    Remplacés par create_datasets (tf.data) pour l'entraînement ; conservés pour
+    la comparaison des temps d'epoch (bench_training_input.py).
+    Le chargement reproduit le prétraitement de l'API (face_preprocessing.py) :
+    niveaux de gris BT.601 (PIL, mode "L"), redimensionnement bilinéaire et
+    normalisation par PIXEL_SCALE.
     """
     # Générateur pour l'entraînement avec augmentation modérée
     train_datagen = ImageDataGenerator(
-        rescale=1./255,
-        rotation_range=15,
-        width_shift_range=0.15,
-        height_shift_range=0.15,
-        horizontal_flip=True,
-        zoom_range=0.1,
-        brightness_range=[0.9, 1.1],
-        validation_split=0.2
+        rescale=PIXEL_SCALE,
+        validation_split=VALIDATION_SPLIT,
+        **AUGMENTATION
     )
     
     # Générateur simple pour les données de test
-    test_datagen = ImageDataGenerator(rescale=1./255)
+    test_datagen = ImageDataGenerator(rescale=PIXEL_SCALE)
     
     # Générateurs pour l'entraînement et la validation
     train_generator = train_datagen.flow_from_directory(
@@ -149,6 +167,7 @@ def create_data_generators():
         target_size=IMG_SIZE,
         batch_size=BATCH_SIZE,
         color_mode="grayscale",
+        interpolation="bilinear",
         class_mode="categorical",
         subset="training",
         shuffle=True
@@ -159,6 +178,7 @@ def create_data_generators():
         target_size=IMG_SIZE,
         batch_size=BATCH_SIZE,
         color_mode="grayscale",
+        interpolation="bilinear",
         class_mode="categorical",
         subset="validation",
         shuffle=False
@@ -169,12 +189,127 @@ def create_data_generators():
         target_size=IMG_SIZE,
         batch_size=BATCH_SIZE,
         color_mode="grayscale",
+        interpolation="bilinear",
         class_mode="categorical",
         shuffle=False
     )
     
     return train_generator, validation_generator, test_generator
 
+# Lister les images comme flow_from_directory (classes et fichiers triés)
+def list_image_files(directory, subset=None, validation_split=VALIDATION_SPLIT):
+    """
+    Liste les images d'un dossier (un sous-dossier par classe), avec le même
+    découpage entraînement/validation que flow_from_directory : dans chaque
+    classe, les premiers validation_split % des fichiers triés forment la validation.
+    
+    Args:
+        directory (str): Dossier contenant un sous-dossier par classe
+        subset (str, optional): "training", "validation" ou None (toutes les images)
+        validation_split (float): Part des images réservée à la validation
+        
+    Returns:
+        tuple: Chemins, indices de classe, noms des classes
+    """
+    class_names = sorted(name for name in os.listdir(directory)
+                         if os.path.isdir(os.path.join(directory, name)))
+    paths, labels = [], []
+    for label, class_name in enumerate(class_names):
+        class_dir = os.path.join(directory, class_name)
+        files = sorted(name for name in os.listdir(class_dir) if name.lower().endswith(IMAGE_EXTENSIONS))
+        if subset is not None:
+            cut = int(validation_split * len(files))
+            files = files[:cut] if subset == "validation" else files[cut:]
+        paths.extend(os.path.join(class_dir, name) for name in files)
+        labels.extend([label] * len(files))
+    return paths, labels, class_names
+
+# Augmentation vectorisée, appliquée par lot dans le graphe
+def create_augmentation(seed=None):
+    """
+    Reproduit AUGMENTATION avec des couches Keras appliquées à un lot entier
+    (images normalisées entre 0 et 1, remplissage "nearest" comme ImageDataGenerator).
+    """
+    rotation = AUGMENTATION['rotation_range'] / 360
+    zoom = AUGMENTATION['zoom_range']
+    low, high = AUGMENTATION['brightness_range']
+    layers = [
+        tf.keras.layers.RandomRotation(rotation, fill_mode='nearest', seed=seed),
+        tf.keras.layers.RandomTranslation(AUGMENTATION['height_shift_range'], AUGMENTATION['width_shift_range'],
+                                          fill_mode='nearest', seed=seed),
+        tf.keras.layers.RandomZoom((-zoom, zoom), (-zoom, zoom), fill_mode='nearest', seed=seed),
+    ]
+    if AUGMENTATION['horizontal_flip']:
+        layers.append(tf.keras.layers.RandomFlip('horizontal', seed=seed))
+    augment = tf.keras.Sequential(layers, name='augmentation')
+    
+    def apply(images, labels):
+        images = augment(images, training=True)
+        # Luminosité : facteur multiplicatif par image, comme brightness_range
+        factors = tf.random.uniform([tf.shape(images)[0], 1, 1, 1], low, high, seed=seed)
+        return tf.clip_by_value(images * factors, 0.0, 1.0), labels
+    return apply
+
+def load_image(path, label):
+    """Décode une image et applique le prétraitement de l'API (face_preprocessing.py)."""
+    data = tf.io.read_file(path)
+    # IDCT exacte pour les JPEG, comme PIL (la méthode rapide par défaut décale les pixels)
+    image = tf.cond(tf.io.is_jpeg(data),
+                    lambda: tf.io.decode_jpeg(data, channels=3, dct_method='INTEGER_ACCURATE'),
+                    lambda: tf.io.decode_image(data, channels=3, expand_animations=False))
+    image = model_input_tf(image[tf.newaxis])[0]
+    image.set_shape((IMG_SIZE[0], IMG_SIZE[1], 1))
+    return image, tf.one_hot(label, num_classes)
+
+def make_dataset(paths, labels, training=False, batch_size=BATCH_SIZE, cache=True, seed=None):
+    """
+    Construit un pipeline tf.data : décodage en parallèle, cache des visages 48x48
+    décodés, mélange et augmentation par lot (entraînement), préchargement.
+    
+    Args:
+        paths (list): Chemins des images
+        labels (list): Indices de classe
+        training (bool): Mélanger et augmenter les données
+        batch_size (int): Taille des lots
+        cache (bool | str): Cache en mémoire (True), dans un fichier (chemin) ou aucun (False)
+        seed (int, optional): Graine du mélange et de l'augmentation
+    """
+    # Types explicites : une liste vide serait sinon convertie en float32
+    dataset = tf.data.Dataset.from_tensor_slices((tf.constant(paths, tf.string), tf.constant(labels, tf.int32)))
+    dataset = dataset.map(load_image, num_parallel_calls=tf.data.AUTOTUNE)
+    if cache:
+        dataset = dataset.cache('' if cache is True else cache)
+    if training:
+        dataset = dataset.shuffle(len(paths), seed=seed, reshuffle_each_iteration=True)
+        # Lots complets uniquement, comme steps_per_epoch = samples // BATCH_SIZE
+        # (sauf si le dossier ne remplit pas un lot : l'epoch serait vide)
+        dataset = dataset.batch(batch_size, drop_remainder=len(paths) >= batch_size)
+        dataset = dataset.map(create_augmentation(seed), num_parallel_calls=tf.data.AUTOTUNE)
+    else:
+        dataset = dataset.batch(batch_size)
+    return dataset.prefetch(tf.data.AUTOTUNE)
+
+# Créer les datasets tf.data (remplacent les générateurs d'images)
+def create_datasets(train_dir=train_dir, test_dir=test_dir, cache=True, seed=None):
+    """
+    Créer les datasets d'entraînement, de validation et de test.
+    Même découpage entraînement/validation que create_data_generators ; seules
+    les images d'entraînement sont augmentées.
+    
+    Returns:
+        tuple: Datasets d'entraînement, de validation et de test, noms des classes
+    """
+    train_paths, train_labels, class_names = list_image_files(train_dir, "training")
+    val_paths, val_labels, _ = list_image_files(train_dir, "validation")
+    test_paths, test_labels, _ = list_image_files(test_dir)
+    print(f"{len(train_paths)} images d'entraînement, {len(val_paths)} de validation, "
+          f"{len(test_paths)} de test ({len(class_names)} classes).")
+    
+    train_dataset = make_dataset(train_paths, train_labels, training=True, cache=cache, seed=seed)
+    validation_dataset = make_dataset(val_paths, val_labels, cache=cache)
+    test_dataset = make_dataset(test_paths, test_labels, cache=cache)
+    return train_dataset, validation_dataset, test_dataset, class_names
+
 # Fonction personnalisée de Focal Loss
 def get_focal_loss(alpha=0.25, gamma=1.5):
     """
@@ -241,12 +376,10 @@ def visualize_class_distribution(train_dir):
 
 # Programme principal
 def main():
-    print("Création des générateurs de données...")
-    train_generator, validation_generator, test_generator = create_data_generators()
+    print("Création des datasets tf.data...")
+    train_dataset, validation_dataset, test_dataset, class_names = create_datasets()
     
     # Afficher les classes
-    class_indices = train_generator.class_indices
-    class_names = list(class_indices.keys())
     print(f"Classes: {class_names}")
     
     # Visualiser la distribution des classes (optionnel)
@@ -300,11 +433,9 @@ def main():
     # Entraîner le modèle
     print("Démarrage de l'entraînement...")
     history = model.fit(
-        train_generator,
-        steps_per_epoch=train_generator.samples // BATCH_SIZE,
+        train_dataset,
         epochs=EPOCHS,
-        validation_data=validation_generator,
-        validation_steps=validation_generator.samples // BATCH_SIZE,
+        validation_data=validation_dataset,
         callbacks=callbacks,
         class_weight=class_weights,
         verbose=1
@@ -312,7 +443,7 @@ def main():
     
     # Évaluer le modèle sur les données de test
     print("Évaluation sur l'ensemble de test...")
-    test_loss, test_acc = model.evaluate(test_generator)
+    test_loss, test_acc = model.evaluate(test_dataset)
     print(f'Test accuracy: {test_acc:.4f}')
     
     # Sauvegarder le modèle final
@@ -324,10 +455,10 @@ def main():
     plot_learning_curves(history)
     
     # Obtenir les prédictions sur l'ensemble de test et créer la matrice de confusion
-    analyze_predictions(model, test_generator, class_names)
+    analyze_predictions(model, test_dataset, class_names)
     
     # Montrer quelques exemples
-    visualize_predictions(model, test_generator, class_names)
+    visualize_predictions(model, test_dataset, class_names)
     
     print("Entraînement et évaluation terminés!")
 
@@ -356,12 +487,12 @@ def plot_learning_curves(history):
     plt.savefig('learning_curves_balanced.png')
     plt.show()
 
-def analyze_predictions(model, data_generator, class_names):
+def analyze_predictions(model, dataset, class_names):
     """Analyse les prédictions et crée une matrice de confusion"""
-    data_generator.reset()
-    y_pred = model.predict(data_generator)
+    # Le dataset de test n'est pas mélangé : étiquettes et prédictions sont dans le même ordre
+    y_pred = model.predict(dataset)
     y_pred_classes = np.argmax(y_pred, axis=1)
-    y_true = data_generator.classes
+    y_true = np.concatenate([np.argmax(batch_y, axis=1) for _, batch_y in dataset.as_numpy_iterator()])
     
     # Matrice de confusion
     cm = confusion_matrix(y_true, y_pred_classes)
@@ -387,10 +518,9 @@ def analyze_predictions(model, data_generator, class_names):
         class_acc = np.mean(y_pred_classes[class_indices] == i)
         print(f"{class_name}: {class_acc:.4f} ({len(class_indices)} échantillons)")
 
-def visualize_predictions(model, data_generator, class_names, num_samples=10):
+def visualize_predictions(model, dataset, class_names, num_samples=10):
     """Visualise quelques exemples de prédictions"""
-    data_generator.reset()
-    batch_x, batch_y = next(data_generator)
+    batch_x, batch_y = next(dataset.as_numpy_iterator())
     predictions = model.predict(batch_x)
     
     fig, axes = plt.subplots(2, 5, figsize=(15, 6))